@@ -0,0 +1,392 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from victoria3_company_parser import Company, CompanyDatabase, InternTable, Victoria3CompanyParserV6Final, building_id_mask, popcount
+
+
+@pytest.fixture
+def parser():
+    return load_parser()
+
+
+def load_parser():
+    """A parser holding the checked-in company data, with prestige goods mapped as in the game files"""
+    parser = Victoria3CompanyParserV6Final("game", parse_game_files=False)
+    with open(os.path.join(ROOT, "company_data_v6.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    parser.load_companies(data)
+    for company_data in data.values():
+        for prestige_good in company_data["possible_prestige_goods"]:
+            parser.prestige_goods[prestige_good] = prestige_good.replace("prestige_good_generic_", "").replace("prestige_good_", "")
+    return parser
+
+
+def find_prestige_section(parser):
+    """Get a (building, company, prestige good) whose building section shows a prestige column"""
+    for company_name in sorted(parser.companies):
+        for building in parser.companies[company_name].building_types:
+            result = parser.company_has_prestige_for_building(company_name, building)
+            if result and result[0]:
+                return building, company_name, result[1]
+    pytest.skip("no company makes a prestige good in the checked-in data")
+
+
+def section_fingerprint(parser, building):
+    return parser._fingerprint(parser._get_building_section_inputs(building, [building], 1))
+
+
+def change_prestige_base_good(parser, building, company_name, prestige_good):
+    parser.prestige_goods[prestige_good] = "not_" + parser.prestige_goods[prestige_good]
+
+
+def change_building_good(parser, building, company_name, prestige_good):
+    parser.building_to_goods[building] = "not_" + parser.building_to_goods[building]
+
+
+def change_prestige_good_name(parser, building, company_name, prestige_good):
+    parser.prestige_good_names[prestige_good] = "Renamed"
+
+
+def change_country_flag(parser, building, company_name, prestige_good):
+    parser.country_flags[parser.companies[company_name].country] = "flags/changed.png"
+
+
+def change_company_record(parser, building, company_name, prestige_good):
+    data = parser.companies[company_name].to_dict()
+    data["extension_building_types"] = list(data["extension_building_types"]) + ["building_new_extension"]
+    companies = dict((name, record.to_dict()) for name, record in parser.companies.items())
+    companies[company_name] = data
+    parser.load_companies(companies)
+
+
+@pytest.mark.parametrize("change", [
+    change_prestige_base_good,
+    change_building_good,
+    change_prestige_good_name,
+    change_country_flag,
+    change_company_record,
+])
+def test_building_section_fingerprint_follows_rendered_inputs(parser, change):
+    building, company_name, prestige_good = find_prestige_section(parser)
+    before = section_fingerprint(parser, building)
+
+    change(parser, building, company_name, prestige_good)
+    parser._prestige_masks = {}
+
+    assert section_fingerprint(parser, building) != before
+
+
+def test_list_datasets_orders_numeric_and_text_version_parts(parser, tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, "_get_dataset_path", lambda *parts: os.path.join(str(tmp_path), *parts))
+    os.makedirs(os.path.join(str(tmp_path), "versions"))
+    for tag in ("1.x", "1.10", "1.9", "1.9-beta", "1.9.1"):
+        open(os.path.join(str(tmp_path), "versions", tag + ".json"), "w").close()
+
+    assert parser.list_datasets() == ["1.9", "1.9.1", "1.9-beta", "1.10", "1.x"]
+
+
+def test_diff_company_ignores_reordered_lists(parser):
+    old = {"building_types": ["building_iron_mine", "building_coal_mine"], "country": "GBR"}
+    new = {"building_types": ["building_coal_mine", "building_iron_mine"], "country": "GBR"}
+    assert parser._diff_company(old, new) == {}
+
+    new["building_types"].append("building_steel_mills")
+    assert parser._diff_company(old, new) == {"buildings": {"added": ["building_steel_mills"], "removed": []}}
+
+
+def write_game_tree(root, company_files):
+    os.makedirs(os.path.join(str(root), "company_types"))
+    for filename, content in company_files.items():
+        with open(os.path.join(str(root), "company_types", filename), "w", encoding="utf-8") as f:
+            f.write(content)
+    return str(root)
+
+
+def test_diff_game_directory_reparses_only_changed_company_files(tmp_path, monkeypatch):
+    unchanged = "company_gamma = {\n\tbuilding_types = { building_steel_mills }\n}\n"
+    old_directory = write_game_tree(tmp_path / "old", {
+        "a.txt": "company_alpha = {\n\tbuilding_types = { building_iron_mine building_coal_mine }\n}\n",
+        "b.txt": unchanged,
+    })
+    new_directory = write_game_tree(tmp_path / "new", {
+        "a.txt": "company_alpha = {\n\tbuilding_types = { building_coal_mine building_iron_mine }\n}\n"
+                 "company_beta = {\n\tbuilding_types = { building_textile_mills }\n}\n",
+        "b.txt": unchanged,
+    })
+    parser = Victoria3CompanyParserV6Final(new_directory)
+
+    parsed = []
+    parse_company_file = Victoria3CompanyParserV6Final.parse_company_file
+    monkeypatch.setattr(Victoria3CompanyParserV6Final, "parse_company_file",
+                        lambda self, filename: parsed.append(filename) or parse_company_file(self, filename))
+    changelog = parser.diff_game_directory(old_directory, filename=str(tmp_path / "changelog.json"))
+
+    assert parsed == ["a.txt", "a.txt"]
+    assert changelog["files"]["changed"] == ["company_types/a.txt"]
+    assert changelog["companies"] == {"added": ["company_beta"], "removed": [], "changed": {}}
+    assert changelog["affected_buildings"] == ["building_textile_mills"]
+
+
+def test_page_data_only_indexes_declared_string_fields(parser):
+    strings, companies, tooltips = (json.loads(part) for part in parser._get_page_data_js())
+    fields = Victoria3CompanyParserV6Final.COMPANY_DATA_FIELDS
+
+    for company_name, record in companies.items():
+        data = parser.companies[company_name]
+        decoded = dict(zip(fields, record))
+        assert decoded["starts_enacted"] is bool(data.get("starts_enacted", False))
+        assert [strings[index] for index in decoded["building_types"]] == list(data["building_types"])
+        assert set(tooltips[company_name]) <= set(Victoria3CompanyParserV6Final.TOOLTIP_STRING_FIELDS)
+
+
+def test_report_image_problems_lists_placeholder_companies_without_rendering(parser, capsys):
+    missing = sorted(name for name in parser.companies if not parser.find_company_icon_path(name))
+    if not missing:
+        pytest.skip("every company in the checked-in data has an icon")
+
+    parser.report_image_problems("")
+
+    output = capsys.readouterr().out
+    assert "{} companies use the placeholder icon".format(len(missing)) in output
+    assert "  {}\n".format(missing[0]) in output
+
+
+def test_share_table_fingerprint_hashes_full_utf16_units(parser):
+    # Values from getShareTableFingerprint() in the page for the same key tables
+    assert parser.get_share_table_fingerprint(["company_łódź", "company_a"], ["building_東京"]) == 17413
+    assert parser.get_share_table_fingerprint(["Ł"], []) == 41546
+    assert parser.get_share_table_fingerprint(["𝄞"], []) == 6350
+
+
+@pytest.fixture(scope="module")
+def share_codec(tmp_path_factory):
+    """The page's share-code functions with a runner: run(companies, buildings, archive, body) -> JSON printed by body"""
+    if not shutil.which("node"):
+        pytest.skip("node is not installed")
+    parser = load_parser()
+    parser.FRAGMENT_CACHE = str(tmp_path_factory.mktemp("fragments") / "html_fragments.json")
+    html = parser.generate_html_report(workers=1)
+    start = html.index("// Company and building ID mappings for shorter URLs")
+    codec = html[start:html.index("function applyShareState", start)]
+    company_data = dict((name, {"name": name, "extension_building_types": list(data["extension_building_types"])})
+                        for name, data in parser.companies.items())
+    script_dir = tmp_path_factory.mktemp("share_codec")
+
+    def run(companies, buildings, archive, body):
+        def mappings(keys):
+            return ",\n".join("{}: {}".format(json.dumps(key), index) for index, key in enumerate(keys))
+        script = (codec.replace("{company_mappings}", mappings(companies))
+                  .replace("{building_mappings}", mappings(buildings)))
+        script = re.sub(r"const shareTableArchive = .*?;\n", lambda match: "const shareTableArchive = {};\n".format(json.dumps(archive)), script)
+        path = script_dir / "codec.js"
+        path.write_text("const companyData = {};\n{}\nconsole.log(JSON.stringify({}));\n".format(
+            json.dumps(company_data), script, body), encoding="utf-8")
+        return json.loads(subprocess.check_output(["node", str(path)]))
+
+    run.parser = parser
+    return run
+
+
+def share_state(companies, charters=None, buildings=(), disabled_companies=(), ownership=(), limit=0):
+    return {"companies": list(companies), "charters": charters or {}, "disabledBuildings": list(buildings),
+            "disabledCompanies": list(disabled_companies), "disabledOwnership": list(ownership), "companyLimit": limit}
+
+
+def test_share_code_round_trip(share_codec):
+    parser = share_codec.parser
+    companies, buildings = parser.get_share_id_tables()
+    chartered = next(name for name in companies if parser.companies[name]["extension_building_types"])
+    state = share_state([companies[5], chartered, companies[0]],
+                        charters={chartered: parser.companies[chartered]["extension_building_types"][0]},
+                        buildings=buildings[:3], disabled_companies=companies[10:40], limit=5)
+
+    decoded = share_codec(companies, buildings, {}, "decodeShareCode(encodeShareCode({}))".format(json.dumps(state)))
+
+    assert decoded["companies"] == state["companies"]
+    assert decoded["charters"] == state["charters"]
+    assert decoded["disabledBuildings"] == sorted(state["disabledBuildings"], key=buildings.index)
+    assert decoded["disabledCompanies"] == state["disabledCompanies"]
+    assert decoded["companyLimit"] == 5
+
+
+def test_share_code_fingerprint_matches_generator(share_codec):
+    parser = share_codec.parser
+    companies, buildings = parser.get_share_id_tables()
+    fingerprint = share_codec(companies, buildings, {}, "getShareTableFingerprint()")
+
+    assert fingerprint == parser.get_share_table_fingerprint(companies, buildings)
+    # The fingerprint is a pure function of the key tables
+    assert parser.get_share_table_fingerprint(list(companies), list(buildings)) == fingerprint
+    assert parser.get_share_table_fingerprint(companies[1:], buildings) != fingerprint
+
+
+def test_share_code_from_archived_table_decodes_against_current_keys(share_codec):
+    parser = share_codec.parser
+    companies, buildings = parser.get_share_id_tables()
+    # An earlier patch had one more company and building, which shifts every ID after them
+    old_companies = ["company_aaa_retired"] + companies
+    old_buildings = ["building_aaa_retired"] + buildings
+    old_fingerprint = parser.get_share_table_fingerprint(old_companies, old_buildings)
+    state = share_state([companies[3], "company_aaa_retired", companies[7]],
+                        buildings=["building_aaa_retired", buildings[2]], disabled_companies=[companies[1]])
+    code = share_codec(old_companies, old_buildings, {}, "encodeShareCode({})".format(json.dumps(state)))
+
+    archive = {str(old_fingerprint): {"companies": old_companies, "buildings": old_buildings}}
+    decoded = share_codec(companies, buildings, archive, "decodeShareCode({})".format(json.dumps(code)))
+    assert decoded["companies"] == [companies[3], companies[7]]
+    assert decoded["disabledBuildings"] == [buildings[2]]
+    assert decoded["disabledCompanies"] == [companies[1]]
+
+    # Without the archived table the code is rejected rather than read against the wrong IDs
+    assert share_codec(companies, buildings, {}, "decodeShareCode({})".format(json.dumps(code))) is None
+
+
+def test_tooltip_country_matches_page_country_names(parser):
+    country_names = json.loads(parser._get_country_names_js())
+    for company_name, data in parser.companies.items():
+        country = data.get("country")
+        tooltip = parser._get_tooltip_record(company_name, data)
+        if country in country_names:
+            assert tooltip["c"].endswith(" " + country_names[country])
+            assert country_names[country] == parser.get_country_name(country)
+        else:
+            assert "c" not in tooltip
+
+
+def test_intern_table_round_trips_names_and_ids():
+    table = InternTable()
+    ids = [table.intern(name) for name in ("iron", "coal", "iron", "steel")]
+
+    assert ids == [0, 1, 0, 2]
+    assert [table.name(name_id) for name_id in ids] == ["iron", "coal", "iron", "steel"]
+    assert table.name(table.intern("".join(["co", "al"]))) is table.name(1)
+
+
+def test_company_to_dict_round_trips_checked_in_records():
+    import pickle
+    with open(os.path.join(ROOT, "company_data_v6.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    for company_name, record in data.items():
+        company = Company(record)
+        assert company.to_dict() == record, company_name
+        assert pickle.loads(pickle.dumps(company)) == company
+
+    company = Company({"building_types": ["building_iron_mine"], "wiki_note": "extra"})
+    assert company.to_dict() == {"building_types": ["building_iron_mine"], "extension_building_types": [],
+                                 "possible_prestige_goods": [], "wiki_note": "extra"}
+    assert [Company.buildings.name(building_id) for building_id in company.building_ids] == ["building_iron_mine"]
+    assert company.base_mask == 1 << company.building_ids[0]
+
+
+def test_building_id_mask_and_popcount():
+    assert building_id_mask([]) == 0
+    assert building_id_mask([0, 3, 3, 70]) == (1 << 0) | (1 << 3) | (1 << 70)
+    assert popcount(building_id_mask([0, 3, 3, 70])) == 3
+    assert popcount(0) == 0
+
+
+def test_coverage_masks_decode_to_company_buildings(parser):
+    names = sorted(parser.companies)[:20]
+    base = set()
+    charters = set()
+    for name in names:
+        base.update(parser.companies[name].building_types)
+        charters.update(parser.companies[name].extension_building_types)
+
+    base_mask = parser.get_coverage_mask(names, include_charters=False)
+    full_mask = parser.get_coverage_mask(names)
+    assert set(parser.get_mask_buildings(base_mask)) == base
+    assert set(parser.get_mask_buildings(full_mask)) == base | charters
+    assert popcount(full_mask) == len(base | charters)
+    ids = [Company.buildings.ids[building] for building in parser.get_mask_buildings(full_mask)]
+    assert ids == sorted(ids)
+
+    building = parser.companies[names[0]].building_types[0]
+    assert base_mask & parser.get_building_bit(building)
+    assert parser.get_building_bit("building_no_company_has") == 0
+    assert parser.get_coverage_mask(["company_missing"]) == 0
+
+
+@pytest.fixture
+def wiki_parser(parser):
+    parser.wiki_companies = {
+        "company_rheinische_stahlwerke": "Germany",
+        "company_baltic_amber_guild": "Russia",
+        "company_nordic_timber_trading": "Sweden",
+        "company_nordic_timber_traders": "Norway",
+    }
+    return parser
+
+
+def test_find_wiki_candidates_scores_trigram_dice(wiki_parser):
+    assert wiki_parser.find_wiki_candidates("company_rheinische_stahlwerke") == [("company_rheinische_stahlwerke", 1.0)]
+    assert wiki_parser.find_wiki_candidates("company_zzz_qqq") == []
+    ranked = wiki_parser.rank_wiki_candidates("company_nordic_timber_trade")
+    assert [key for key, score in ranked] == ["company_nordic_timber_traders", "company_nordic_timber_trading"]
+
+
+def test_find_wiki_country_assigns_only_clear_fuzzy_matches(wiki_parser):
+    threshold = Victoria3CompanyParserV6Final.WIKI_MATCH_AUTO_SCORE
+    # A spelling variant of one wiki name is assigned
+    assert wiki_parser.find_wiki_country_for_company("company_rheinische_stahlwerk") == "DEU"
+    assert wiki_parser.wiki_match_log["company_rheinische_stahlwerk"]["method"] == "fuzzy"
+
+    # A different company that shares most of a wiki name stays below the threshold
+    near_miss = "company_baltic_silver_guild"
+    assert 0.5 < wiki_parser.rank_wiki_candidates(near_miss)[0][1] < threshold
+    assert wiki_parser.find_wiki_country_for_company(near_miss) is None
+    assert wiki_parser.wiki_match_log[near_miss]["method"] == "review"
+
+    # Two close wiki names are within the margin of each other, so neither is picked
+    ambiguous = "company_nordic_timber_trade"
+    (_, best), (_, runner_up) = wiki_parser.rank_wiki_candidates(ambiguous)
+    assert best >= threshold and best - runner_up < Victoria3CompanyParserV6Final.WIKI_MATCH_MARGIN
+    assert wiki_parser.find_wiki_country_for_company(ambiguous) is None
+    assert wiki_parser.wiki_match_log[ambiguous]["method"] == "review"
+
+
+def test_export_sqlite_answers_indexed_building_query(parser, tmp_path):
+    # URI characters in the path must not be read as query string or fragment
+    path = parser.export_sqlite(str(tmp_path / "export #1?x%20.sqlite"))
+    building = "building_steel_mills"
+    expected = sorted(name for name, data in parser.companies.items()
+                      if building in data.building_types or building in data.extension_building_types)
+    base = sorted(name for name, data in parser.companies.items() if building in data.building_types)
+
+    with CompanyDatabase(path) as database:
+        assert database.companies_by_building(building) == expected
+        assert database.companies_by_building(building, "base") == base
+        plan = database.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT company_id FROM company_buildings WHERE building_id = 1").fetchall()
+        assert any("company_buildings_by_building" in row[-1] for row in plan)
+
+
+@pytest.mark.parametrize("tag", ["../1.9", "1.9/../../x", "sub/1.9", "sub\\1.9", ".."])
+def test_dataset_tags_cannot_leave_the_versions_directory(parser, tmp_path, monkeypatch, tag):
+    monkeypatch.setattr(parser, "_get_dataset_path", lambda *parts: os.path.join(str(tmp_path), *parts))
+    with pytest.raises(ValueError):
+        parser.store_dataset(tag)
+    with pytest.raises(ValueError):
+        parser.load_dataset(tag)
+    assert not os.listdir(str(tmp_path))
+
+
+def test_prune_datasets_honours_keep_zero(parser, tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, "_get_dataset_path", lambda *parts: os.path.join(str(tmp_path), *parts))
+    monkeypatch.setattr(parser, "DATASET_KEEP", 2)
+    for tag in ("1.8", "1.9", "1.10"):
+        parser.store_dataset(tag)
+    assert parser.list_datasets() == ["1.9", "1.10"]
+
+    parser.prune_datasets(keep=0)
+    assert parser.list_datasets() == []
+    assert not any(files for _, _, files in os.walk(str(tmp_path / "objects")))
@@ -12,15 +12,483 @@ Victoria 3 Company Data Parser v6 - Final: All Bugs Fixed
 
 import os
 import re
+import sys
 # from pathlib import Path  # Not available in Python 2.7
 from collections import defaultdict, Counter
 import json
 from datetime import datetime
 
+
+class InternTable(object):
+    """Two-way name <-> integer ID table; names are interned so every record shares one string object"""
+    __slots__ = ('ids', 'names')
+    
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+    
+    def intern(self, name):
+        """Get the ID of a name, adding it to the table if it is new"""
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name = sys.intern(name)
+            name_id = len(self.names)
+            self.ids[name] = name_id
+            self.names.append(name)
+        return name_id
+    
+    def name(self, name_id):
+        """Get the interned name for an ID"""
+        return self.names[name_id]
+
+
+class DataRegistry(object):
+    """Versioned lookup tables from data_registry.json, validated and frozen on first load"""
+    VERSION = 1
+    REQUIRED_TABLES = ('company_display_names', 'display_name_fallbacks', 'historical_icon_mappings', 'file_countries',
+                       'company_country_overrides', 'wiki_country_codes', 'wiki_company_countries', 'building_icon_names',
+                       'building_display_name_overrides', 'prestige_icon_names', 'country_names')
+    # One instance per file per process
+    _loaded = {}
+    
+    def __init__(self, path, game_version, tables, fingerprint):
+        self.path = path
+        self.game_version = game_version
+        self.tables = tables
+        self.fingerprint = fingerprint
+    
+    @classmethod
+    def load(cls, path):
+        """Load a registry file once, check its version and table shapes, and wrap every table read-only"""
+        import hashlib
+        from types import MappingProxyType
+        path = os.path.abspath(path)
+        if path in cls._loaded:
+            return cls._loaded[path]
+        
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        if data.get('version') != cls.VERSION:
+            raise ValueError("Data registry {} has version {}, expected {}".format(path, data.get('version'), cls.VERSION))
+        tables = data.get('tables', {})
+        for name in cls.REQUIRED_TABLES:
+            table = tables.get(name)
+            if not isinstance(table, dict):
+                raise ValueError("Data registry {} is missing table '{}'".format(path, name))
+            for key, value in table.items():
+                if not isinstance(value, str) and value is not None:
+                    raise ValueError("Data registry table '{}' has a non-string value for '{}'".format(name, key))
+        
+        frozen = MappingProxyType(dict((name, MappingProxyType(table)) for name, table in tables.items()))
+        registry = cls(path, data.get('game_version'), frozen, hashlib.sha256(raw).hexdigest())
+        cls._loaded[path] = registry
+        return registry
+    
+    def __getitem__(self, name):
+        return self.tables[name]
+    
+    def __reduce__(self):
+        # Worker processes reload the file instead of pickling the read-only tables
+        return (DataRegistry.load, (self.path,))
+
+
+def iter_raw_data(path):
+    """Read (company name, record) pairs from an NDJSON raw data file one line at a time, checking its schema header"""
+    import codecs
+    with codecs.open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}').get('schema')
+        if not header or header.get('format') != 'company_data':
+            raise ValueError("{} has no company_data schema header".format(path))
+        if header['schema_version'] != Victoria3CompanyParserV6Final.RAW_DATA_SCHEMA_VERSION:
+            raise ValueError("{} uses raw data schema {}, expected {}".format(
+                path, header['schema_version'], Victoria3CompanyParserV6Final.RAW_DATA_SCHEMA_VERSION))
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record['name'], record['data']
+
+
+def building_id_mask(building_ids):
+    """Get the coverage bitmask with one bit per building ID"""
+    mask = 0
+    for building_id in building_ids:
+        mask |= 1 << building_id
+    return mask
+
+
+def popcount(mask):
+    """Count the buildings in a coverage bitmask"""
+    return bin(mask).count('1')
+
+
+class Company(object):
+    """Compact company record with integer IDs for buildings, goods, countries and states.
+    
+    Reads and writes like the dict the parser used to store (data['building_types'], data.get(...)),
+    with list fields held as tuples of interned strings. base_mask and charter_mask hold the
+    building coverage as bitmasks over Company.buildings IDs.
+    """
+    FIELDS = ('building_types', 'extension_building_types', 'possible_prestige_goods', 'flavored_company',
+              'formation_requirements', 'prosperity_bonuses', 'country', 'country_confidence',
+              'ownership_category', 'special_requirements', 'starts_enacted', 'starting_country', 'display_name')
+    LIST_FIELDS = frozenset(['building_types', 'extension_building_types', 'possible_prestige_goods',
+                             'formation_requirements', 'prosperity_bonuses', 'special_requirements'])
+    __slots__ = FIELDS + ('building_ids', 'extension_building_ids', 'prestige_good_ids', 'country_id', 'state_ids',
+                          'base_mask', 'charter_mask', 'extra')
+    
+    # Shared by every record, so IDs are comparable across companies
+    buildings = InternTable()
+    goods = InternTable()
+    countries = InternTable()
+    states = InternTable()
+    _field_set = frozenset(FIELDS)
+    
+    def __init__(self, data=None):
+        self.extra = None
+        self.building_types = ()
+        self.extension_building_types = ()
+        self.possible_prestige_goods = ()
+        self.building_ids = ()
+        self.extension_building_ids = ()
+        self.base_mask = 0
+        self.charter_mask = 0
+        self.prestige_good_ids = ()
+        self.country_id = None
+        self.state_ids = ()
+        for key, value in (data or {}).items():
+            self[key] = value
+    
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+            return
+        if key in self.LIST_FIELDS:
+            value = tuple(sys.intern(item) if isinstance(item, str) else item for item in value)
+        elif isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+        
+        # Keep the ID columns in step with the string fields
+        if key == 'building_types':
+            self.building_ids = tuple(self.buildings.intern(name) for name in value)
+            self.base_mask = building_id_mask(self.building_ids)
+        elif key == 'extension_building_types':
+            self.extension_building_ids = tuple(self.buildings.intern(name) for name in value)
+            self.charter_mask = building_id_mask(self.extension_building_ids)
+        elif key == 'possible_prestige_goods':
+            self.prestige_good_ids = tuple(self.goods.intern(name) for name in value)
+        elif key == 'country':
+            self.country_id = self.countries.intern(value) if value else None
+        elif key == 'formation_requirements':
+            self.state_ids = tuple(self.states.intern(state) for state in re.findall(r'\bSTATE_\w+', ' '.join(value)))
+    
+    def __getitem__(self, key):
+        try:
+            if key in self._field_set:
+                return getattr(self, key)
+            if self.extra is not None:
+                return self.extra[key]
+        except AttributeError:
+            pass
+        raise KeyError(key)
+    
+    def __contains__(self, key):
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def keys(self):
+        keys = [key for key in self.FIELDS if hasattr(self, key)]
+        return keys + list(self.extra or ())
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def values(self):
+        return [self[key] for key in self.keys()]
+    
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+    
+    def to_dict(self):
+        """Get the record as a plain dict with lists, as saved in company_data_v6.json"""
+        return dict((key, list(value) if key in self.LIST_FIELDS else value) for key, value in self.items())
+    
+    def __getstate__(self):
+        return self.to_dict()
+    
+    def __setstate__(self, state):
+        self.__init__(state)
+    
+    def __eq__(self, other):
+        if isinstance(other, Company):
+            other = other.to_dict()
+        return self.to_dict() == other
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return 'Company({!r})'.format(self.to_dict())
+
+
+class CompanyDatabase(object):
+    """Read-only queries over the SQLite export written by Victoria3CompanyParserV6Final.export_sqlite"""
+    SCHEMA = '''
+        CREATE TABLE countries (code TEXT PRIMARY KEY, name TEXT NOT NULL);
+        CREATE TABLE states (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE buildings (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, display_name TEXT NOT NULL);
+        CREATE TABLE prestige_goods (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, display_name TEXT NOT NULL,
+                                     base_good TEXT);
+        CREATE TABLE companies (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, display_name TEXT NOT NULL,
+                                country_code TEXT, country_confidence TEXT, ownership_category TEXT,
+                                flavored INTEGER NOT NULL);
+        CREATE TABLE company_buildings (company_id INTEGER NOT NULL REFERENCES companies(id),
+                                        building_id INTEGER NOT NULL REFERENCES buildings(id),
+                                        kind TEXT NOT NULL CHECK (kind IN ('base', 'charter')),
+                                        PRIMARY KEY (company_id, building_id, kind));
+        CREATE TABLE company_prestige_goods (company_id INTEGER NOT NULL REFERENCES companies(id),
+                                             prestige_good_id INTEGER NOT NULL REFERENCES prestige_goods(id),
+                                             PRIMARY KEY (company_id, prestige_good_id));
+        CREATE TABLE requirements (company_id INTEGER NOT NULL REFERENCES companies(id), position INTEGER NOT NULL,
+                                   kind TEXT NOT NULL CHECK (kind IN ('formation', 'special', 'prosperity')),
+                                   text TEXT NOT NULL, PRIMARY KEY (company_id, kind, position));
+        CREATE TABLE company_states (company_id INTEGER NOT NULL REFERENCES companies(id),
+                                     state_id INTEGER NOT NULL REFERENCES states(id),
+                                     PRIMARY KEY (company_id, state_id));
+        CREATE TABLE starting_companies (company_id INTEGER PRIMARY KEY REFERENCES companies(id), country_code TEXT);
+        CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE INDEX company_buildings_by_building ON company_buildings (building_id, kind);
+        CREATE INDEX company_prestige_goods_by_good ON company_prestige_goods (prestige_good_id);
+        CREATE INDEX company_states_by_state ON company_states (state_id);
+        CREATE INDEX companies_by_country ON companies (country_code);
+        CREATE INDEX companies_by_ownership ON companies (ownership_category);
+        CREATE INDEX prestige_goods_by_base_good ON prestige_goods (base_good);
+    '''
+    
+    def __init__(self, path):
+        import sqlite3
+        from pathlib import Path
+        # as_uri() percent-encodes '?', '#' and '%' so they stay part of the file name
+        self.connection = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + '?mode=ro', uri=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        """Close the database connection"""
+        self.connection.close()
+    
+    def _names(self, sql, *params):
+        return [row[0] for row in self.connection.execute(sql, params)]
+    
+    def companies_by_building(self, building, kind=None):
+        """Company names with a building as a base building ('base'), a charter ('charter') or either"""
+        sql = ('SELECT DISTINCT c.name FROM company_buildings cb JOIN buildings b ON b.id = cb.building_id '
+               'JOIN companies c ON c.id = cb.company_id WHERE b.name = ?')
+        if kind is None:
+            return self._names(sql + ' ORDER BY c.name', building)
+        return self._names(sql + ' AND cb.kind = ? ORDER BY c.name', building, kind)
+    
+    def companies_by_country(self, country_code):
+        """Company names assigned to a country code"""
+        return self._names('SELECT name FROM companies WHERE country_code = ? ORDER BY name', country_code)
+    
+    def companies_by_ownership(self, ownership_category):
+        """Company names with an ownership category (e.g. 'Full Capitalist')"""
+        return self._names('SELECT name FROM companies WHERE ownership_category = ? ORDER BY name', ownership_category)
+    
+    def companies_with_prestige_for_good(self, good):
+        """Company names that can produce a prestige version of a base good (e.g. 'steel')"""
+        return self._names('SELECT DISTINCT c.name FROM company_prestige_goods cp '
+                           'JOIN prestige_goods g ON g.id = cp.prestige_good_id '
+                           'JOIN companies c ON c.id = cp.company_id WHERE g.base_good = ? ORDER BY c.name', good)
+    
+    def starting_companies(self, country_code=None):
+        """Company names that are enacted at game start, optionally for one country"""
+        sql = 'SELECT c.name FROM starting_companies s JOIN companies c ON c.id = s.company_id'
+        if country_code is None:
+            return self._names(sql + ' ORDER BY c.name')
+        return self._names(sql + ' WHERE s.country_code = ? ORDER BY c.name', country_code)
+
+
+def _resize_image_variants(job):
+    """Write the resized variants of one image and return the sizes written (runs in a worker process)"""
+    from PIL import Image
+    source_path, outputs = job
+    written = []
+    with Image.open(source_path) as image:
+        image.load()
+        for size, output_path in outputs:
+            # Only downscale; larger sizes are served from the original file
+            if max(image.size) <= size:
+                continue
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            output_dir = os.path.dirname(output_path)
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            variant.save(output_path, optimize=True)
+            written.append(size)
+    return source_path, written
+
+
+def _convert_dds_to_png(job):
+    """Decode one DDS texture (DXT1/3/5, BC4-7) and write it as PNG (runs in a worker process)"""
+    from PIL import Image
+    source_path, output_path = job
+    try:
+        with Image.open(source_path) as image:
+            image.load()
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA')
+            output_dir = os.path.dirname(output_path)
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            image.save(output_path, 'PNG')
+        return source_path, None
+    except Exception as e:
+        return source_path, str(e)
+
+
+def _compress_output(job):
+    """Write the .gz (and .br when brotli is available) siblings of one build output (runs in a worker process)"""
+    import gzip
+    source_path, use_brotli = job
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    # mtime=0 keeps the .gz bytes identical for identical input
+    with open(source_path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if use_brotli:
+        import brotli
+        with open(source_path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+    return source_path
+
+
+_section_snapshot = None
+
+
+def _init_section_worker(snapshot):
+    """Keep the parser snapshot used by _render_building_section_job (runs once per worker process)"""
+    global _section_snapshot
+    _section_snapshot = snapshot
+
+
+def _render_building_section_job(job):
+    """Render one building section from the worker's parser snapshot (runs in a worker process)"""
+    building, wiki_building_order, usage_count = job
+    return _section_snapshot._render_building_section(building, wiki_building_order, usage_count)
+
+
 class Victoria3CompanyParserV6Final:
     # Game version - update this when parsing a new patch
     GAME_VERSION = "1.11"
-    def __init__(self, game_directory="game", use_subject_relationships=False):
+    # Name mappings, display names and country assignments maintained per patch (see DataRegistry)
+    DATA_REGISTRY_FILE = "data_registry.json"
+    # Ownership categories in display order (filter section, hiding CSS and share codes)
+    OWNERSHIP_TYPES = ['Full Capitalist', 'Partial Aristocrat', 'Partial Bureaucrat', 'Partial Academic', 'Partial Shopkeeper']
+    # Resized company icon/background variants are written to companies/png_<size>/
+    ICON_VARIANT_SIZES = (32, 64, 256)
+    ICON_VARIANT_MANIFEST = "companies/icon_variants.json"
+    # Source hashes of the game's company_icons DDS files converted into companies/png/
+    DDS_CONVERSION_MANIFEST = "companies/dds_sources.json"
+    # Sprite atlases: (name, folder, file prefix, tile size); coordinates are stored in icons/atlas.json.
+    # Tiles are the largest size the page draws each group at (building icons 32px, prestige/goods icons 24px)
+    ICON_ATLAS_GROUPS = (
+        ('buildings', 'buildings', '64px-Building_', 32),
+        ('prestige', 'icons', '24px-Prestige_', 24),
+        ('goods', 'icons', '40px-Goods_', 24),
+    )
+    ICON_ATLAS_MANIFEST = "icons/atlas.json"
+    # Groups whose tiles would cover more than this many pixels are split over several atlas images
+    ICON_ATLAS_MAX_PIXELS = 256 * 256
+    # PNG header index of companies/, icons/ and buildings/ (cache is keyed by file size and mtime)
+    IMAGE_INDEX_FOLDERS = ('companies', 'icons', 'buildings')
+    IMAGE_INDEX_CACHE = "image_index.json"
+    # Referenced images above either limit are reported as oversized at build time
+    IMAGE_MAX_BYTES = 200 * 1024
+    IMAGE_MAX_DIMENSION = 512
+    # Byte-identical images collapsed by deduplicate_assets (--dedupe-assets): {duplicate path: canonical path}
+    ASSET_ALIAS_MANIFEST = "companies/asset_aliases.json"
+    # Rendered HTML fragments keyed by name with the fingerprint of their inputs (see generate_html_report)
+    FRAGMENT_CACHE = "html_fragments.json"
+    # Build outputs served with precompressed .gz/.br siblings; source hashes are kept in the manifest
+    COMPRESSED_OUTPUTS = ('index.html', 'sw.js', 'precache-manifest.json', 'company_data_v6.json')
+    COMPRESSION_MANIFEST = "compressed_outputs.json"
+    # Page-weight and DOM budgets checked by save_page_report; page_budgets.json overrides individual limits
+    PAGE_BUDGETS = {
+        'total_bytes': 3584 * 1024,
+        'css_bytes': 150 * 1024,
+        'yalps_bundle_bytes': 64 * 1024,
+        'max_building_section_bytes': 200 * 1024,
+        'max_data_blob_bytes': 400 * 1024,
+        'elements': 30000,
+        'table_rows': 1200,
+        'css_rules': 600,
+        'inline_handlers': 6000,
+        'image_bytes': 24 * 1024 * 1024,
+    }
+    PAGE_BUDGET_FILE = "page_budgets.json"
+    PAGE_REPORT_FILE = "page_report.json"
+    SQLITE_EXPORT = "company_data_v6.sqlite"
+    # Every share-code ID table the page has been built with, keyed by fingerprint (tracked)
+    SHARE_TABLE_ARCHIVE = "share_tables.json"
+    # Parsed snapshots per patch: versions/<tag>.json manifests over content-addressed objects/<hash>.json records
+    DATASET_STORE = "datasets"
+    DATASET_KEEP = 10
+    PATCH_CHANGELOG = "patch_changelog.json"
+    # Bumped when the raw data record layout changes (written in the NDJSON schema header)
+    RAW_DATA_SCHEMA_VERSION = 1
+    # Field order of the encoded companyData records embedded in the page
+    COMPANY_DATA_FIELDS = ('name', 'country', 'country_confidence', 'country_info', 'requirements', 'bonuses',
+                           'prosperity_bonuses_text', 'prestige_goods', 'building_types', 'extension_building_types',
+                           'special_requirements', 'starts_enacted', 'starting_country', 'ownership_category')
+    # Fields of the encoded companyData and tooltipData records that hold pageStrings indices; every other
+    # field is embedded as is, so numbers in it are never mistaken for string references
+    COMPANY_DATA_STRING_FIELDS = ('name', 'country', 'country_confidence', 'country_info', 'requirements', 'bonuses',
+                                  'prosperity_bonuses_text', 'prestige_goods', 'building_types', 'extension_building_types',
+                                  'special_requirements', 'starting_country', 'ownership_category')
+    TOOLTIP_STRING_FIELDS = ('i', 'h', 'c', 'r', 's', 'p', 'b', 'x')
+    # Tooltip icon and label for each special requirement type
+    SPECIAL_REQUIREMENT_ICONS = {'journal_entry': '📚', 'primary_culture': '🛑', 'technology': '💡',
+                                 'law': '🔒', 'ideology': '🔒', 'diplomatic': '🔒'}
+    SPECIAL_REQUIREMENT_NAMES = {'journal_entry': 'Journal Entry Required', 'primary_culture': 'Primary Culture Required',
+                                 'technology': 'Technology Required', 'law': 'Law Required',
+                                 'ideology': 'Ideology Required', 'diplomatic': 'Diplomatic Status Required',
+                                 'regional': 'Regional Interest Required'}
+    # Record fields compared by diff_game_directory, with the names used in its report
+    DIFF_FIELDS = (('building_types', 'buildings'), ('extension_building_types', 'charters'),
+                   ('possible_prestige_goods', 'prestige goods'), ('formation_requirements', 'requirements'),
+                   ('special_requirements', 'special requirements'), ('prosperity_bonuses', 'prosperity bonuses'),
+                   ('ownership_category', 'ownership category'), ('starts_enacted', 'starts enacted'),
+                   ('starting_country', 'starting country'), ('country', 'country'), ('display_name', 'display name'))
+    # Fuzzy wiki name matches are assigned automatically above this trigram score when they beat the runner-up by the margin
+    WIKI_MATCH_AUTO_SCORE = 0.75
+    WIKI_MATCH_MARGIN = 0.15
+    WIKI_MATCH_REPORT = "wiki_matches.json"
+    # Fewer stale building sections than this are rendered serially (a process pool costs more than it saves)
+    PARALLEL_SECTION_MIN = 16
+
+    def __init__(self, game_directory="game", use_subject_relationships=False, parse_game_files=True):
+        # Relative input paths are resolved against the script directory, not the current directory
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        game_directory = os.path.join(base_dir, game_directory)
         self.game_directory = game_directory
         self.use_subject_relationships = use_subject_relationships  # Flag to control subject relationship usage
         self.company_types_dir = os.path.join(game_directory, "company_types")
@@ -28,7 +496,7 @@ class Victoria3CompanyParserV6Final:
         self.diplomacy_file = os.path.join(game_directory, "history", "diplomacy", "00_subject_relationships.txt")
         self.countries_history_dir = os.path.join(game_directory, "history", "countries")
         self.prestige_goods_dir = os.path.join(game_directory, "prestige_goods", "00_prestige_goods.txt")
-        self.wiki_file = "wiki/flavored.wiki"
+        self.wiki_file = os.path.join(base_dir, "wiki", "flavored.wiki")
 
         self.companies = {}
         self.all_buildings = set()
@@ -36,16 +504,20 @@ class Victoria3CompanyParserV6Final:
         self.state_to_country = {}
         self.subject_relationships = {}  # Maps subject -> overlord
         self.wiki_companies = {}
+        self.wiki_match_log = {}  # Maps company name -> how its wiki country was found (for review)
         self.companies_at_game_start = set()  # Set of company names that exist at game start (1836)
         self.company_starting_countries = {}  # Maps company name -> country tag
 
+        self.setup_data_registry()
         self.setup_building_to_goods()
         self.setup_country_flags()
         self.setup_country_names()
         self.setup_prestige_good_names()
         self.setup_company_icon_mapping()
 
-        # Parse data
+        # Parse data (skipped when a stored dataset will be loaded instead)
+        if not parse_game_files:
+            return
         self.parse_state_to_country_mappings()
         if self.use_subject_relationships:
             self.parse_subject_relationships()
@@ -54,6 +526,18 @@ class Victoria3CompanyParserV6Final:
         self.parse_prestige_goods()
         self.parse_all_companies()
 
+    def setup_data_registry(self):
+        """Load the shared lookup tables from data_registry.json"""
+        self.registry = DataRegistry.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.DATA_REGISTRY_FILE))
+        if self.registry.game_version != self.GAME_VERSION:
+            print("WARNING: Data registry is for game version {}, parser is set to {}".format(
+                self.registry.game_version, self.GAME_VERSION))
+    
+    @property
+    def historical_mappings(self):
+        """Company name -> historical_company_icons file name, from the data registry"""
+        return self.registry['historical_icon_mappings']
+    
     def setup_building_to_goods(self):
         """Map building types to their primary goods for icon selection"""
         self.building_to_goods = {
@@ -127,21 +611,7 @@ class Victoria3CompanyParserV6Final:
         
     def setup_country_names(self):
         """Map country codes to display names"""
-        self.country_names = {
-            'USA': 'United States', 'GBR': 'Great Britain', 'FRA': 'France', 'DEU': 'Germany',
-            'PRU': 'Prussia', 'AUS': 'Austria-Hungary', 'RUS': 'Russia', 'JAP': 'Japan',
-            'CHI': 'China', 'ITA': 'Italy', 'SAR': 'Sardinia-Piedmont', 'SPA': 'Spain',
-            'POR': 'Portugal', 'NET': 'Netherlands', 'BEL': 'Belgium', 'SWI': 'Switzerland',
-            'DEN': 'Denmark', 'SWE': 'Sweden', 'NOR': 'Norway', 'FIN': 'Finland',
-            'ARG': 'Argentina', 'BRZ': 'Brazil', 'CHL': 'Chile', 'BOL': 'Bolivia', 'PEU': 'Peru',
-            'COL': 'Colombia', 'CLM': 'Colombia', 'VNZ': 'Venezuela', 'ECU': 'Ecuador', 'URU': 'Uruguay', 'PRG': 'Paraguay',
-            'MEX': 'Mexico', 'CUB': 'Cuba', 'HAI': 'Haiti', 'CAN': 'Canada', 'TUR': 'Turkey',
-            'EGY': 'Egypt', 'PER': 'Persia', 'AFG': 'Afghanistan', 'ETH': 'Ethiopia', 'MAD': 'Madagascar',
-            'SAF': 'South Africa', 'MOR': 'Morocco', 'TUN': 'Tunisia', 'GRE': 'Greece', 'SER': 'Serbia',
-            'BUL': 'Bulgaria', 'ROM': 'Romania', 'HUN': 'Hungary', 'POL': 'Poland',
-            'KOR': 'Korea', 'SIA': 'Siam', 'BUR': 'Burma', 'BIC': 'British India', 'AST': 'Australia',
-            'PHI': 'Philippines', 'DAI': 'Vietnam', 'LAN': 'Lanfang', 'KOK': 'Turkestan', 'SOK': 'Niger'
-        }
+        self.country_names = dict(self.registry['country_names'])
 
     def setup_country_flags(self):
         """Map country codes to flag emojis"""
@@ -175,195 +645,7 @@ class Victoria3CompanyParserV6Final:
     
     def get_country_name(self, country_code):
         """Get full country name for a country code"""
-        country_names = {
-            'USA': 'United States',
-            'GBR': 'Great Britain',
-            'FRA': 'France',
-            'DEU': 'Germany',
-            'PRU': 'Prussia',
-            'AUS': 'Austria-Hungary',
-            'RUS': 'Russia',
-            'JAP': 'Japan',
-            'CHI': 'China',
-            'ITA': 'Italy',
-            'SAR': 'Sardinia-Piedmont',
-            'SPA': 'Spain',
-            'TUR': 'Turkey',
-            'EGY': 'Egypt',
-            'PER': 'Persia',
-            'SWE': 'Sweden',
-            'NOR': 'Norway',
-            'DEN': 'Denmark',
-            'NET': 'Netherlands',
-            'BEL': 'Belgium',
-            'SWI': 'Switzerland',
-            'BAD': 'Baden',
-            'SAX': 'Saxony',
-            'BAV': 'Bavaria',
-            'WUR': 'Württemberg',
-            'HAN': 'Hanover',
-            'HES': 'Hesse',
-            'OLD': 'Oldenburg',
-            'MEC': 'Mecklenburg',
-            'MEX': 'Mexico',
-            'BRZ': 'Brazil',
-            'ARG': 'Argentina',
-            'CHL': 'Chile',
-            'BOL': 'Bolivia',
-            'NPU': 'Peru-Bolivia',
-            'VNZ': 'Venezuela',
-            'CLM': 'Gran Colombia',
-            'COL': 'Colombia',
-            'PRG': 'Paraguay',
-            'URU': 'Uruguay',
-            'CRI': 'Costa Rica',
-            'GUA': 'Guatemala',
-            'HAI': 'Haiti',
-            'DOM': 'Dominican Republic',
-            'POR': 'Portugal',
-            'GRE': 'Greece',
-            'SER': 'Serbia',
-            'ROM': 'Romania',
-            'WAL': 'Wallachia',
-            'MOL': 'Moldavia',
-            'BUL': 'Bulgaria',
-            'ALB': 'Albania',
-            'MON': 'Montenegro',
-            'BOS': 'Bosnia',
-            'CRO': 'Croatia',
-            'HUN': 'Hungary',
-            'POL': 'Poland',
-            'FIN': 'Finland',
-            'LIT': 'Lithuania',
-            'LAT': 'Latvia',
-            'EST': 'Estonia',
-            'UKR': 'Ukraine',
-            'BYE': 'Belarus',
-            'GEO': 'Georgia',
-            'ARM': 'Armenia',
-            'AZB': 'Azerbaijan',
-            'KAZ': 'Kazakhstan',
-            'UZB': 'Uzbekistan',
-            'TUR': 'Turkestan',
-            'KOK': 'Kokand',
-            'KHI': 'Khiva',
-            'BUK': 'Bukhara',
-            'AFG': 'Afghanistan',
-            'KUN': 'Afghanistan',
-            'IND': 'India',
-            'BIC': 'British India',
-            'MYS': 'Mysore',
-            'HYD': 'Hyderabad',
-            'PNJ': 'Punjab',
-            'NEP': 'Nepal',
-            'BHU': 'Bhutan',
-            'SIA': 'Siam',
-            'BUR': 'Burma',
-            'DAI': 'Dai Nam',
-            'KOR': 'Korea',
-            'ETH': 'Ethiopia',
-            'EGY': 'Egypt',
-            'SUD': 'Sudan',
-            'MAD': 'Madagascar',
-            'ZAN': 'Zanzibar',
-            'OMN': 'Oman',
-            'PER': 'Persia',
-            'ARB': 'Arabian Peninsula',
-            'MOR': 'Morocco',
-            'TUN': 'Tunisia',
-            'TRI': 'Tripolitania',
-            'CYR': 'Cyrenaica',
-            'LIB': 'Liberia',
-            'HAW': 'Hawaii',
-            'TEX': 'Texas',
-            'CAL': 'California',
-            'DES': 'Deseret',
-            'CAN': 'Canada',
-            'HBC': 'Hudson Bay Company',
-            'NSW': 'New South Wales',
-            'VIC': 'Victoria',
-            'QLD': 'Queensland',
-            'WAS': 'Western Australia',
-            'SAS': 'South Australia',
-            'TAS': 'Tasmania',
-            'NZL': 'New Zealand',
-            'SAF': 'South Africa',
-            'NAT': 'Natal',
-            'ORA': 'Orange Free State',
-            'TRV': 'Transvaal',
-            'ZUL': 'Zululand',
-            'XHO': 'Xhosa',
-            'SOT': 'Basutoland',
-            'SWZ': 'Swaziland',
-            'BOT': 'Botswana',
-            'NAM': 'Namibia',
-            'ANG': 'Angola',
-            'MOZ': 'Mozambique',
-            'CON': 'Congo',
-            'CAM': 'Cameroon',
-            'NIG': 'Nigeria',
-            'GHA': 'Gold Coast',
-            'SEN': 'Senegal',
-            'GAM': 'Gambia',
-            'GUB': 'Guinea-Bissau',
-            'GUI': 'Guinea',
-            'SIE': 'Sierra Leone',
-            'LBR': 'Liberia',
-            'IVO': 'Ivory Coast',
-            'VOL': 'Upper Volta',
-            'MAL': 'Mali',
-            'NIG': 'Niger',
-            'CHA': 'Chad',
-            'CAR': 'Central African Republic',
-            'GAB': 'Gabon',
-            'EQG': 'Equatorial Guinea',
-            'STP': 'São Tomé and Príncipe',
-            'CPV': 'Cape Verde',
-            'PHI': 'Philippines',
-            'DEI': 'Dutch East Indies',
-            'BRU': 'Brunei',
-            'JOH': 'Johor',
-            'ATJ': 'Aceh',
-            'BAL': 'Bali',
-            'LOB': 'Lombok',
-            'BSK': 'Batak',
-            'LAN': 'Lanfang',
-            'SAK': 'Sarawak',
-            'SAB': 'North Borneo',
-            'PNG': 'Papua New Guinea',
-            'SOL': 'Solomon Islands',
-            'VAN': 'Vanuatu',
-            'FIJ': 'Fiji',
-            'SAM': 'Samoa',
-            'TON': 'Tonga',
-            'TAH': 'Tahiti',
-            'PNI': 'Pernambuco',
-            'LUX': 'Luxembourg',
-            'SIC': 'Sicily',
-            'PAP': 'Papal States',
-            'TUS': 'Tuscany',
-            'MOD': 'Modena',
-            'PAR': 'Parma',
-            'LUC': 'Lucca',
-            'VEN': 'Venice',
-            'LOM': 'Lombardy',
-            'SAV': 'Savoy',
-            'OZH': 'Kazakh Khanate',
-            'LAN': 'Lanfang Republic',
-            'KOK': 'Kokand',
-            'SOK': 'Sokoto Caliphate',
-            'BIC': 'British India',
-            'DAI': 'Dai Nam',
-            'SIA': 'Siam',
-            'BUR': 'Burma',
-            'NSW': 'New South Wales',
-            'CLM': 'Gran Colombia',
-            'KUN': 'Kunduz',
-            'ARB': 'Arabia',
-            'CON': 'French Congo',
-            'AST': 'Australia'
-        }
-        return country_names.get(country_code, country_code)  # Fallback to country code if not found
+        return self.country_names.get(country_code, country_code)  # Fallback to country code if not found
     
     def format_prosperity_bonuses(self, bonuses):
         """Format prosperity bonuses for inline display"""
@@ -384,39 +666,7 @@ class Victoria3CompanyParserV6Final:
     def get_company_display_name(self, company_name):
         """Get a better display name for the company"""
         # Special company name mappings for better display
-        display_names = {
-            'company_mav': 'MÁVAG',  # Magyar Államvasutak Gépgyára
-            'company_john_cockerill': 'Société anonyme John Cockerill',
-            'company_ford_motor': 'Ford Motor Company',
-            'company_fiat': 'FIAT',
-            'company_basf': 'BASF',
-            'company_us_steel': 'U.S. Steel Corporation',
-            'company_general_electric': 'General Electric',
-            'company_de_beers': 'De Beers Consolidated Mines Ltd.',
-            'company_krupp': 'Krupp',
-            'company_siemens_and_halske': 'Siemens & Halske',
-            'company_standard_oil': 'Standard Oil',
-            'company_united_fruit': 'United Fruit Company',
-            'company_orient_express': 'Orient Express',
-            'company_suez_company': 'Suez Canal Company',
-            'company_east_india_company': 'British East India Company',
-            'company_hbc': 'Hudson\'s Bay Company',
-            'company_russian_american_company': 'Russian-American Company',
-            'company_imperial_tobacco': 'Imperial Tobacco Company',
-            'company_guinness': 'Guinness',
-            'company_ap_moller': 'A.P. Møller',
-            'company_chr_hansens': 'Chr. Hansen\'s',
-            'company_philips': 'Philips',
-            'company_nokia': 'Nokia',
-            'company_ericsson': 'Ericsson',
-            'company_lkab': 'LKAB',
-            'company_norsk_hydro': 'Norsk Hydro',
-            'company_skoda': 'Škoda Works',
-            'company_mitsubishi': 'Mitsubishi',
-            'company_mitsui': 'Mitsui & Co.',
-            'company_kouppas': 'Kouppas',
-            'company_basileiades': 'Basileiades',
-        }
+        display_names = self.registry['display_name_fallbacks']
         
         # Return special name if available, otherwise format the default way
         if company_name in display_names:
@@ -428,187 +678,27 @@ class Victoria3CompanyParserV6Final:
         # Title case
         return base_name.title()
 
-    def get_company_icon_path(self, company_name):
-        """Get the icon path for a company, with comprehensive mapping"""
+    def get_company_icon_path(self, company_name, size=None):
+        """Get the icon path for a company, with comprehensive mapping (resized variant if size is given)"""
+        icon_path = self.find_company_icon_path(company_name)
+        if icon_path:
+            return self.get_icon_variant_path(icon_path, size)
+        
+        print("WARNING: Missing company icon for: {} (clean: {})".format(company_name, company_name.replace('company_', '')))
+        
+        # If no icon found, return placeholder
+        return self.get_icon_variant_path("companies/png/custom_companies_placeholder.png", size)
+    
+    def find_company_icon_path(self, company_name):
+        """Get the original icon file for a company, or None if it has none (the page then shows the placeholder)"""
         # Remove company_ prefix for icon lookup
         clean_name = company_name.replace('company_', '')
         
-        # Specific mappings for historical companies based on actual file names
-        self.historical_mappings = {
-            'us_steel': 'american_carnegie_steel',
-            'carnegie_steel': 'american_carnegie_steel', 
-            'ford_motor': 'american_ford',
-            'general_electric': 'american_general_electric',
-            'standard_oil': 'american_standard_oil',
-            'united_fruit': 'american_united_fruit_co',
-            'william_cramp': 'american_william_and_sons',
-            'anglo_persian_oil': 'anglo_persian_oil_company',
-            'ap_moller': 'ap_moller',
-            'bunge_born': 'argentina_bunge_y_born',
-            'centro_vitivinicola_nacional': 'argentina_centro_vitivinicola_nacional',
-            'cordoba_cenral_railway': 'argentina_cordoba_cenral_railway',
-            'guinness': 'arthur_guinness_son',
-            'basque_altos_hornos_de_vizcaya': 'basque_altos_hornos_de_vizcaya',
-            'estanifera_llallagua': 'bolivia_compania_estanifera_de_llallagua',
-            'csfa': 'bolivia_csfa',
-            'rossi': 'brazil_amadeo_rossi',
-            'pernambuco_textiles': 'brazil_companhia_fiacai_e_tecidos_de_pernambuco',
-            'estaleiro_maua': 'brazil_estaleiro_maua',
-            'fundicao_ipanema': 'brazil_fundicao_ipanema',
-            'kablin': 'brazil_kablin_irmaos_and_cia',
-            'sao_paulo_railway': 'brazil_sao_paulo_railway',
-            'ccci': 'ccci',
-            'orient_express': 'chemins_de_fer_orientaux',
-            'sudamericana_de_vapores': 'chile_csav',
-            'famae': 'chile_fabrica_de_armas_de_la_nacion',
-            'foochow_arsenal': 'chinese_foochow_arsenal',
-            'hanyang_arsenal': 'chinese_hanyang_arsenal',
-            'jingdezhen': 'chinese_jingdezhen_kilns',
-            'kaiping_mining': 'chinese_kaiping_mining_company',
-            'sansinena': 'compania_sansinena_de_carnes_congeladas',
-            'aker_mek': 'company_aker_mek',
-            'anglo_sicilian_sulphur_company': 'company_anglo_sicilian_sulphur_company',
-            'colt_firearms': 'company_colt_firearms',
-            'de_beers': 'company_de_beers',
-            'gebruder_thonet': 'company_gebruder_thonet',
-            'imperial_ethiopian_railways': 'company_imperial_ethiopian_railways',
-            'jiangnan_weaving_bureaus': 'company_jiangnan_weaving_bureaus',
-            'john_holt': 'company_john_holt',
-            'kinkozan_sobei': 'company_kinkozan_sobei',
-            'konigliche_porzellan_manufaktur_meissen': 'company_konigliche_porzellan_manufaktur_meissen',
-            'lanfang_kongsi': 'company_lanfang_kongsi',
-            'lee_wilson': 'company_lee_wilson',
-            'ludwig_moser_and_sons': 'company_ludwig_moser_and_sons',
-            'maison_worth': 'company_maison_worth',
-            'mantero_seta': 'company_mantero_seta',
-            'maple_and_co': 'company_maple_and_co',
-            'massey_harris': 'company_massey_harris',
-            'norsk_hydro': 'company_norsk_hydro',
-            'ong_lung_sheng_tea_company': 'company_ong_lung_sheng_tea_company',
-            'paradox': 'company_paradox',
-            'russian_american_company': 'company_russian_american_company',
-            # Additional missing mappings based on available icons
-            'cfr': 'romania_cfr',
-            'caile_ferate_romane': 'romania_cfr',
-            'ferrocarril_central_cordoba': 'argentina_cordoba_cenral_railway',
-            'great_indian_railway': 'india_great_indian_peninsula_railway',
-            'great_western_railway': 'gb_great_western_railway',
-            'iranian_state_railway': 'trans_iranian_railway',
-            'mantetsu': 'japanese_mantetsu',
-            'preussische_staatseisenbahnen': 'german_kpev',
-            'new_russia_company': 'russian_new_russia_company',
-            'schichau': 'german_schichau',
-            'schneider': 'france_schneider_et_cie',
-            'schneider_et_cie': 'france_schneider_et_cie',
-            'siemens': 'german_siemens_halske',
-            'siemens_halske': 'german_siemens_halske',
-            'siemens_and_halske': 'german_siemens_halske',
-            'west_ural_petroleum': 'historical_west_ural_petroleum_company_limited',
-            'san_miguel': 'manila_la_fabrica_de_cerveza_san_miguel',
-            'vodka_monopoly': 'russian_vodka_monopoly',
-            'basf': 'german_basf',
-            'chr_hansens': 'denmark_chr_hansens_teknisk_kemiske_laboratorium',
-            'dollfus_mieg': 'france_dmc',
-            'east_india_company': 'gb_eic',
-            'egyptian_rail': 'egyptian_rail',
-            'tata': 'india_tata',
-            'mavag': 'mavag',
-            'mav': 'mavag',
-            'john_brown': 'gb_jb_co',
-            'kirgizian_mining': 'company_john_holt',  # Placeholder for now
-            'krupp': 'german_krupp',
-            'la_rosada': 'paraguay_la_rosada',
-            'compagnie_des_mines_anzin': 'france_compagnie_des_mines_danzin',
-            'mitsubishi': 'japanese_mitsubishi',
-            'mitsui': 'japanese_mitsui',
-            'rheinmetall': 'german_rheinmetall',
-            'saint_etienne': 'france_saint_etienne',
-            'trubia': 'spain_fabrica_de_armas_de_trubia',
-            'b_grimm': 'thailand_b_grimm',
-            'moscow_irrigation': 'historical_moscow_irrigation_company',
-            'companhia_de_mocambique': 'mozambique_companhia_de_mocambique',
-            'steaua_romana': 'romania_steaua_romana',
-            'persian_oil': 'historical_perskhlopok',
-            'cockerill': 'john_cockerill',
-            'sociedade_anonyme_john_cockerill': 'john_cockerill',
-            'nam_dinh_textile': 'vietnam_nam_dinh',
-            'suez_company': 'suez_company',
-            'turkish_petroleum': 'turkish_petroleum_company',
-            'electricidad_de_caracas': 'venezuela_c_a_la_electricidad_de_caracas',
-            'caribbean_petroleum': 'venezuela_caribbean_petroleum_company',
-            'william_sandford': 'william_sandford_limited',
-            'zastava': 'zastava',
-            'altos_hornos_de_vizcaya': 'basque_altos_hornos_de_vizcaya',
-            'duro_y_compania': 'spain_duro_y_compania',
-            'lilpop': 'polish_lilpop',
-            'societe_mokta_el_hadid': 'france_société_mokta_el_hadid',
-            'bengal_coal': 'ip2_bengal_coal_company',
-            'bolckow_vaughan': 'gb_bolckow_vaughan_and_co',
-            'bombay_burmah_trading': 'ip2_bombay_burmah_trading',
-            'peruvian_amazon': 'peru_peruvian_amazon_company',
-            'madura_mills': 'ip2_madura_mills',
-            'steel_brothers': 'ip2_steel_brothers_and_co',
-            'ericsson': 'ericsson',
-            'lkab': 'lkab',
-            'gotaverken': 'götaverken',
-            'afghanistan_national_weaving': 'da_afghan_nassaji_sherkat',
-            'national_iranian_oil': 'national_iranian_oil_company',
-            'tashkent_railroad': 'tashkent_railroad',
-            'tersane_i_amire': 'imperial_arsenal',
-            'ottoman_tobacco_regie': 'ottoman_tobacco_regie',
-            # Fix remaining exact company ID matches
-            'prussian_state_railways': 'german_kpev',
-            'armstrong_whitworth': 'gb_armstrong_whitworth',
-            'john_brown': 'gb_jb_co',
-            'schneider_creusot': 'france_schneider_et_cie',
-            'john_cockerill': 'john_cockerill',
-            # More exact company name fixes
-            'gwr': 'gb_great_western_railway',
-            'wadia_shipbuilders': 'ip2_wadia_shipbuilders',
-            'ralli_brothers': 'ip2_ralli_brothers',
-            'putilov_company': 'russian_putilov',
-            'fcm': 'france_forges_et_chantiers_de_la_méditerranée',
-            'mines_anzin': 'france_compagnie_des_mines_danzin',
-            'j_p_coats': 'gb_jp_coats',
-            # Additional missing mappings identified by user
-            'sunhwaguk': 'korea_sunhwaguk',
-            'dmc': 'france_dmc',
-            'nokia': 'finland_nokia',
-            'ericsson': 'ericsson',
-            'branobel': 'russian_branobel',
-            'izhevsk_arms_plant': 'russian_izhevsk_arms_plant',
-            # Newly found icon mappings
-            'ursus': 'polish_ursus',
-            'cordoba_railway': 'argentina_cordoba_cenral_railway',
-            'john_hughes': 'russian_new_russia_company',
-            'david_sassoon': 'ip2_david_sasson_and_co',
-            'bombay_dyeing_company': 'ip2_bombay_dyeing',
-            'nam_dinh': 'vietnam_nam_dinh',
-            'savva_morozov': 'russian_savva_morozov_and_sons',
-            'sherkate_eslamiya': 'historical_serkat_e_eslamiya',
-            'perskhlopok': 'historical_perskhlopok',
-            'persshelk': 'historical_persshelk',
-            'cgv': 'france_cgv',
-            'maatschappij': 'maatschappij',
-            'steaua_romana': 'romania_steaua_romana',
-            # Systematic matches from available icons
-            'bengal_coal_company': 'ip2_bengal_coal_company',
-            'bombay_burmah_trading_corporation': 'ip2_bombay_burmah_trading',
-            'assam_company': 'ip2_assam_company',
-            'calcutta_electric': 'ip2_calcutta_electric',
-            'mozambique_company': 'mozambique_companhia_de_mocambique',
-            'espana_industrial': 'spain_la_espana_industrial',
-            'argentinian_wine': 'argentina_centro_vitivinicola_nacional',
-            'eea': 'peru_empresas_electricas_asociadas',
-            'nicolas_portalis': 'historical_mm_nicolas_portalis_et_cie',
-            'moscow_irrigation_company': 'historical_moscow_irrigation_company',
-            'peruvian_amazon': 'peru_peruvian_amazon_company'
-        }
-        
         # Check historical mappings first
         if clean_name in self.historical_mappings:
-            historical_path = "companies/png/historical_company_icons/{}.png".format(self.historical_mappings[clean_name])
-            full_path = os.path.join(os.path.dirname(__file__), historical_path)
+            historical_path = self.resolve_asset_path(
+                "companies/png/historical_company_icons/{}.png".format(self.historical_mappings[clean_name]))
+            full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), historical_path)
             if os.path.exists(full_path):
                 return historical_path
         
@@ -626,31 +716,393 @@ class Victoria3CompanyParserV6Final:
             "companies/png/basic_{}.png".format(clean_name.split('_')[-1]) if '_' in clean_name else None,
         ]
         
-        # Filter out None values
-        icon_candidates = [c for c in icon_candidates if c is not None]
+        # Filter out None values (duplicates found by deduplicate_assets resolve to their canonical copy)
+        icon_candidates = [self.resolve_asset_path(c) for c in icon_candidates if c is not None]
         
         # Return the first existing icon path
         for candidate in icon_candidates:
-            full_path = os.path.join(os.path.dirname(__file__), candidate)
+            full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), candidate)
             if os.path.exists(full_path):
                 return candidate
+        return None
+    
+    def get_asset_aliases(self):
+        """Load the duplicate-to-canonical path map written by deduplicate_assets (empty if there is none)"""
+        if getattr(self, '_asset_aliases', None) is None:
+            try:
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.ASSET_ALIAS_MANIFEST), 'r', encoding='utf-8') as f:
+                    self._asset_aliases = json.load(f)
+            except (IOError, ValueError):
+                self._asset_aliases = {}
+        return self._asset_aliases
+    
+    def resolve_asset_path(self, asset_path):
+        """Get the canonical copy of an asset path (unchanged unless deduplicate_assets aliased it)"""
+        return self.get_asset_aliases().get(asset_path, asset_path)
+    
+    def get_icon_variant_path(self, icon_path, size):
+        """Get the resized variant of a companies/png icon, falling back to the original file"""
+        if not size or not icon_path.startswith('companies/png/'):
+            return icon_path
+        variant_path = icon_path.replace('companies/png/', 'companies/png_{}/'.format(size), 1)
+        if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), variant_path)):
+            return variant_path
+        return icon_path
+    
+    def get_company_icon_srcset(self, company_name, size):
+        """Get a srcset attribute with 1x/2x variants for a company icon shown at size px"""
+        icon_1x = self.get_company_icon_path(company_name, size)
+        icon_2x = self.get_company_icon_path(company_name, size * 2)
+        if icon_1x == icon_2x:
+            return ''
+        return ' srcset="{} 1x, {} 2x"'.format(icon_1x, icon_2x)
+    
+    def convert_company_icons(self, source_dir="company_icons", workers=None):
+        """Convert the game's company_icons DDS files to PNGs in companies/png/, skipping unchanged files"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        source_dir = os.path.join(base_dir, source_dir)
+        if not os.path.isdir(source_dir):
+            print("No DDS icon folder at {}, skipping icon conversion".format(source_dir))
+            return
+        try:
+            import PIL
+        except ImportError:
+            print("WARNING: Pillow is not installed, skipping DDS conversion (pip install Pillow)")
+            return
+        import hashlib
+        from concurrent.futures import ProcessPoolExecutor
         
-        # Debug: print missing company icon
-        print("WARNING: Missing company icon for: {} (clean: {})".format(company_name, clean_name))
+        output_dir = os.path.join(base_dir, 'companies', 'png')
+        manifest_path = os.path.join(base_dir, self.DDS_CONVERSION_MANIFEST)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            manifest = {}
+        
+        jobs = []
+        hashes = {}
+        total = 0
+        for root, dirs, files in os.walk(source_dir):
+            for file in sorted(files):
+                if not file.lower().endswith('.dds'):
+                    continue
+                total += 1
+                source_path = os.path.join(root, file)
+                rel_path = os.path.relpath(source_path, source_dir).replace(os.sep, '/')
+                output_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.png')
+                with open(source_path, 'rb') as f:
+                    source_hash = hashlib.sha256(f.read()).hexdigest()
+                
+                output_rel_path = os.path.relpath(output_path, base_dir).replace(os.sep, '/')
+                if manifest.get(rel_path) == source_hash and (os.path.exists(output_path) or
+                                                              output_rel_path in self.get_asset_aliases()):
+                    continue
+                hashes[source_path] = (rel_path, source_hash)
+                jobs.append((source_path, output_path))
+        
+        failed = []
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for source_path, error in executor.map(_convert_dds_to_png, jobs, chunksize=4):
+                    rel_path, source_hash = hashes[source_path]
+                    if error:
+                        failed.append(rel_path)
+                        print("WARNING: Could not convert {}: {}".format(rel_path, error))
+                    else:
+                        manifest[rel_path] = source_hash
+            
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
         
-        # If no icon found, return placeholder
-        return "companies/png/custom_companies_placeholder.png"
+        print("DDS conversion: {} converted, {} unchanged, {} failed".format(
+            len(jobs) - len(failed), total - len(jobs), len(failed)))
+    
+    def deduplicate_assets(self):
+        """Point references to byte-identical images under IMAGE_INDEX_FOLDERS at one canonical copy (files are left in place)"""
+        import hashlib
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        # Resized variants and atlases are generated from the originals, so only source images are hashed
+        by_hash = {}
+        for folder in self.IMAGE_INDEX_FOLDERS:
+            for root, dirs, files in os.walk(os.path.join(base_dir, folder)):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('png_'))
+                for file in sorted(files):
+                    if not file.lower().endswith('.png') or file.startswith('atlas_'):
+                        continue
+                    full_path = os.path.join(root, file)
+                    with open(full_path, 'rb') as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                    by_hash.setdefault(digest, []).append(os.path.relpath(full_path, base_dir).replace(os.sep, '/'))
+        
+        # The copy the icon lookups already pick for the most companies is kept, so the names the
+        # mappings use stay canonical; path length and order only break ties
+        self._asset_aliases = {}
+        resolved = Counter(self.find_company_icon_path(company_name) for company_name in self.companies)
+        
+        aliases = {}
+        aliased_bytes = 0
+        for paths in by_hash.values():
+            if len(paths) < 2:
+                continue
+            canonical = min(paths, key=lambda path: (-resolved[path], len(path), path))
+            for path in paths:
+                if path != canonical:
+                    aliases[path] = canonical
+                    aliased_bytes += os.path.getsize(os.path.join(base_dir, path))
+        
+        manifest_path = os.path.join(base_dir, self.ASSET_ALIAS_MANIFEST)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(aliases, f, indent=2, sort_keys=True, ensure_ascii=False)
+        self._asset_aliases = aliases
+        self.setup_company_icon_mapping()
+        
+        print("Asset deduplication: {} duplicate images ({:.1f} KB) now served from their canonical copy".format(
+            len(aliases), aliased_bytes / 1024.0))
+        for alias, canonical in sorted(aliases.items()):
+            print("  {} -> {}".format(alias, canonical))
+    
+    def build_icon_atlases(self):
+        """Pack the building, prestige and goods icons into sprite atlases, skipping unchanged groups"""
+        try:
+            from PIL import Image
+        except ImportError:
+            print("WARNING: Pillow is not installed, skipping icon atlases (pip install Pillow)")
+            return
+        import hashlib
+        import math
+        
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        manifest_path = os.path.join(base_dir, self.ICON_ATLAS_MANIFEST)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (IOError, ValueError):
+            previous = {'atlases': {}}
+        
+        manifest = {'atlases': {}, 'icons': {}}
+        rebuilt = []
+        for name, folder, prefix, tile in self.ICON_ATLAS_GROUPS:
+            folder_path = os.path.join(base_dir, folder)
+            files = sorted(f for f in os.listdir(folder_path) if f.startswith(prefix) and f.endswith('.png'))
+            if not files:
+                continue
+            
+            digest = hashlib.sha256()
+            for file in files:
+                digest.update(file.encode('utf-8'))
+                with open(os.path.join(folder_path, file), 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+            
+            # Transparent gutters keep neighbouring icons from bleeding in when scaled or offset
+            gutter = max(4, tile // 8)
+            pitch = tile + gutter
+            
+            # Split large groups into evenly sized sheets so no single atlas image gets too heavy
+            sheets = int(math.ceil(len(files) * pitch * pitch / float(self.ICON_ATLAS_MAX_PIXELS)))
+            per_sheet = int(math.ceil(len(files) / float(sheets)))
+            for sheet_index in range(sheets):
+                sheet_name = name if sheets == 1 else '{}{}'.format(name, sheet_index + 1)
+                sheet_files = files[sheet_index * per_sheet:(sheet_index + 1) * per_sheet]
+                cols = int(math.ceil(math.sqrt(len(sheet_files))))
+                rows = int(math.ceil(len(sheet_files) / float(cols)))
+                atlas = {
+                    'image': 'icons/atlas_{}.png'.format(sheet_name),
+                    'tile': tile,
+                    'pitch': pitch,
+                    'cols': cols,
+                    'rows': rows,
+                    'hash': digest.hexdigest()[:16]
+                }
+                manifest['atlases'][sheet_name] = atlas
+                for index, file in enumerate(sheet_files):
+                    manifest['icons']['{}/{}'.format(folder, file)] = [sheet_name, index % cols, index // cols]
+                
+                if previous['atlases'].get(sheet_name) == atlas and os.path.exists(os.path.join(base_dir, atlas['image'])):
+                    continue
+                
+                sheet = Image.new('RGBA', (cols * pitch, rows * pitch), (0, 0, 0, 0))
+                for index, file in enumerate(sheet_files):
+                    with Image.open(os.path.join(folder_path, file)) as icon:
+                        icon = icon.convert('RGBA')
+                        if icon.size != (tile, tile):
+                            icon = icon.resize((tile, tile), Image.LANCZOS)
+                        sheet.paste(icon, ((index % cols) * pitch, (index // cols) * pitch))
+                sheet.save(os.path.join(base_dir, atlas['image']), optimize=True)
+                rebuilt.append(sheet_name)
+        
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        self._icon_atlas = manifest
+        
+        print("Icon atlases: {} icons in {} atlases ({} rebuilt)".format(
+            len(manifest['icons']), len(manifest['atlases']), ', '.join(rebuilt) or 'none'))
+    
+    def get_icon_atlas(self):
+        """Load the sprite atlas coordinate map written by build_icon_atlases (empty if there is none)"""
+        if getattr(self, '_icon_atlas', None) is None:
+            try:
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.ICON_ATLAS_MANIFEST), 'r', encoding='utf-8') as f:
+                    self._icon_atlas = json.load(f)
+            except (IOError, ValueError):
+                self._icon_atlas = {'atlases': {}, 'icons': {}}
+        return self._icon_atlas
+    
+    def get_icon_sprite_class(self, icon_path):
+        """Get the CSS classes that draw an icon from its sprite atlas, or None if it is not in one"""
+        entry = self.get_icon_atlas()['icons'].get(icon_path)
+        if not entry:
+            return None
+        atlas_name, col, row = entry
+        return 'sprite sprite-{} sx{} sy{}'.format(atlas_name, col, row)
+    
+    def get_icon_sprite_html(self, icon_path, size, label, css_class='', style=''):
+        """Get a sprite element for an icon shown at size px, or None if the icon is not in an atlas"""
+        sprite_class = self.get_icon_sprite_class(icon_path)
+        if not sprite_class:
+            return None
+        return '<span class="sprite-icon {}{}" style="--icon-size: {}px;{}" role="img" aria-label="{}" title="{}"></span>'.format(
+            sprite_class, ' ' + css_class if css_class else '', size, ' ' + style if style else '', label, label)
+    
+    def _generate_sprite_css(self):
+        """Generate CSS for the sprite atlases"""
+        atlas = self.get_icon_atlas()
+        if not atlas['atlases']:
+            return ''
+        
+        css = '''
+        /* Sprite atlases: position and size scale with --icon-size (see build_icon_atlases) */
+        .sprite {
+            background-repeat: no-repeat;
+            background-size: calc(var(--cols) * var(--pitch) * var(--icon-size)) calc(var(--rows) * var(--pitch) * var(--icon-size));
+            background-position: calc(var(--icon-offset, 0px) - var(--sx) * var(--pitch) * var(--icon-size)) calc(var(--icon-offset, 0px) - var(--sy) * var(--pitch) * var(--icon-size));
+        }
+        
+        .sprite-icon {
+            display: inline-block;
+            width: var(--icon-size);
+            height: var(--icon-size);
+            vertical-align: middle;
+        }
+        
+        .building-header.sprite {
+            --icon-size: 32px;
+            --icon-offset: 2px;
+        }
+'''
+        max_cols = 0
+        max_rows = 0
+        for name, info in sorted(atlas['atlases'].items()):
+            css += '        .sprite-{} {{ background-image: url({}?v={}); --cols: {}; --rows: {}; --pitch: {:g}; }}\n'.format(
+                name, info['image'], info['hash'][:8], info['cols'], info['rows'], info['pitch'] / float(info['tile']))
+            max_cols = max(max_cols, info['cols'])
+            max_rows = max(max_rows, info['rows'])
+        css += ''.join('        .sx{0} {{ --sx: {0}; }}\n'.format(col) for col in range(max_cols))
+        css += ''.join('        .sy{0} {{ --sy: {0}; }}\n'.format(row) for row in range(max_rows))
+        return css
+    
+    def _get_icon_sprites_js(self):
+        """Generate JavaScript object mapping icon paths to their sprite classes"""
+        sprites = {}
+        for icon_path in sorted(self.get_icon_atlas()['icons']):
+            sprites[icon_path] = self.get_icon_sprite_class(icon_path)
+        return json.dumps(sprites, separators=(',', ':'))
+    
+    def get_icon_variants(self):
+        """Get {path under companies/png/: [sizes]} for the resized variants build_icon_variants has written"""
+        try:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.ICON_VARIANT_MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        return dict((rel_path, sorted(entry['variants'])) for rel_path, entry in manifest.get('files', {}).items()
+                    if entry.get('variants'))
+    
+    def get_icon_variant_sizes(self):
+        """Get the sizes for which build_icon_variants has written resized icons"""
+        return sorted(set(size for sizes in self.get_icon_variants().values() for size in sizes))
+    
+    def _get_icon_variants_js(self):
+        """Generate JavaScript object mapping icons to a bitmask over iconVariantSizes of the variants that exist"""
+        sizes = self.get_icon_variant_sizes()
+        return json.dumps(dict((rel_path, sum(1 << sizes.index(size) for size in variant_sizes))
+                               for rel_path, variant_sizes in sorted(self.get_icon_variants().items())),
+                          separators=(',', ':'), ensure_ascii=False)
+    
+    def build_icon_variants(self, sizes=None, workers=None):
+        """Resize company icons and backgrounds into companies/png_<size>/, skipping unchanged images"""
+        try:
+            import PIL
+        except ImportError:
+            print("WARNING: Pillow is not installed, skipping icon variants (pip install Pillow)")
+            return
+        import hashlib
+        from concurrent.futures import ProcessPoolExecutor
+        
+        sizes = sorted(sizes or self.ICON_VARIANT_SIZES)
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        source_dir = os.path.join(base_dir, 'companies', 'png')
+        manifest_path = os.path.join(base_dir, self.ICON_VARIANT_MANIFEST)
+        
+        manifest = {'sizes': sizes, 'files': {}}
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('sizes') == sizes:
+                manifest['files'] = previous.get('files', {})
+        except (IOError, ValueError):
+            pass
+        
+        jobs = []
+        hashes = {}
+        found = set()
+        for root, dirs, files in os.walk(source_dir):
+            for file in sorted(files):
+                if not file.endswith('.png'):
+                    continue
+                source_path = os.path.join(root, file)
+                rel_path = os.path.relpath(source_path, source_dir).replace(os.sep, '/')
+                found.add(rel_path)
+                with open(source_path, 'rb') as f:
+                    source_hash = hashlib.sha256(f.read()).hexdigest()
+                
+                outputs = [(size, os.path.join(base_dir, 'companies', 'png_{}'.format(size), rel_path)) for size in sizes]
+                entry = manifest['files'].get(rel_path)
+                if entry and entry['hash'] == source_hash and all(
+                        os.path.exists(output_path) for size, output_path in outputs if size in entry['variants']):
+                    continue
+                hashes[source_path] = (rel_path, source_hash)
+                jobs.append((source_path, outputs))
+        
+        # Forget images that were removed from companies/png
+        for rel_path in list(manifest['files']):
+            if rel_path not in found:
+                del manifest['files'][rel_path]
+        
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for source_path, written in executor.map(_resize_image_variants, jobs, chunksize=8):
+                    rel_path, source_hash = hashes[source_path]
+                    manifest['files'][rel_path] = {'hash': source_hash, 'variants': written}
+        
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+        
+        print("Icon variants: {} images resized, {} unchanged (sizes: {})".format(
+            len(jobs), len(found) - len(jobs), ', '.join(str(size) for size in sizes)))
     
     def setup_company_icon_mapping(self):
         """Setup mapping of company names to their icon files"""
         self.company_icons = {}
-        companies_dir = os.path.join(os.path.dirname(__file__), "companies")
+        companies_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "companies")
         
         if not os.path.exists(companies_dir):
             return
         
-        # Scan for available icon files
+        # Scan for available icon files (resized variants in png_<size>/ are not separate icons)
         for root, dirs, files in os.walk(companies_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('png_')]
             for file in files:
                 if file.endswith(('.dds', '.png')):
                     # Extract company name from filename
@@ -658,102 +1110,23 @@ class Victoria3CompanyParserV6Final:
                     company_key = "company_{}".format(base_name)
                     
                     # Store the relative path
-                    rel_path = os.path.relpath(os.path.join(root, file), os.path.dirname(__file__))
+                    rel_path = os.path.relpath(os.path.join(root, file), os.path.dirname(os.path.abspath(__file__)))
                     self.company_icons[company_key] = rel_path
+        
+        # Duplicates found by deduplicate_assets are served from the canonical copy
+        for alias, canonical in self.get_asset_aliases().items():
+            if alias.startswith('companies/'):
+                base_name = os.path.splitext(os.path.basename(alias))[0]
+                self.company_icons.setdefault("company_{}".format(base_name), canonical)
                     
     def infer_country_from_filename(self, filename):
         """Infer country from company file name"""
-        filename_to_country = {
-            '00_companies_usa.txt': 'USA',
-            '00_companies_great_britain.txt': 'GBR', 
-            '00_companies_france.txt': 'FRA',
-            '00_companies_germany.txt': 'DEU',
-            '00_companies_russia.txt': 'RUS',
-            '00_companies_austria_hungary.txt': 'AUS',
-            '00_companies_italy.txt': 'ITA',
-            '00_companies_china.txt': 'CHI',
-            '00_companies_japan.txt': 'JAP',
-            '00_companies_asia.txt': None,  # Mixed countries
-            '00_companies_africa.txt': None,  # Mixed countries
-            '00_companies_americas.txt': None,  # Mixed countries
-            '00_companies_europe.txt': None,  # Mixed countries
-        }
+        filename_to_country = self.registry['file_countries']
         return filename_to_country.get(filename, None)
     
     def get_company_country_override(self, company_name):
         """Manual country assignments for companies without state requirements"""
-        company_countries = {
-            # Argentine companies
-            'company_argentinian_wine': 'ARG',  # Centro Vitivinícola Nacional (Argentina)
-            
-            # Russian companies (from icon/name analysis)
-            'company_perskhlopok': 'RUS',  # Russian cotton company
-            'company_persshelk': 'RUS',    # Russian silk company
-            
-            # Brazilian companies
-            'company_kablin': 'BRZ',       # Kablin Irmãos & Cia (Brazil)
-            
-            # British companies
-            'company_john_holt': 'GBR',    # John Holt & Co (British trading)
-            'company_imperial_tobacco': 'GBR',  # Imperial Tobacco
-            'company_east_india_company': 'GBR', # East India Company
-            
-            # Iranian companies  
-            'company_iranian_state_railway': 'PER',  # Iran
-            
-            # Korean companies
-            'company_sunhwaguk': 'KOR',    # Korean company
-            
-            # South African companies
-            'company_de_beers': 'SAF',     # De Beers (South Africa)
-            
-            # Myanmar/British Burma
-            'company_steel_brothers': 'BUR', # Steel Brothers & Co
-            
-            # Romanian companies
-            'company_cfr': 'ROM',          # Romanian railways
-            
-            # Philippines companies  
-            'company_san_miguel': 'PHI',   # San Miguel (Philippines)
-            
-            # Indian companies
-            'company_great_indian_railway': 'IND', # Great Indian Peninsula Railway
-            
-            # Mexican companies
-            'company_el_aguila': 'MEX',    # El Águila (Mexico)
-            
-            # Egyptian companies
-            'company_egyptian_rail': 'EGY', # Egyptian railways
-            
-            # Chinese companies
-            'company_ong_lung_sheng_tea_company': 'CHI', # Chinese tea company
-            
-            # Ottoman companies
-            'company_ottoman_tobacco_regie': 'TUR', # Ottoman Tobacco
-            
-            # Ethiopian companies
-            'company_imperial_ethiopian_railways': 'ETH', # Ethiopian railways
-            
-            # Argentine companies
-            'company_bunge_born': 'ARG',   # Bunge & Born (Argentina)
-            
-            # Dutch companies
-            'company_nederlandse_petroleum': 'NET', # Nederlandse Petroleum
-            
-            # US/Russian Alaska company
-            'company_russian_american_company': 'RUS', # Russian-American Company
-            
-            # French railways
-            'company_orient_express': 'FRA', # Orient Express
-            
-            # Chinese opium
-            'company_opium_export_monopoly': 'CHI', # Chinese opium monopoly
-            
-            # Development companies - based on formation requirements
-            'company_oriental_development_company': 'KOR', # Requires Korean homeland states
-            'company_ccci': 'BEL',         # Compagnie du Congo (Belgian colonial company)
-            'company_paradox': 'SWE',      # Paradox is Swedish ;)
-        }
+        company_countries = self.registry['company_country_overrides']
         return company_countries.get(company_name, None)
 
     def setup_prestige_good_names(self):
@@ -779,60 +1152,49 @@ class Victoria3CompanyParserV6Final:
         
     def get_building_icon_path(self, building_name):
         """Get the icon path for a building, flagging missing building icons"""
-        # Building display name overrides (for UI display)
-        building_display_name_overrides = {
-            'building_chemical_plants': 'Fertilizer Plants'
-        }
+        icon_path = self.find_building_icon_path(building_name)
+        if not icon_path:
+            print("WARNING: Missing building icon: {} (tried: {})".format(
+                building_name, "buildings/64px-Building_{}.png".format(building_name.replace('building_', ''))))
         
+        # None indicates a missing icon
+        return icon_path
+    
+    def find_building_icon_path(self, building_name):
+        """Get the icon file for a building, or None if it has none"""
         # Building name mappings for icon files that have different names
-        building_name_mappings = {
-            'building_chemical_plants': 'chemicals_industry',
-            'building_textile_mills': 'textile_industry', 
-            'building_artillery_foundries': 'artillery_foundry',
-            'building_automotive_industry': 'vehicles_industry',
-            'building_livestock_ranch': 'cattle_ranch',
-            'building_rubber_plantation': 'rubber_lodge',
-            'building_vineyard_plantation': 'vineyards'
-        }
+        building_name_mappings = self.registry['building_icon_names']
         
         # Check if we have a mapping for this building name
         if building_name in building_name_mappings:
             mapped_name = building_name_mappings[building_name]
-            building_icon_64px = "buildings/64px-Building_{}.png".format(mapped_name)
-            full_building_path_64px = os.path.join(os.path.dirname(__file__), building_icon_64px)
+            building_icon_64px = self.resolve_asset_path("buildings/64px-Building_{}.png".format(mapped_name))
+            full_building_path_64px = os.path.join(os.path.dirname(os.path.abspath(__file__)), building_icon_64px)
             
             if os.path.exists(full_building_path_64px):
                 return building_icon_64px
         
         # Priority 1: Try 64px building icon format (the actual format in buildings folder)
         clean_building_name = building_name.replace('building_', '')
-        building_icon_64px = "buildings/64px-Building_{}.png".format(clean_building_name)
-        full_building_path_64px = os.path.join(os.path.dirname(__file__), building_icon_64px)
+        building_icon_64px = self.resolve_asset_path("buildings/64px-Building_{}.png".format(clean_building_name))
+        full_building_path_64px = os.path.join(os.path.dirname(os.path.abspath(__file__)), building_icon_64px)
         
         if os.path.exists(full_building_path_64px):
             return building_icon_64px
         
         # Priority 2: Try exact building name
-        building_icon_path = "buildings/{}.png".format(building_name)
-        full_building_path = os.path.join(os.path.dirname(__file__), building_icon_path)
+        building_icon_path = self.resolve_asset_path("buildings/{}.png".format(building_name))
+        full_building_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), building_icon_path)
         
         if os.path.exists(full_building_path):
             return building_icon_path
         
         # Priority 3: Try clean building name
-        building_icon_path_clean = "buildings/{}.png".format(clean_building_name)
-        full_building_path_clean = os.path.join(os.path.dirname(__file__), building_icon_path_clean)
+        building_icon_path_clean = self.resolve_asset_path("buildings/{}.png".format(clean_building_name))
+        full_building_path_clean = os.path.join(os.path.dirname(os.path.abspath(__file__)), building_icon_path_clean)
         
         if os.path.exists(full_building_path_clean):
             return building_icon_path_clean
-        
-        # Flag missing building icon
-        if not hasattr(self, 'missing_building_icons'):
-            self.missing_building_icons = set()
-        self.missing_building_icons.add(building_name)
-        print("WARNING: Missing building icon: {} (tried: {})".format(building_name, building_icon_64px))
-        
-        # Return None to indicate missing icon
         return None
     
     def abbreviate_company_name(self, display_name, max_length=35):
@@ -890,25 +1252,15 @@ class Victoria3CompanyParserV6Final:
             return 0, 0, []
         
         data = self.companies[company_name]
-        base_count = len(data.get('building_types', []))
-        charter_count = len(data.get('extension_building_types', []))
+        base_count = len(data.building_types)
+        charter_count = len(data.extension_building_types)
         prestige_goods = []
         
-        # Check for prestige goods across all buildings
-        all_buildings = set(data.get('building_types', []) + data.get('extension_building_types', []))
-        for building in all_buildings:
-            has_prestige_result = self.company_has_prestige_for_building(company_name, building)
-            if isinstance(has_prestige_result, tuple):
-                has_prestige, prestige_good = has_prestige_result
-                if has_prestige and prestige_good and prestige_good not in prestige_goods:
-                    prestige_goods.append(prestige_good)
-            elif has_prestige_result:
-                # If it's just a boolean True, we know there's prestige but not which good
-                # We'll handle this case by looking for any prestige goods in the company data
-                if hasattr(data, 'prestige_goods') and data.prestige_goods:
-                    for pg in data.prestige_goods:
-                        if pg not in prestige_goods:
-                            prestige_goods.append(pg)
+        # Check for prestige goods across the buildings in the company's prestige mask
+        for building in self.get_mask_buildings(self.get_prestige_mask(company_name)):
+            has_prestige, prestige_good = self.company_has_prestige_for_building(company_name, building) or (False, None)
+            if has_prestige and prestige_good not in prestige_goods:
+                prestige_goods.append(prestige_good)
         
         return base_count, charter_count, prestige_goods
     
@@ -919,6 +1271,29 @@ class Victoria3CompanyParserV6Final:
         else:
             return str(base_count)
     
+    def get_prestige_good_icon_path(self, prestige_good):
+        """Get the icon base name and path for a prestige good (path is None if no icon exists)"""
+        prestige_good_base = prestige_good.replace('prestige_good_generic_', '').replace('prestige_good_', '')
+        
+        # Special icon mappings for prestige goods that don't have exact icon matches
+        icon_mappings = self.registry['prestige_icon_names']
+        
+        if prestige_good_base in icon_mappings:
+            prestige_good_base = icon_mappings[prestige_good_base]
+        
+        # Try prestige-specific icon first, fallback to goods icon
+        prestige_icon_24px = self.resolve_asset_path("icons/24px-Prestige_{}.png".format(prestige_good_base))
+        prestige_icon_40px = self.resolve_asset_path("icons/40px-Goods_{}.png".format(prestige_good_base))
+        
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        icon_path = None
+        if os.path.exists(os.path.join(base_dir, prestige_icon_24px)):
+            icon_path = prestige_icon_24px
+        elif os.path.exists(os.path.join(base_dir, prestige_icon_40px)):
+            icon_path = prestige_icon_40px
+        
+        return prestige_good_base, icon_path
+    
     def get_company_prestige_icons(self, company_name):
         """Get prestige icons HTML for a company"""
         if company_name not in self.companies:
@@ -928,47 +1303,21 @@ class Victoria3CompanyParserV6Final:
         prestige_icons_html = ''
         prestige_goods = []
         
-        # Check for prestige goods across all buildings
-        all_buildings = set(data.get('building_types', []) + data.get('extension_building_types', []))
-        for building in all_buildings:
-            has_prestige_result = self.company_has_prestige_for_building(company_name, building)
-            if isinstance(has_prestige_result, tuple):
-                has_prestige, prestige_good = has_prestige_result
-                if has_prestige and prestige_good and prestige_good not in prestige_goods:
-                    prestige_goods.append(prestige_good)
-            elif has_prestige_result:
-                # If it's just a boolean True, we know there's prestige but not which good
-                if hasattr(data, 'prestige_goods') and data.prestige_goods:
-                    for pg in data.prestige_goods:
-                        if pg not in prestige_goods:
-                            prestige_goods.append(pg)
+        # Check for prestige goods across the buildings in the company's prestige mask
+        for building in self.get_mask_buildings(self.get_prestige_mask(company_name)):
+            has_prestige, prestige_good = self.company_has_prestige_for_building(company_name, building) or (False, None)
+            if has_prestige and prestige_good not in prestige_goods:
+                prestige_goods.append(prestige_good)
         
         # Generate prestige icons HTML
         for prestige_good in prestige_goods:
-            prestige_good_base = prestige_good.replace('prestige_good_generic_', '').replace('prestige_good_', '')
-            
-            # Special icon mappings for prestige goods that don't have exact icon matches
-            icon_mappings = {
-                'burmese_teak': 'teak',
-                'swedish_bar_iron': 'oregrounds_iron'
-            }
-            
-            if prestige_good_base in icon_mappings:
-                prestige_good_base = icon_mappings[prestige_good_base]
-            
-            # Try prestige-specific icon first, fallback to goods icon
-            prestige_icon_24px = "icons/24px-Prestige_{}.png".format(prestige_good_base)
-            prestige_icon_40px = "icons/40px-Goods_{}.png".format(prestige_good_base)
-            
-            icon_path = None
-            if os.path.exists(prestige_icon_24px):
-                icon_path = prestige_icon_24px
-            elif os.path.exists(prestige_icon_40px):
-                icon_path = prestige_icon_40px
+            prestige_good_base, icon_path = self.get_prestige_good_icon_path(prestige_good)
             
             if icon_path:
-                prestige_icons_html += '<img src="{}" class="prestige-icon" alt="{}" title="{}">'.format(
-                    icon_path, prestige_good_base.title(), prestige_good_base.replace('_', ' ').title()
+                prestige_icons_html += self.get_icon_sprite_html(
+                    icon_path, 20, prestige_good_base.replace('_', ' ').title(), 'prestige-icon'
+                ) or '<img src="{}"{} class="prestige-icon" alt="{}" title="{}">'.format(
+                    icon_path, self.get_image_size_attrs(icon_path, 20), prestige_good_base.title(), prestige_good_base.replace('_', ' ').title()
                 )
         
         return prestige_icons_html
@@ -1210,232 +1559,72 @@ class Victoria3CompanyParserV6Final:
     def map_wiki_country_to_code(self, wiki_country):
         """Map wiki country names to game country codes"""
         # Wiki country name to game code mapping
-        country_mapping = {
-            # Major countries
-            'Argentina': 'ARG',
-            'Australia': 'AST', 
-            'Austria-Hungary': 'AUS',
-            'Belgium': 'BEL',
-            'Brazil': 'BRZ',
-            'Canada': 'CAN',
-            'Chile': 'CHL',
-            'China': 'CHI',
-            'Colombia': 'CLM',
-            'Denmark': 'DEN',
-            'Egypt': 'EGY',
-            'Ethiopia': 'ETH',
-            'France': 'FRA',
-            'Germany': 'DEU',
-            'Great Britain': 'GBR',
-            'Greece': 'GRE',
-            'India': 'BIC',  # British East India Company
-            'Italy': 'ITA',
-            'Japan': 'JAP',
-            'Korea': 'KOR',
-            'Mexico': 'MEX',
-            'Netherlands': 'NET',
-            'Niger': 'SOK',  # Sokoto Caliphate
-            'Norway': 'NOR',
-            'Paraguay': 'PRG',
-            'Persia': 'PER',
-            'Peru': 'PEU',
-            'Poland': 'POL',
-            'Portugal': 'POR',
-            'Russia': 'RUS',
-            'Serbia': 'SER',
-            'Spain': 'SPA',
-            'Sweden': 'SWE',
-            'Turkey': 'TUR',
-            'Turkestan': 'KOK',  # Kokand
-            'United States': 'USA',
-            'Venezuela': 'VNZ',
-            
-            # Additional mappings as needed
-            'Ottoman Empire': 'TUR',
-            'Qing': 'CHI',
-            'Siam': 'SIA',
-            'Two Sicilies': 'SIC',
-            'Sardinia-Piedmont': 'SAR',
-            'Prussia': 'PRU',
-            'Bavaria': 'BAV',
-            'Saxony': 'SAX',
-            'Baden': 'BAD',
-            'Hanover': 'HAN',
-            'Wurttemberg': 'WUR',
-        }
+        country_mapping = self.registry['wiki_country_codes']
         
         return country_mapping.get(wiki_country, None)
 
     def find_wiki_country_for_company(self, company_name):
-        """Find wiki country for a company using direct match or aliases"""
+        """Find wiki country for a company using direct match, aliases, display name or fuzzy name match"""
         # First try direct match
         if company_name in self.wiki_companies:
             wiki_country = self.wiki_companies[company_name]
             return self.map_wiki_country_to_code(wiki_country)
         
         # Manual aliases for common mismatches between wiki formal names and game internal names
-        company_aliases = {
-            # Format: 'game_internal_name': 'wiki_country_code'
-            'company_john_cockerill': 'BEL',  # Société anonyme John Cockerill
-            'company_franco_belge': 'BEL',    # Société Franco-Belge
-            'company_krupp': 'DEU',           # Friedrich Krupp
-            'company_rheinmetall': 'DEU',     # Rheinmetall
-            'company_schichau': 'DEU',        # F. Schichau
-            'company_siemens_and_halske': 'DEU', # Siemens & Halske
-            'company_basf': 'DEU',            # BASF
-            'company_konigliche_porzellan_manufaktur_meissen': 'DEU', # Königliche Porzellan-Manufaktur Meissen
-            'company_j_p_coats': 'GBR',       # J. P. Coats
-            'company_armstrong_whitworth': 'GBR', # Sir W. G. Armstrong Whitworth & Co.
-            'company_john_brown': 'GBR',      # John Brown Company
-            'company_gwr': 'GBR',            # Great Western Railway
-            'company_bolckow_vaughan': 'GBR', # Bolckow, Vaughan & Co.
-            'company_guinness': 'GBR',       # Arthur Guinness Son & Co. Ltd.
-            'company_maple_and_co': 'GBR',   # Maple & Co.
-            'company_hbc': 'CAN',            # Hudson's Bay Company
-            'company_massey_harris': 'CAN',   # Massey-Harris Limited
-            'company_standard_oil': 'USA',   # Standard Oil
-            'company_us_steel': 'USA',       # Carnegie Steel Co.
-            'company_general_electric': 'USA', # General Electric
-            'company_william_cramp': 'USA',  # William Cramp & Sons
-            'company_ford_motor': 'USA',     # Ford Motor Company
-            'company_colt_firearms': 'USA',  # Colt's Patent Firearms Manufacturing Company
-            'company_lee_wilson': 'USA',     # Lee Wilson Company
-            'company_united_fruit': 'USA',   # United Fruit Company
-            'company_bunge_born': 'ARG',     # Bunge & Born
-            'company_compania_sansinena_de_carnes_congeladas': 'ARG', # Compañía Sansinena de Carnes Congeladas
-            'company_csfa': 'BOL',           # Compañía de Salitres y Ferrocarril de Antofagasta
-            'company_estanifera_llallagua': 'BOL', # Compañía Estañífera de Llallagua
-            'company_sao_paulo_railway': 'BRZ', # São Paulo Railway Co. Ltd
-            'company_estaleiro_maua': 'BRZ', # Estaleiro Mauá
-            'company_pernambuco_textiles': 'BRZ', # Companhia Fiação e Tecidos de Pernambuco
-            'company_fundicao_ipanema': 'BRZ', # Fundição Ipanema
-            'company_rossi': 'BRZ',          # Amadeo Rossi & Cia
-            'company_kablin': 'BRZ',         # Klabin Irmãos & Cia
-            'company_fundidora_monterrey': 'MEX', # Fundidora de Fierro y Acero de Monterrey
-            'company_el_aguila': 'MEX',      # El Águila
-            'company_famae': 'CHL',          # Fábrica de Armas de la Nación
-            'company_sudamericana_de_vapores': 'CHL', # Compañía Sudamericana de Vapores
-            'company_la_rosada': 'PRG',      # La Rosada
-            'company_peruvian_amazon': 'PEU', # Peruvian Amazon Company
-            'company_eea': 'PEU',            # Empresas Eléctricas Asociadas
-            'company_caribbean_petroleum': 'VNZ', # Caribbean Petroleum Company
-            'company_electricidad_de_caracas': 'VNZ', # C.A. La Electricidad de Caracas
-            'company_panama_company': 'CLM', # Panama Canal Company
-            'company_william_sandford': 'AST', # William Sandford Limited
-            'company_kaiping_mining': 'CHI', # Kaiping Mining Company
-            'company_hanyang_arsenal': 'CHI', # Hanyang Arsenal
-            'company_foochow_arsenal': 'CHI', # Foochow Shipyards
-            'company_jingdezhen': 'CHI',     # Jingdezhen Kilns
-            'company_jiangnan_weaving_bureaus': 'CHI', # Jiangnan Weaving Bureaus
-            'company_ong_lung_sheng_tea_company': 'CHI', # Ong Lung Sheng Tea Company
-            'company_assam_company': 'BIC',  # Assam Company
-            'company_bengal_coal_company': 'BIC', # Bengal Coal Company
-            'company_bombay_burmah_trading_corporation': 'BIC', # Bombay Burmah Trading Corporation
-            'company_bombay_dyeing_company': 'BIC', # Bombay Dyeing and Manufacturing Company Limited
-            'company_calcutta_electric': 'BIC', # Calcutta Electric Supply Corporation Limited
-            'company_david_sassoon': 'BIC',  # David Sassoon & Co. Ltd
-            'company_east_india_company': 'BIC', # East India Company
-            'company_great_indian_railway': 'BIC', # Great Indian Peninsula Railway
-            'company_madura_mills': 'BIC',   # Madura Mills Co. Ltd
-            'company_ralli_brothers': 'BIC', # Ralli Brothers
-            'company_steel_brothers': 'BIC', # Steel Brothers & Co. Ltd
-            'company_tata': 'BIC',           # Tata
-            'company_wadia_shipbuilders': 'BIC', # Wadia Shipbuilders
-            'company_mitsui': 'JAP',         # Mitsui
-            'company_mantetsu': 'JAP',       # South Manchuria Railway
-            'company_mitsubishi': 'JAP',     # Mitsubishi
-            'company_kinkozan_sobei': 'JAP', # Kinkozan Sobei
-            'company_sunhwaguk': 'KOR',      # Sunhwaguk
-            'company_hanseong_jeongi_hoesa': 'KOR', # Hanseong Jeongi Hoesa
-            'company_oriental_development_company': 'KOR', # Oriental Development Company
-            'company_lanfang_kongsi': 'LAN', # Lanfang Kongsi
-            'company_san_miguel': 'PHI',     # San Miguel
-            'company_b_grimm': 'SIA',        # B. Grimm
-            'company_nam_dinh': 'DAI',       # Nam Định Textile Factory
-            'company_skoda': 'AUS',          # Škoda Works
-            'company_mav': 'AUS',            # MÁVAG
-            'company_manfred_weiss': 'AUS',  # Manfréd Weiss Steel and Metal Works
-            'company_galician_carpathian_oil': 'AUS', # Galician Carpathian Petroleum Company
-            'company_oevg': 'AUS',           # Österreichische Waffenfabriksgesellschaft
-            'company_ludwig_moser_and_sons': 'AUS', # Glasfabrik Ludwig Moser & Söhne
-            'company_gebruder_thonet': 'AUS', # Gebrüder Thonet
-            'company_compagnie_du_congo': 'BEL', # Compagnie du Congo
-            'company_chr_hansens': 'DEN',    # Chr. Hansen
-            'company_ap_moller': 'DEN',      # A.P. Møller
-            'company_nokia': 'FIN',          # Nokia
-            'company_societe_mokta_el_hadid': 'FRA', # Société Mokta El Hadid
-            'company_schneider_creusot': 'FRA', # Schneider et Cie
-            'company_dmc': 'FRA',            # Dollfus-Mieg et Compagnie
-            'company_cgv': 'FRA',            # Confédération Générale des Vignerons
-            'company_saint_etienne': 'FRA',  # Manufacture d'armes de Saint-Étienne
-            'company_fcm': 'FRA',            # Forges et Chantiers de la Méditerranée
-            'company_mines_anzin': 'FRA',    # Compagnie des mines d'Anzin
-            'company_maison_worth': 'FRA',   # Maison Worth
-            'company_basileiades': 'GRE',    # Basileiades
-            'company_kouppas': 'GRE',        # Kouppas
-            'company_ilva': 'ITA',           # Ilva
-            'company_ansaldo': 'ITA',        # Gio. Ansaldo & C.
-            'company_fiat': 'ITA',           # Fiat
-            'company_ricordi': 'ITA',        # G. Ricordi & C.
-            'company_stt': 'ITA',            # Stabilimento Tecnico Triestino
-            'company_anglo_sicilian_sulphur_company': 'ITA', # Anglo-Sicilian Sulphur Company
-            'company_mantero_seta': 'ITA',   # Mantero Seta
-            'company_nederlandse_petroleum': 'NET', # Nederlandse Petroleum Maatschappij
-            'company_philips': 'NET',        # Philips
-            'company_aker_mek': 'NOR',       # Agers Mechaniske Værksted
-            'company_norsk_hydro': 'NOR',    # Norsk Hydro-Elektrisk Kvælstofaktieselskap
-            'company_ursus': 'POL',          # Ursus
-            'company_lilpop': 'POL',         # Lilpop, Rau i Loewenstein
-            'company_mozambique_company': 'POR', # Companhia de Moçambique
-            'company_cfr': 'ROM',            # Căile Ferate Române
-            'company_romanian_star': 'ROM',  # Steaua Română
-            'company_vodka_monopoly': 'RUS', # Vodka Monopoly
-            'company_putilov_company': 'RUS', # Society of Putilov Factories
-            'company_branobel': 'RUS',       # Branobel
-            'company_izhevsk_arms_plant': 'RUS', # Izhevsk Arms Plant
-            'company_savva_morozov': 'RUS',  # Savva Morozov & Sons
-            'company_john_hughes': 'RUS',    # New Russia Company Ltd
-            'company_russian_american_company': 'RUS', # Russian-American Company
-            'company_zastava': 'SER',        # Zastava
-            'company_altos_hornos_de_vizcaya': 'SPA', # Altos Hornos de Vizcaya
-            'company_duro_y_compania': 'SPA', # Duro y Compañía
-            'company_espana_industrial': 'SPA', # La España Industrial
-            'company_trubia': 'SPA',         # Fábrica de Armas de Trubia
-            'company_ericsson': 'SWE',       # Ericsson
-            'company_lkab': 'SWE',           # LKAB
-            'company_gotaverken': 'SWE',     # Götaverken
-            'company_paradox': 'SWE',        # John Paradox Company
-            'company_da_afghan_nassaji_sherkat': 'AFG', # Də Afḡān Nasājī Šerkat
-            'company_sherkat_shemali': 'AFG', # Šerkate Etteḥādīyaye Welāyate Šemālī
-            'company_misr': 'EGY',           # Misr Spinning and Weaving Company
-            'company_egyptian_rail': 'EGY',  # Egyptian State Railways
-            'company_suez_company': 'EGY',   # Suez Canal Company
-            'company_nicolas_portalis': 'EGY', # MM. Nicolas Portalis et Cie
-            'company_imperial_tobacco': 'PER', # Imperial Tobacco Corporation of Persia
-            'company_iranian_state_railway': 'PER', # Iranian State Railway
-            'company_opium_export_monopoly': 'PER', # Bongāhe Enḥeṣāre Ṣāderāte Taryāk
-            'company_sherkate_eslamiya': 'PER', # Šerkate Eslāmiya
-            'company_persshelk': 'PER',      # Persshelk
-            'company_perskhlopok': 'PER',    # Perskhlopok
-            'company_moscow_irrigation_company': 'PER', # Moscow Irrigation Company
-            'company_anglo_persian_oil': 'PER', # Anglo-Persian Oil Company
-            'company_national_iranian_oil': 'PER', # National Iranian Oil Company
-            'company_tashkent_railroad': 'KOK', # Tashkent Railroad
-            'company_west_ural_petroleum': 'KOK', # West Ural Petroleum Company Limited
-            'company_kirgizian_mining_company': 'KOK', # Kirgizian Mining Joint Stock Company
-            'company_imperial_arsenal': 'TUR', # Tersânei Âmire
-            'company_ottoman_tobacco_regie': 'TUR', # Ottoman Tobacco Company
-            'company_allatini_mills': 'TUR',  # Allatini Mills
-            'company_orient_express': 'TUR',  # Chemins de Fer Orientaux
-            'company_turkish_petroleum': 'TUR', # Turkish Petroleum Company
-            'company_imperial_ethiopian_railways': 'ETH', # Imperial Ethiopian Railway Company
-            'company_john_holt': 'SOK',       # John Holt and Company (Niger)
-            'company_de_beers': 'SAF',        # De Beers Consolidated Mines Ltd
-            'company_prussian_state_railways': 'DEU', # Preußische Staatseisenbahnen (file_based -> wiki)
-            'company_ccci': 'BEL',            # Compagnie du Congo -> wiki assignment (Belgium)
-        }
-        
-        return company_aliases.get(company_name, None)
+        company_aliases = self.registry['wiki_company_countries']
+        if company_name in company_aliases:
+            return company_aliases[company_name]
+        
+        # The wiki lists companies by display name
+        display_key = self.normalize_company_name(self.registry['company_display_names'].get(company_name, ''))
+        if display_key in self.wiki_companies:
+            self.wiki_match_log[company_name] = {'method': 'display_name', 'wiki_key': display_key, 'score': 1.0}
+            return self.map_wiki_country_to_code(self.wiki_companies[display_key])
+        
+        candidates = self.rank_wiki_candidates(company_name, display_key)
+        if not candidates:
+            return None
+        best_key, best_score = candidates[0]
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        if best_score >= self.WIKI_MATCH_AUTO_SCORE and best_score - runner_up >= self.WIKI_MATCH_MARGIN:
+            self.wiki_match_log[company_name] = {'method': 'fuzzy', 'wiki_key': best_key, 'score': best_score}
+            return self.map_wiki_country_to_code(self.wiki_companies[best_key])
+        
+        self.wiki_match_log[company_name] = {
+            'method': 'review',
+            'candidates': [{'wiki_key': key, 'score': score,
+                            'wiki_country': self.map_wiki_country_to_code(self.wiki_companies[key])}
+                           for key, score in candidates]}
+        return None
+    
+    def rank_wiki_candidates(self, company_name, display_key=''):
+        """Rank wiki keys against a company's normalized ID and display name, keeping each key's best score"""
+        best = {}
+        for query in (self.normalize_company_name(company_name), display_key):
+            if query:
+                for wiki_key, score in self.find_wiki_candidates(query):
+                    best[wiki_key] = max(score, best.get(wiki_key, 0.0))
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:3]
+    
+    def save_wiki_match_report(self):
+        """Write the fuzzy wiki assignments and the near misses left for review"""
+        report = {'auto': {}, 'review': {}}
+        for company_name, entry in sorted(self.wiki_match_log.items()):
+            if entry['method'] != 'review':
+                report['auto'][company_name] = entry
+            elif self.companies.get(company_name, {}).get('flavored_company'):
+                # The wiki only lists flavored companies, so generic ones have nothing to review
+                report['review'][company_name] = entry
+        
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.WIKI_MATCH_REPORT)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print("Wiki name matching: {} assigned by display name or fuzzy match, {} left for review ({})".format(
+            len(report['auto']), len(report['review']), path))
+        for company_name, entry in report['review'].items():
+            best = entry['candidates'][0]
+            print("  ? {} -> {} ({:.2f})".format(company_name, best['wiki_key'], best['score']))
+        return report
 
     def parse_prestige_goods(self):
         """Parse prestige goods to map them to their base goods"""
@@ -1507,181 +1696,7 @@ class Victoria3CompanyParserV6Final:
                 
                 # Add display name - prioritize manual mappings over game file comments
                 # Complete wiki-based display name mappings (142 companies)
-                display_names = {
-                    'company_allatini_mills': 'Allatini Mills',
-                    'company_altos_hornos_de_vizcaya': 'Altos Hornos de Vizcaya',
-                    'company_anglo_persian_oil': 'Anglo-Persian Oil Company',
-                    'company_anglo_sicilian_sulphur_company': 'Anglo-Sicilian Sulphur Company',
-                    'company_ansaldo': 'Gio. Ansaldo & C.',
-                    'company_ap_moller': 'A.P. Møller',
-                    'company_argentinian_wine': 'Centro Vitivinícola Nacional',
-                    'company_armstrong_whitworth': 'Sir W. G. Armstrong Whitworth & Co.',
-                    'company_assam_company': 'Assam Company',
-                    'company_b_grimm': 'B. Grimm',
-                    'company_basf': 'BASF',
-                    'company_basileiades': 'Basileiades',
-                    'company_bengal_coal_company': 'Bengal Coal Company',
-                    'company_bolckow_vaughan': 'Bolckow, Vaughan & Co.',
-                    'company_bombay_burmah_trading_corporation': 'Bombay Burmah Trading Corporation',
-                    'company_bombay_dyeing_company': 'Bombay Dyeing and Manufacturing Company Limited',
-                    'company_branobel': 'Branobel',
-                    'company_bunge_born': 'Bunge & Born',
-                    'company_calcutta_electric': 'Calcutta Electric Supply Corporation Limited',
-                    'company_caribbean_petroleum': 'Caribbean Petroleum Company',
-                    'company_ccci': 'Compagnie du Congo',
-                    'company_cfr': 'Căile Ferate Române',
-                    'company_cgv': 'Confédération générale des vignerons',
-                    'company_construction_power_bloc': 'United Construction Conglomerate',
-                    'company_chr_hansens': 'Chr. Hansen',
-                    'company_colt_firearms': 'Colt\'s Patent Firearms Manufacturing Company',
-                    'company_compania_sansinena_de_carnes_congeladas': 'Compañía Sansinena de Carnes Congeladas',
-                    'company_cordoba_railway': 'Ferrocarril Central Córdoba',
-                    'company_csfa': 'Compañía de Salitres y Ferrocarril de Antofagasta',
-                    'company_da_afghan_nassaji_sherkat': 'Də Afḡān Nasājī Šerkat',
-                    'company_david_sassoon': 'David Sassoon & Co., Ltd',
-                    'company_de_beers': 'De Beers Consolidated Mines Ltd.',
-                    'company_dmc': 'Dollfus-Mieg et Compagnie',
-                    'company_duro_y_compania': 'Duro y Compañía',
-                    'company_east_india_company': 'East India Company',
-                    'company_eea': 'Empresas Eléctricas Asociadas',
-                    'company_egyptian_rail': 'Egyptian State Railways',
-                    'company_el_aguila': 'El Águila',
-                    'company_electricidad_de_caracas': 'C.A. La Electricidad de Caracas',
-                    'company_ericsson': 'Ericsson',
-                    'company_espana_industrial': 'La España Industrial',
-                    'company_estaleiro_maua': 'Estaleiro Mauá',
-                    'company_estanifera_llallagua': 'Compañía Estañífera de Llallagua',
-                    'company_famae': 'Fábrica de Armas de la Nación',
-                    'company_fcm': 'Forges et Chantiers de la Méditerranée',
-                    'company_fiat': 'FIAT',
-                    'company_foochow_arsenal': 'Foochow Shipyards',
-                    'company_ford_motor': 'Ford Motor Company',
-                    'company_franco_belge': 'Société Franco-Belge',
-                    'company_fundicao_ipanema': 'Fundição Ipanema',
-                    'company_fundidora_monterrey': 'Fundidora de Fierro y Acero de Monterrey',
-                    'company_galician_carpathian_oil': 'Galician Carpathian Petroleum Company',
-                    'company_gebruder_thonet': 'Gebrüder Thonet',
-                    'company_general_electric': 'General Electric',
-                    'company_gotaverken': 'Götaverken',
-                    'company_great_indian_railway': 'Great Indian Peninsula Railway',
-                    'company_guinness': 'Arthur Guinness Son & Co. Ltd',
-                    'company_gwr': 'Great Western Railway',
-                    'company_hanseong_jeongi_hoesa': 'Hanseong Jeongi Hoesa',
-                    'company_hanyang_arsenal': 'Hanyang Arsenal',
-                    'company_hbc': 'Hudson\'s Bay Company',
-                    'company_ilva': 'Ilva',
-                    'company_imperial_arsenal': 'Tersâne-i Âmire',
-                    'company_imperial_ethiopian_railways': 'Imperial Ethiopian Railway Company',
-                    'company_imperial_tobacco': 'Imperial Tobacco Corporation of Persia',
-                    'company_iranian_state_railway': 'Iranian State Railway',
-                    'company_izhevsk_arms_plant': 'Izhevsk Arms Plant',
-                    'company_j_p_coats': 'J. & P. Coats',
-                    'company_jiangnan_weaving_bureaus': 'Jiangnan Weaving Bureaus',
-                    'company_jingdezhen': 'Jingdezhen Kilns',
-                    'company_john_brown': 'John Brown & Company',
-                    'company_john_cockerill': 'Société anonyme John Cockerill',
-                    'company_john_holt': 'John Holt and Company',
-                    'company_john_hughes': 'New Russia Company Ltd.',
-                    'company_kablin': 'Klabin Irmãos & Cia.',
-                    'company_kaiping_mining': 'Kaiping Mining Company',
-                    'company_kinkozan_sobei': 'Kinkozan Sobei',
-                    'company_kirgizian_mining_company': 'Kirgizian Mining Joint Stock Company',
-                    'company_konigliche_porzellan_manufaktur_meissen': 'Königliche Porzellan-Manufaktur Meissen',
-                    'company_kouppas': 'Kouppas',
-                    'company_krupp': 'Friedrich Krupp',
-                    'company_la_rosada': 'La Rosada',
-                    'company_lanfang_kongsi': 'Lanfang Kongsi',
-                    'company_lee_wilson': 'Lee Wilson & Company',
-                    'company_lilpop': 'Lilpop, Rau i Loewenstein',
-                    'company_lkab': 'LKAB',
-                    'company_ludwig_moser_and_sons': 'Glasfabrik Ludwig Moser & Söhne',
-                    'company_madura_mills': 'Madura Mills Co. Ltd',
-                    'company_maison_worth': 'Maison Worth',
-                    'company_manfred_weiss': 'Manfréd Weiss Steel and Metal Works',
-                    'company_mantetsu': 'South Manchuria Railway',
-                    'company_mantero_seta': 'Mantero Sera',
-                    'company_maple_and_co': 'Maple & Co.',
-                    'company_massey_harris': 'Massey-Harris Limited',
-                    'company_mav': 'MÁVAG',
-                    'company_mines_anzin': 'Compagnie des mines d\'Anzin',
-                    'company_misr': 'Misr Spinning and Weaving Company',
-                    'company_mitsubishi': 'Mitsubishi',
-                    'company_mitsui': 'Mitsui',
-                    'company_moscow_irrigation_company': 'Moscow Irrigation Company',
-                    'company_mozambique_company': 'Companhia de Moçambique',
-                    'company_nam_dinh': 'Nam Định Textile Factory',
-                    'company_national_iranian_oil': 'National Iranian Oil Company',
-                    'company_nederlandse_petroleum': 'Nederlandse Petroleum Maatschappij',
-                    'company_nicolas_portalis': 'MM. Nicolas Portalis et Cie.',
-                    'company_nokia': 'Nokia',
-                    'company_norsk_hydro': 'Norsk Hydroelektrisk Kvælstofaktieselskap',
-                    'company_oevg': 'Österreichische Waffenfabriks-Gesellschaft',
-                    'company_ong_lung_sheng_tea_company': 'Ong Lung Sheng Tea Company',
-                    'company_opium_export_monopoly': 'Bongāh-e Enḥeṣār-e Ṣāderāt-e Taryāk',
-                    'company_orient_express': 'Chemins de fer Orientaux',
-                    'company_oriental_development_company': 'Oriental Development Company',
-                    'company_ottoman_tobacco_regie': 'Ottoman Tobacco Company',
-                    'company_panama_company': 'Panama Canal Company',
-                    'company_paradox': 'John Paradox & Company',
-                    'company_pernambuco_textiles': 'Companhia Fiação e Tecidos de Pernambuco',
-                    'company_perskhlopok': 'Perskhlopok',
-                    'company_persshelk': 'Persshelk',
-                    'company_peruvian_amazon': 'Peruvian Amazon Company',
-                    'company_philips': 'Philips',
-                    'company_prussian_state_railways': 'Preußische Staatseisenbahnen',
-                    'company_putilov_company': 'Society of Putilov Factories',
-                    'company_ralli_brothers': 'Ralli Brothers',
-                    'company_rheinmetall': 'Rheinmetall',
-                    'company_ricordi': 'G. Ricordi & C.',
-                    'company_romanian_star': 'Steaua Română',
-                    'company_rossi': 'Amadeo Rossi & Cia.',
-                    'company_russian_american_company': 'Russian-American Company',
-                    'company_saint_etienne': 'Manufacture d\'armes de Saint-Étienne',
-                    'company_san_miguel': 'San Miguel',
-                    'company_sao_paulo_railway': 'São Paulo Railway Co. Ltd.',
-                    'company_savva_morozov': 'Savva Morozov & Sons',
-                    'company_schichau': 'F. Schichau',
-                    'company_schneider_creusot': 'Schneider et Cie',
-                    'company_sherkat_shemali': 'Šerkat-e Etteḥādīya-ye Welāyat-e Šemālī',
-                    'company_sherkate_eslamiya': 'Šerkat-e Eslāmiya',
-                    'company_siemens_and_halske': 'Siemens & Halske',
-                    'company_skoda': 'Škoda Works',
-                    'company_societe_mokta_el_hadid': 'Société Mokta El Hadid',
-                    'company_standard_oil': 'Standard Oil',
-                    'company_steel_brothers': 'Steel Brothers & Co. Ltd',
-                    'company_stt': 'Stabilimento Tecnico Triestino',
-                    'company_sudamericana_de_vapores': 'Compañía Sudamericana de Vapores',
-                    'company_suez_company': 'Suez Canal Company',
-                    'company_sunhwaguk': 'Sunhwaguk',
-                    'company_tashkent_railroad': 'Tashkent Railroad',
-                    'company_tata': 'Tata',
-                    'company_trubia': 'Fábrica de Armas de Trubia',
-                    'company_turkish_petroleum': 'Turkish Petroleum Company',
-                    'company_united_fruit': 'United Fruit Company',
-                    'company_ursus': 'Ursus',
-                    'company_us_steel': 'Carnegie Steel Co.',
-                    'company_vodka_monopoly': 'Vodka Monopoly',
-                    'company_wadia_shipbuilders': 'Wadia Shipbuilders',
-                    'company_west_ural_petroleum': 'West Ural Petroleum Company, Limited',
-                    'company_william_cramp': 'William Cramp & Sons',
-                    'company_william_sandford': 'William Sandford Limited',
-                    'company_zastava': 'Zastava',
-                    # Final 14 edge cases for complete wiki coverage
-                    'company_fundicao_ipanema': 'Fundição Ipanema',
-                    'company_chr_hansens': 'Chr. Hansen',
-                    'company_krupp': 'Friedrich Krupp',
-                    'company_ansaldo': 'Gio. Ansaldo & C.',
-                    'company_paradox': 'John Paradox & Company',
-                    'company_afghan_national_weaving': 'Də Afḡān Nasājī Šerkat',
-                    'company_north_league_company': 'Šerkat-e Etteḥādīya-ye Welāyat-e Šemālī',
-                    'company_opium_export_monopoly': 'Bongāh-e Enḥeṣār-e Ṣāderāt-e Taryāk',
-                    'company_islamic_company': 'Šerkat-e Eslāmiya',
-                    'company_nam_dinh_textile': 'Nam Định Textile Factory',
-                    'company_kirgizian_mining': 'Kirgizian Mining Joint Stock Company',
-                    'company_tersane_i_amire': 'Tersâne-i Âmire',
-                    'company_john_holt': 'John Holt and Company',
-                    'company_portalis': 'MM. Nicolas Portalis et Cie.',
-                }
+                display_names = self.registry['company_display_names']
                 
                 if company_name in display_names:
                     # Use manual mapping
@@ -1958,6 +1973,30 @@ class Victoria3CompanyParserV6Final:
             
         return company_data
     
+    def parse_company_file(self, filename):
+        """Parse one file in the company types directory into {company name: record}"""
+        file_path = os.path.join(self.company_types_dir, filename)
+        print("Parsing {}...".format(filename))
+        import codecs
+        with codecs.open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            
+        file_companies = self.parse_paradox_file(content)
+        
+        # Add file-based country inference for companies without state requirements
+        file_country = self.infer_country_from_filename(filename)
+        for company_name, company_data in file_companies.items():
+            if company_data['flavored_company'] and (not company_data.get('country') or company_data.get('country') == ''):
+                # Try manual override first
+                override_country = self.get_company_country_override(company_name)
+                if override_country:
+                    company_data['country'] = override_country
+                    company_data['country_confidence'] = 'manual_assignment'
+                elif file_country:
+                    company_data['country'] = file_country
+                    company_data['country_confidence'] = 'file_based'
+        return file_companies
+    
     def parse_all_companies(self):
         """Parse all company files in the directory"""
         if not os.path.exists(self.company_types_dir):
@@ -1966,27 +2005,8 @@ class Victoria3CompanyParserV6Final:
         for filename in os.listdir(self.company_types_dir):
             if filename.endswith('.txt'):
                 file_path = os.path.join(self.company_types_dir, filename)
-                print("Parsing {}...".format(filename))
                 try:
-                    import codecs
-                    with codecs.open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                    file_companies = self.parse_paradox_file(content)
-                    
-                    # Add file-based country inference for companies without state requirements
-                    file_country = self.infer_country_from_filename(filename)
-                    for company_name, company_data in file_companies.items():
-                        if company_data['flavored_company'] and (not company_data.get('country') or company_data.get('country') == ''):
-                            # Try manual override first
-                            override_country = self.get_company_country_override(company_name)
-                            if override_country:
-                                company_data['country'] = override_country
-                                company_data['country_confidence'] = 'manual_assignment'
-                            elif file_country:
-                                company_data['country'] = file_country
-                                company_data['country_confidence'] = 'file_based'
-                    
+                    file_companies = self.parse_company_file(filename)
                     self.companies.update(file_companies)
                     
                     # Track all buildings
@@ -1998,6 +2018,7 @@ class Victoria3CompanyParserV6Final:
                     print("Error parsing {}: {}".format(file_path, e))
                 continue
                 
+        self.load_companies(self.companies)
         print("Parsed {} companies with {} unique buildings".format(len(self.companies), len(self.all_buildings)))
         
         # Count flavored companies with country associations
@@ -2005,14 +2026,59 @@ class Victoria3CompanyParserV6Final:
         country_count = sum(1 for data in self.companies.values() if data['country'])
         print("Found {} flavored companies, {} with country associations".format(flavored_count, country_count))
 
+    def load_companies(self, companies):
+        """Store company records (parsed or loaded from JSON) as compact Company objects"""
+        self.companies = dict((sys.intern(name), data if isinstance(data, Company) else Company(data))
+                              for name, data in companies.items())
+        self._prestige_masks = {}
+    
+    def get_building_bit(self, building):
+        """Get a building's bit in the coverage bitmasks (0 if no company has the building)"""
+        building_id = Company.buildings.ids.get(building)
+        return 0 if building_id is None else 1 << building_id
+    
+    def get_mask_buildings(self, mask):
+        """Get the buildings in a coverage bitmask, in building ID order"""
+        buildings = []
+        while mask:
+            low_bit = mask & -mask
+            buildings.append(Company.buildings.name(low_bit.bit_length() - 1))
+            mask ^= low_bit
+        return buildings
+    
+    def get_prestige_mask(self, company_name):
+        """Get the bitmask of base buildings a company can make a prestige good in (cached until the data is reloaded)"""
+        if getattr(self, '_prestige_masks', None) is None:
+            self._prestige_masks = {}
+        mask = self._prestige_masks.get(company_name)
+        if mask is None:
+            mask = 0
+            data = self.companies[company_name]
+            if data.possible_prestige_goods:
+                for building in data.building_types:
+                    prestige_result = self.company_has_prestige_for_building(company_name, building)
+                    if prestige_result and prestige_result[0]:
+                        mask |= self.get_building_bit(building)
+            self._prestige_masks[company_name] = mask
+        return mask
+    
+    def get_coverage_mask(self, company_names, include_charters=True):
+        """Get the union of the companies' base (and charter) coverage bitmasks"""
+        mask = 0
+        for company_name in company_names:
+            data = self.companies.get(company_name)
+            if data is not None:
+                mask |= data.base_mask | (data.charter_mask if include_charters else 0)
+        return mask
+    
     def get_building_frequency(self, companies):
         """Count how many companies use each building"""
         building_counts = Counter()
         
         for company_data in companies.values():
-            for building in company_data['building_types']:
+            for building in company_data.building_types:
                 building_counts[building] += 1
-            for building in company_data['extension_building_types']:
+            for building in company_data.extension_building_types:
                 building_counts[building] += 1
                 
         return building_counts
@@ -2021,21 +2087,19 @@ class Victoria3CompanyParserV6Final:
         """Get all companies that have a specific building"""
         companies_with_building = []
         
+        building_bit = self.get_building_bit(building)
         for company_name, data in self.companies.items():
             has_building = False
             has_prestige = False
             
             if as_extension:
-                has_building = building in data['extension_building_types']
+                has_building = bool(data.charter_mask & building_bit)
             else:
-                has_building = building in data['building_types']
+                has_building = bool(data.base_mask & building_bit)
                 
             # Check if this company can produce prestige goods for buildings it has as base
-            if has_building and not as_extension and data['possible_prestige_goods']:
-                # Use the same logic as company_has_prestige_for_building
-                prestige_result = self.company_has_prestige_for_building(company_name, building)
-                if prestige_result and isinstance(prestige_result, tuple) and prestige_result[0]:
-                    has_prestige = True
+            if has_building and not as_extension and data.possible_prestige_goods:
+                has_prestige = bool(self.get_prestige_mask(company_name) & building_bit)
                 
             if has_building:
                 if with_prestige and has_prestige:
@@ -2048,9 +2112,7 @@ class Victoria3CompanyParserV6Final:
     def get_building_display_name(self, building_name):
         """Get the display name for a building, with special case overrides"""
         # Building display name overrides (for UI display)
-        building_display_name_overrides = {
-            'building_chemical_plants': 'Fertilizer Plants'
-        }
+        building_display_name_overrides = self.registry['building_display_name_overrides']
         
         if building_name in building_display_name_overrides:
             return building_display_name_overrides[building_name]
@@ -2059,15 +2121,7 @@ class Victoria3CompanyParserV6Final:
     
     def get_all_buildings_for_companies(self, company_names):
         """Get all buildings (base + extension) available to a set of companies"""
-        all_buildings = set()
-        
-        for company_name in company_names:
-            if company_name in self.companies:
-                data = self.companies[company_name]
-                all_buildings.update(data['building_types'])
-                all_buildings.update(data['extension_building_types'])
-                
-        return sorted(all_buildings)
+        return sorted(self.get_mask_buildings(self.get_coverage_mask(company_names)))
     
     def company_has_prestige_for_building(self, company_name, building):
         """Check if a company can produce prestige goods for this specific building"""
@@ -2075,7 +2129,7 @@ class Victoria3CompanyParserV6Final:
             return False
             
         data = self.companies[company_name]
-        if not data['possible_prestige_goods'] or building not in data['building_types']:
+        if not data.possible_prestige_goods or not data.base_mask & self.get_building_bit(building):
             return False
             
         # Get the good that this building produces
@@ -2084,7 +2138,7 @@ class Victoria3CompanyParserV6Final:
             return False
             
         # Check if any prestige good matches this building's output
-        for prestige_good in data['possible_prestige_goods']:
+        for prestige_good in data.possible_prestige_goods:
             if prestige_good in self.prestige_goods:
                 base_good = self.prestige_goods[prestige_good]
                 if base_good == building_good:
@@ -2113,49 +2167,115 @@ class Victoria3CompanyParserV6Final:
         
         return False
     
-    def cross_check_with_wiki(self):
-        """Cross-check extracted country data with wiki data"""
+    def _name_trigrams(self, normalized_name):
+        """Get the character trigrams of a normalized company name (company_ prefix dropped, ends padded)"""
+        text = ' {} '.format(normalized_name.replace('company_', '', 1).replace('_', ' '))
+        return set(text[i:i + 3] for i in range(len(text) - 2))
+    
+    def get_wiki_ngram_index(self):
+        """Get the trigram index over the wiki company keys: (keys, {trigram: [key index]}, [trigram count])"""
+        cached = getattr(self, '_wiki_ngram_index', None)
+        if cached is not None and cached[0] is self.wiki_companies and cached[1] == len(self.wiki_companies):
+            return cached[2]
+        keys = sorted(self.wiki_companies)
+        postings = defaultdict(list)
+        sizes = []
+        for key_index, key in enumerate(keys):
+            trigrams = self._name_trigrams(key)
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(key_index)
+        index = (keys, dict(postings), sizes)
+        self._wiki_ngram_index = (self.wiki_companies, len(self.wiki_companies), index)
+        return index
+    
+    def find_wiki_candidates(self, normalized_name, limit=3, min_score=0.3):
+        """Rank wiki company keys by trigram Dice similarity to a normalized name: [(wiki_key, score)]"""
+        keys, postings, sizes = self.get_wiki_ngram_index()
+        trigrams = self._name_trigrams(normalized_name)
+        if not trigrams:
+            return []
+        shared = Counter()
+        for trigram in trigrams:
+            for key_index in postings.get(trigram, ()):
+                shared[key_index] += 1
+        scored = []
+        for key_index, count in shared.items():
+            score = 2.0 * count / (len(trigrams) + sizes[key_index])
+            if score >= min_score:
+                scored.append((keys[key_index], round(score, 3)))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+    
+    def cross_check_with_wiki(self, report_name="wiki_cross_check"):
+        """Join extracted companies with the wiki on normalized names and write a JSON/CSV report"""
         if not self.wiki_companies:
             print("No wiki data available for cross-checking")
             return
-            
-        print("\n=== Country Association Cross-Check ===")
-        matches = 0
-        mismatches = 0
-        missing_from_extraction = 0
-        
-        # Check extracted companies against wiki
-        for company_name, data in self.companies.items():
-            if data['country']:
-                wiki_key = company_name.replace('company_', '').replace('_', ' ').lower()
-                
-                if wiki_key in self.wiki_companies:
-                    wiki_country = self.wiki_companies[wiki_key]
-                    extracted_country = data['country']
-                    confidence = data['country_confidence']
-                    
-                    if wiki_country == extracted_country:
-                        print("✅ {}: {} ({})".format(company_name.replace('company_', '').replace('_', ' ').title(), extracted_country, confidence))
-                        matches += 1
-                    else:
-                        print("❌ {}: Extracted {} ({}) vs Wiki {}".format(company_name.replace('company_', '').replace('_', ' ').title(), extracted_country, confidence, wiki_country))
-                        mismatches += 1
-                else:
-                    print("INFO: {}: Extracted {} ({}), not in wiki".format(company_name.replace('company_', '').replace('_', ' ').title(), data['country'], data['country_confidence']))
         
-        # Check for companies in wiki but not extracted
+        # Both sides use normalize_company_name; game companies join on their ID and their display name
+        wiki_by_key = {}
         for wiki_key, wiki_country in self.wiki_companies.items():
-            found = False
-            for company_name, data in self.companies.items():
-                if company_name.replace('company_', '').replace('_', ' ').lower() == wiki_key and data['country']:
-                    found = True
-                    break
-            if not found:
-                company_display = wiki_key.title()
-                print("WARNING: {}: Wiki has {}, but extraction found none".format(company_display, wiki_country))
-                missing_from_extraction += 1
-                
-        print("\nSummary: {} matches, {} mismatches, {} missing from extraction".format(matches, mismatches, missing_from_extraction))
+            wiki_by_key[self.normalize_company_name(wiki_key) or wiki_key] = (wiki_key, wiki_country)
+        
+        report = {'matches': [], 'mismatches': [], 'not_in_wiki': [], 'missing_from_extraction': []}
+        matched_wiki_keys = set()
+        for company_name, data in sorted(self.companies.items()):
+            if not data['country']:
+                continue
+            join_keys = [self.normalize_company_name(company_name),
+                         self.normalize_company_name(data.get('display_name', ''))]
+            wiki_entry = next((wiki_by_key[key] for key in join_keys if key in wiki_by_key), None)
+            row = {
+                'company': company_name,
+                'extracted_country': data['country'],
+                'confidence': data['country_confidence'],
+            }
+            if wiki_entry is None:
+                # Near misses: the closest wiki names by trigram similarity, for review
+                row['candidates'] = [
+                    {'wiki_key': wiki_key, 'score': score, 'wiki_country': self.map_wiki_country_to_code(self.wiki_companies[wiki_key])}
+                    for wiki_key, score in self.find_wiki_candidates(join_keys[1] or join_keys[0])]
+                report['not_in_wiki'].append(row)
+                continue
+            
+            wiki_key, wiki_country = wiki_entry
+            matched_wiki_keys.add(wiki_key)
+            row.update({'wiki_key': wiki_key, 'wiki_country': wiki_country,
+                        'wiki_code': self.map_wiki_country_to_code(wiki_country)})
+            report['matches' if row['wiki_code'] == data['country'] else 'mismatches'].append(row)
+        
+        for wiki_key, wiki_country in sorted(self.wiki_companies.items()):
+            if wiki_key not in matched_wiki_keys:
+                report['missing_from_extraction'].append({
+                    'wiki_key': wiki_key, 'wiki_country': wiki_country,
+                    'wiki_code': self.map_wiki_country_to_code(wiki_country)})
+        
+        base_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), report_name)
+        with open(base_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        import csv
+        columns = ['status', 'company', 'extracted_country', 'confidence', 'wiki_key', 'wiki_country', 'wiki_code', 'score']
+        with open(base_path + '.csv', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for status, rows in report.items():
+                for row in rows:
+                    # Near misses are listed with their best candidate
+                    candidate = row['candidates'][0] if row.get('candidates') else {}
+                    flat = dict(row, status=status, **candidate)
+                    flat.pop('candidates', None)
+                    writer.writerow(dict((column, flat.get(column, '')) for column in columns))
+        
+        print("\n=== Country Association Cross-Check ===")
+        for row in report['mismatches']:
+            print("❌ {}: Extracted {} ({}) vs Wiki {} ({})".format(
+                row['company'], row['extracted_country'], row['confidence'], row['wiki_country'], row['wiki_code'] or 'unmapped'))
+        print("Summary: {} matches, {} mismatches, {} not in wiki ({} with near misses), {} missing from extraction".format(
+            len(report['matches']), len(report['mismatches']), len(report['not_in_wiki']),
+            sum(1 for row in report['not_in_wiki'] if row['candidates']), len(report['missing_from_extraction'])))
+        print("Cross-check report: {}.json, {}.csv".format(base_path, base_path))
+        return report
     
     def get_countries_by_continent(self):
         """Get countries organized by continent following wiki structure"""
@@ -2259,8 +2379,8 @@ class Victoria3CompanyParserV6Final:
                 
                 # Get company icon
                 clean_name = company_key.replace('company_', '')
-                icon_path = self.get_company_icon_path(clean_name)
-                icon_display = f'<img src="{icon_path}" class="company-icon" alt="Company Icon" style="width: 16px; height: 16px; margin-right: 4px;">' if icon_path else ''
+                icon_path = self.get_company_icon_path(clean_name, 32)
+                icon_display = f'<img src="{icon_path}"{self.get_image_size_attrs(icon_path, 16)} class="company-icon" alt="Company Icon" style="width: 16px; height: 16px; margin-right: 4px;">' if icon_path else ''
                 
                 basic_companies.append({
                     'key': company_key,
@@ -2431,8 +2551,8 @@ class Victoria3CompanyParserV6Final:
                 # List all companies for this country with simple indented checkboxes  
                 for company in companies:
                     # Get company icon or use default
-                    company_icon = self.get_company_icon_path(company['key'])
-                    icon_display = f'<img src="{company_icon}" style="width: 16px; height: 16px; margin-right: 6px; vertical-align: middle;">' if company_icon != 'default_icon.png' else '🏢 '
+                    company_icon = self.get_company_icon_path(company['key'], 32)
+                    icon_display = f'<img src="{company_icon}"{self.get_image_size_attrs(company_icon, 16)} style="width: 16px; height: 16px; margin-right: 6px; vertical-align: middle;">' if company_icon != 'default_icon.png' else '🏢 '
                     
                     # Add special requirement indicators with specific icons
                     indicators = []
@@ -2482,13 +2602,7 @@ class Victoria3CompanyParserV6Final:
             return ""
 
         # Define ownership types in desired order
-        ownership_order = [
-            'Full Capitalist',
-            'Partial Aristocrat',
-            'Partial Bureaucrat',
-            'Partial Academic',
-            'Partial Shopkeeper'
-        ]
+        ownership_order = self.OWNERSHIP_TYPES
 
         html = '''
 
@@ -2524,9 +2638,60 @@ class Victoria3CompanyParserV6Final:
 
         return html
 
+    def get_share_id_tables(self):
+        """Company and building keys in share-code ID order (sorted, so IDs are positions)"""
+        all_buildings = set()
+        for company in self.companies.values():
+            all_buildings.update(company.get('building_types', []))
+            all_buildings.update(company.get('extension_building_types', []))
+        return sorted(self.companies.keys()), sorted(all_buildings)
+    
+    def get_share_table_fingerprint(self, companies, buildings):
+        """16-bit FNV-1a of the ID tables, matching getShareTableFingerprint() in the page"""
+        import struct
+        # Hash UTF-16 code units, as charCodeAt() returns them in the page
+        encoded = (','.join(companies) + '|' + ','.join(buildings)).encode('utf-16-le')
+        value = 0x811c9dc5
+        for unit in struct.unpack('<{}H'.format(len(encoded) // 2), encoded):
+            value = ((value ^ unit) * 0x01000193) & 0xffffffff
+        return (value ^ (value >> 16)) & 0xffff
+    
+    def load_share_table_archive(self):
+        """ID tables of earlier builds by fingerprint, from share_tables.json"""
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.SHARE_TABLE_ARCHIVE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+    
+    def save_share_table_archive(self):
+        """Record the current ID tables so share codes written against them keep decoding after a patch"""
+        companies, buildings = self.get_share_id_tables()
+        fingerprint = str(self.get_share_table_fingerprint(companies, buildings))
+        archive = self.load_share_table_archive()
+        if archive.get(fingerprint) == {'companies': companies, 'buildings': buildings}:
+            return
+        if fingerprint in archive:
+            print("WARNING: Share table fingerprint {} collides with an archived table, keeping the archived one".format(fingerprint))
+            return
+        archive[fingerprint] = {'companies': companies, 'buildings': buildings}
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.SHARE_TABLE_ARCHIVE)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(archive, f, indent=1, sort_keys=True)
+        print("Share table {} added to {} ({} tables)".format(fingerprint, self.SHARE_TABLE_ARCHIVE, len(archive)))
+    
+    def _get_share_table_archive_js(self):
+        """Archived ID tables other than the current one, for decoding share codes from earlier patches"""
+        companies, buildings = self.get_share_id_tables()
+        current = str(self.get_share_table_fingerprint(companies, buildings))
+        archive = dict((fingerprint, tables) for fingerprint, tables in self.load_share_table_archive().items()
+                       if fingerprint != current)
+        return json.dumps(archive, sort_keys=True, separators=(',', ':'))
+    
     def _generate_company_id_mappings(self):
         """Generate JavaScript object mapping company keys to sequential IDs"""
-        companies = sorted(self.companies.keys())
+        companies = self.get_share_id_tables()[0]
         mappings = []
         for i, company_key in enumerate(companies):
             mappings.append(f"'{company_key}': {i}")
@@ -2534,24 +2699,18 @@ class Victoria3CompanyParserV6Final:
     
     def _generate_building_id_mappings(self):
         """Generate JavaScript object mapping building keys to sequential IDs"""
-        # Use all buildings from companies data, sorted for consistent ordering
-        all_buildings = set()
-        for company in self.companies.values():
-            all_buildings.update(company.get('building_types', []))
-            all_buildings.update(company.get('extension_building_types', []))
-        
-        buildings = sorted(all_buildings)
+        buildings = self.get_share_id_tables()[1]
         mappings = []
         for i, building_key in enumerate(buildings):
             mappings.append(f"'{building_key}': {i}")
         return ',\n            '.join(mappings)
     
-    def generate_html_report(self):
+    def generate_html_report(self, workers=None):
         """Generate HTML analysis report with all bugs fixed"""
         
         # Include the working YALPS bundle  
         try:
-            with open('yalps-browserify-direct.js', 'r') as f:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yalps-browserify-direct.js'), 'r') as f:
                 yalps_bundle = f.read()
         except:
             yalps_bundle = "// YALPS bundle not found"
@@ -2639,6 +2798,23 @@ class Victoria3CompanyParserV6Final:
             if building not in buildings_to_analyze:
                 buildings_to_analyze.append(building)
         
+        # Company rows are cached per build; sections, filters and the shared script are cached fragments,
+        # rebuilt only when their inputs change
+        self._company_rows = {}
+        self._prestige_masks = {}
+        fragment_cache = self.load_fragment_cache()
+        fragments = {}
+        build_fingerprint = self._get_build_fingerprint()
+        
+        def fragment(name, inputs, render, *args, **kwargs):
+            fingerprint = kwargs.get('fingerprint') or self._fingerprint(build_fingerprint, inputs)
+            cached = fragment_cache.get(name)
+            if cached and cached[0] == fingerprint:
+                fragments[name] = cached
+            else:
+                fragments[name] = [fingerprint, render(*args)]
+            return fragments[name][1]
+        
         # Generate CSS rules for column hiding and country hiding
         column_hiding_css = self._generate_column_hiding_css(buildings_to_analyze)
         country_hiding_css = self._generate_country_hiding_css(countries_by_continent)
@@ -3308,8 +3484,60 @@ class Victoria3CompanyParserV6Final:
             color: #0D47A1;
         }
         
-        .toc {
-            background: #f0ebe3;
+        .search-box {
+            position: relative;
+            margin-bottom: 20px;
+        }
+        
+        .search-box input {
+            width: 100%;
+            box-sizing: border-box;
+            padding: 10px 12px;
+            font-size: 15px;
+            border: 1px solid #d4c5a9;
+            border-radius: 8px;
+            background: #fffdf8;
+        }
+        
+        .search-results {
+            display: none;
+            position: absolute;
+            left: 0;
+            right: 0;
+            z-index: 1000;
+            max-height: 420px;
+            overflow-y: auto;
+            background: white;
+            border: 1px solid #d4c5a9;
+            border-radius: 0 0 8px 8px;
+            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
+        }
+        
+        .search-result {
+            padding: 6px 12px;
+            cursor: pointer;
+            display: flex;
+            justify-content: space-between;
+            gap: 12px;
+        }
+        
+        .search-result.active,
+        .search-result:hover {
+            background: #f0ebe3;
+        }
+        
+        .search-result-type {
+            color: #888;
+            font-size: 12px;
+            white-space: nowrap;
+        }
+        
+        tr.search-highlight td {
+            background: #fff59d !important;
+        }
+        
+        .toc {
+            background: #f0ebe3;
             padding: 20px;
             border-radius: 8px;
             border: 1px solid #d4c5a9;
@@ -3759,6 +3987,12 @@ class Victoria3CompanyParserV6Final:
     <!-- Company tooltip -->
     <div id="companyTooltip" class="company-tooltip"></div>
     
+    <!-- Search over companies, buildings, goods, requirements and countries -->
+    <div class="search-box">
+        <input type="search" id="company-search" placeholder="🔍 Search companies, buildings, prestige goods, requirements or countries..." autocomplete="off" oninput="updateSearchResults()" onkeydown="handleSearchKey(event)" onblur="setTimeout(hideSearchResults, 200)">
+        <div id="search-results" class="search-results"></div>
+    </div>
+    
     <div class="toc">
         <a name="buildings"></a>
         <h3 id="buildings">Buildings (<span id="selected-buildings-count">49</span>)</h3>
@@ -3843,8 +4077,11 @@ class Victoria3CompanyParserV6Final:
                         html += '<li class="category-item">' \
                                '<input type="checkbox" id="{}" class="building-filter-checkbox" checked data-building="{}" onchange="toggleBuildingFilter(this)">' \
                                '<a href="#{}">' \
-                               '<img src="{}" class="toc-building-icon" alt="{} icon">{} ({})' \
-                               '</a></li>'.format(checkbox_id, building, anchor_name, icon_path, display_name, display_name, usage_count)
+                               '{}{} ({})' \
+                               '</a></li>'.format(checkbox_id, building, anchor_name,
+                                                  self.get_icon_sprite_html(icon_path, 18, display_name + ' icon', 'toc-building-icon') or
+                                                  '<img src="{}"{} class="toc-building-icon" alt="{} icon">'.format(icon_path, self.get_image_size_attrs(icon_path, 18), display_name),
+                                                  display_name, usage_count)
             
             html += '</ul></div>'
         
@@ -3853,61 +4090,250 @@ class Victoria3CompanyParserV6Final:
     </div>'''
         
         # Generate hierarchical country/company filter section
-        html += self._generate_country_filter_section(countries_by_continent)
+        html += fragment('filter:countries', [self._get_company_records_fingerprint(), self._get_mappings_fingerprint(), countries_by_continent],
+                         self._generate_country_filter_section, countries_by_continent)
 
         # Generate ownership filter section
-        html += self._generate_ownership_filter_section(ownership_counts)
+        html += fragment('filter:ownership', [ownership_counts], self._generate_ownership_filter_section, ownership_counts)
 
-        # Generate separate table for each building
+        # Generate separate table for each building; stale sections are rendered together so they can run in parallel
+        section_fingerprints = {}
         for building in buildings_to_analyze:
-            display_name = self.get_building_display_name(building)
-            anchor_name = "building-{}".format(building)
-            usage_count = building_counts.get(building, 0)
-            
-            # Get companies that have this building
-            companies_with_base = self.get_companies_with_building(building, as_extension=False)
-            companies_with_extension = self.get_companies_with_building(building, as_extension=True)
-            companies_with_prestige = self.get_companies_with_building(building, with_prestige=True)
-            
-            # Combine all companies for this building
-            all_companies_with_building = set()
-            for company, _ in companies_with_base + companies_with_extension + companies_with_prestige:
-                all_companies_with_building.add(company)
-            
-            if not all_companies_with_building:
-                continue
-            
-            # Get all buildings available to these companies (for columns) - ordered by logical wiki categories
-            available_buildings_raw = self.get_all_buildings_for_companies(all_companies_with_building)
-            
-            # Use the same logical order as the summary section (wiki_building_order)
-            available_buildings = []
-            for wiki_building in wiki_building_order:
-                if wiki_building in available_buildings_raw:
-                    available_buildings.append(wiki_building)
-            
-            # Add any remaining buildings not in wiki order (safety net)
-            for remaining_building in sorted(available_buildings_raw):
-                if remaining_building not in available_buildings:
-                    available_buildings.append(remaining_building)
-            
-            # Count usage within this specific company set (for tooltips)
-            company_specific_counts = Counter()
-            for company_name in all_companies_with_building:
-                if company_name in self.companies:
-                    data = self.companies[company_name]
-                    for b in data['building_types']:
-                        company_specific_counts[b] += 1
-                    for b in data['extension_building_types']:
-                        company_specific_counts[b] += 1
-            
-            # Get building icon for header
-            building_icon_path = self.get_building_icon_path(building)
-            building_icon_html = ''
-            if building_icon_path:
-                building_icon_html = '<img src="{}" style="width:32px;height:32px;vertical-align:middle;margin-right:10px;" alt="{} icon">'.format(building_icon_path, display_name)
-            
-            html += '''
+            section_fingerprints[building] = self._fingerprint(
+                build_fingerprint, self._get_building_section_inputs(building, wiki_building_order, building_counts.get(building, 0)))
+        stale_buildings = [building for building in buildings_to_analyze
+                           if fragment_cache.get('building:' + building, [None])[0] != section_fingerprints[building]]
+        rendered_sections = self.render_building_sections(stale_buildings, wiki_building_order, building_counts, workers)
+        for building in buildings_to_analyze:
+            html += fragment('building:' + building, None, rendered_sections.get, building,
+                             fingerprint=section_fingerprints[building])
+        
+        html += fragment('script', [self._get_company_records_fingerprint(), self._get_mappings_fingerprint(), wiki_building_order],
+                         self._render_shared_script, wiki_building_order)
+        self.save_fragment_cache(fragment_cache, fragments)
+        
+        all_dynamic_css = column_hiding_css + '\n        /* Dynamic company hiding rules for country filters */\n' + country_hiding_css + self._generate_sprite_css()
+        html = html.replace('__COLUMN_HIDING_CSS_PLACEHOLDER__', all_dynamic_css)
+        html = html.replace('__YALPS_BUNDLE_PLACEHOLDER__', yalps_bundle)
+
+        # Add version and date information
+        last_updated = datetime.now().strftime('%B %d, %Y')
+        html = html.replace('__LAST_UPDATED_PLACEHOLDER__', last_updated)
+        html = html.replace('__GAME_VERSION_PLACEHOLDER__', self.GAME_VERSION)
+        html = html.replace('__OWNERSHIP_TYPES_PLACEHOLDER__', json.dumps(self.OWNERSHIP_TYPES))
+        html = html.replace('__SHARE_TABLE_ARCHIVE_PLACEHOLDER__', self._get_share_table_archive_js())
+
+        return html
+
+    def _fingerprint(self, *parts):
+        """Hash JSON-serialisable inputs into a fragment fingerprint"""
+        import hashlib
+        encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False,
+                             default=lambda value: sorted(value) if isinstance(value, (set, frozenset)) else
+                             value.to_dict() if isinstance(value, Company) else str(value))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def _get_build_fingerprint(self):
+        """Fingerprint the inputs every fragment reads: generator source, game version and icon assets"""
+        if getattr(self, '_build_fingerprint', None) is None:
+            import hashlib
+            with open(os.path.abspath(__file__), 'rb') as f:
+                source_hash = hashlib.sha256(f.read()).hexdigest()
+            self._build_fingerprint = self._fingerprint(
+                source_hash, self.GAME_VERSION, self.registry.fingerprint, self.get_image_index(), self.get_icon_atlas(),
+                self.get_asset_aliases(), self.get_icon_variants())
+        return self._build_fingerprint
+    
+    def _get_company_records_fingerprint(self):
+        """Fingerprint every company record, for fragments that read all companies"""
+        return self._fingerprint(sorted(self.companies.items()))
+    
+    def _get_mappings_fingerprint(self):
+        """Fingerprint the lookup tables loaded at startup (names, flags, goods, wiki and history data)"""
+        return self._fingerprint([getattr(self, name, None) for name in (
+            'building_to_goods', 'country_flags', 'country_names', 'prestige_good_names', 'prestige_goods',
+            'state_to_country', 'subject_relationships', 'wiki_companies', 'companies_at_game_start',
+            'company_starting_countries')])
+    
+    def _get_building_section_inputs(self, building, wiki_building_order, usage_count):
+        """Get what a building section reads: its companies' records, display names, flags, prestige goods and the goods tables"""
+        section_companies = set()
+        for as_extension, with_prestige in ((False, False), (True, False), (False, True)):
+            for company, _ in self.get_companies_with_building(building, as_extension=as_extension, with_prestige=with_prestige):
+                section_companies.add(company)
+        records = []
+        for company_name in sorted(section_companies):
+            data = self.companies[company_name]
+            country = data.get('country')
+            # The prestige columns and icons follow each prestige good's base good in self.prestige_goods
+            prestige_goods = dict((good, self.prestige_goods.get(good)) for good in data.possible_prestige_goods or ())
+            records.append([company_name, data, self.get_company_display_name(company_name),
+                            self.get_country_flag(country) if country else '', self.get_country_name(country) if country else '',
+                            prestige_goods])
+        return [building, usage_count, wiki_building_order, records, self.prestige_good_names, self.building_to_goods]
+    
+    def load_fragment_cache(self):
+        """Load the cached HTML fragments written by the previous build ({name: [fingerprint, html]})"""
+        try:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.FRAGMENT_CACHE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+    
+    def save_fragment_cache(self, previous, fragments):
+        """Save this build's HTML fragments and report how many were rebuilt"""
+        rebuilt = [name for name, entry in fragments.items() if previous.get(name) != entry]
+        if rebuilt or len(previous) != len(fragments):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.FRAGMENT_CACHE), 'w', encoding='utf-8') as f:
+                json.dump(fragments, f, separators=(',', ':'), ensure_ascii=False)
+        print("HTML fragments: {} rebuilt, {} reused".format(len(rebuilt), len(fragments) - len(rebuilt)))
+    
+    def render_building_sections(self, buildings, wiki_building_order, building_counts, workers=None):
+        """Render building sections into {building: html}, on a process pool when there are enough of them"""
+        jobs = [(building, wiki_building_order, building_counts.get(building, 0)) for building in buildings]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 2 or len(jobs) < self.PARALLEL_SECTION_MIN:
+            return dict((job[0], self._render_building_section(*job)) for job in jobs)
+        
+        from concurrent.futures import ProcessPoolExecutor
+        # Load the lazy icon tables and company rows first so every worker gets them with the snapshot
+        self.get_image_index()
+        self.get_icon_atlas()
+        self.get_asset_aliases()
+        for company_name in self.companies:
+            self.get_company_row(company_name)
+        # Workers render from a pickled copy of the parser; map() keeps the original section order
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_init_section_worker,
+                                 initargs=(self,)) as executor:
+            sections = list(executor.map(_render_building_section_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        return dict(zip(buildings, sections))
+    
+    def get_company_row(self, company_name):
+        """Get the section-independent part of a company's table row (select, flag, coverage and name cells) and its building counts"""
+        if getattr(self, '_company_rows', None) is None:
+            self._company_rows = {}
+        if company_name in self._company_rows:
+            return self._company_rows[company_name]
+        
+        data = self.companies[company_name]
+        display_name = data.get('display_name', self.get_company_display_name(company_name))
+        
+        # Abbreviate long company names for display
+        abbreviated_name = self.abbreviate_company_name(display_name, 35)
+        
+        # Get company building statistics and prestige goods
+        base_count, charter_count, prestige_goods = self.get_company_building_stats(company_name)
+        building_count_display = self.format_building_count(base_count, charter_count)
+        prestige_icons = self.get_company_prestige_icons(company_name)
+        
+        # Add special requirement icons (after prestige icons)
+        special_requirement_icons = ''
+        special_reqs = data.get('special_requirements', [])
+        if 'journal_entry' in special_reqs:
+            special_requirement_icons += '📚 '
+        if 'primary_culture' in special_reqs:
+            special_requirement_icons += '🛑 '
+        if data.get('starts_enacted', False):
+            special_requirement_icons += '⚠️ '
+        
+        # Get company logo
+        company_icon_path = self.get_company_icon_path(company_name, 32)
+        company_icon_html = ''
+        if company_icon_path:
+            company_icon_html = '<img src="{}"{}{} class="company-icon" alt="Company Icon">'.format(
+                company_icon_path, self.get_image_size_attrs(company_icon_path, 24), self.get_company_icon_srcset(company_name, 32))
+        else:
+            company_icon_html = '<div class="company-icon-placeholder"></div>'
+        
+        # Get country flag for separate column with country name tooltip
+        country_flag = ''
+        country_name = ''
+        if data['country']:
+            country_flag = self.get_country_flag(data['country'])
+            country_name = self.get_country_name(data['country'])
+        
+        flag_cell_html = ''
+        if country_flag:
+            flag_cell_html = '<span title="{}">{}</span>'.format(country_name, country_flag)
+        else:
+            flag_cell_html = ''
+        
+        # Get company country for filtering
+        company_country = data.get('country', '')
+
+        # Get company ownership for filtering
+        company_ownership = data.get('ownership_category', 'Full Capitalist')
+
+        cells = '''
+            <tr data-country="{}" data-company="{}" data-ownership="{}">
+                <td class="select-column">
+                    <input type="checkbox" class="company-checkbox" data-company="{}" onchange="toggleCompanySelection('{}')">
+                </td>
+                <td class="flag-column">{}</td>
+                <td class="dynamic-coverage-column" data-company="{}">-</td>
+                <td class="buildings-column">{}</td>
+                <td class="company-name"
+                    onmouseover="showCompanyTooltip(event, '{}')"
+                    onmouseout="hideCompanyTooltip()"
+                    data-company="{}">
+                    {}{}{}{}
+                </td>'''.format(company_country, company_name, company_ownership, company_name, company_name, flag_cell_html, company_name, building_count_display, company_name, company_name, company_icon_html, prestige_icons, special_requirement_icons, abbreviated_name)
+        
+        self._company_rows[company_name] = {'cells': cells, 'base_count': base_count, 'charter_count': charter_count}
+        return self._company_rows[company_name]
+    
+    def _render_building_section(self, building, wiki_building_order, usage_count):
+        """Render the table section for one building (empty if no company can build it)"""
+        display_name = self.get_building_display_name(building)
+        anchor_name = "building-{}".format(building)
+        
+        # Get companies that have this building
+        companies_with_base = self.get_companies_with_building(building, as_extension=False)
+        companies_with_extension = self.get_companies_with_building(building, as_extension=True)
+        companies_with_prestige = self.get_companies_with_building(building, with_prestige=True)
+        
+        # Combine all companies for this building
+        all_companies_with_building = set()
+        for company, _ in companies_with_base + companies_with_extension + companies_with_prestige:
+            all_companies_with_building.add(company)
+        
+        if not all_companies_with_building:
+            return ''
+        
+        # Get all buildings available to these companies (for columns) - ordered by logical wiki categories
+        available_buildings_raw = self.get_all_buildings_for_companies(all_companies_with_building)
+        
+        # Use the same logical order as the summary section (wiki_building_order)
+        available_buildings = []
+        for wiki_building in wiki_building_order:
+            if wiki_building in available_buildings_raw:
+                available_buildings.append(wiki_building)
+        
+        # Add any remaining buildings not in wiki order (safety net)
+        for remaining_building in sorted(available_buildings_raw):
+            if remaining_building not in available_buildings:
+                available_buildings.append(remaining_building)
+        
+        # Count usage within this specific company set (for tooltips)
+        company_specific_counts = Counter()
+        for company_name in all_companies_with_building:
+            if company_name in self.companies:
+                data = self.companies[company_name]
+                for b in data['building_types']:
+                    company_specific_counts[b] += 1
+                for b in data['extension_building_types']:
+                    company_specific_counts[b] += 1
+        
+        # Get building icon for header
+        building_icon_path = self.get_building_icon_path(building)
+        building_icon_html = ''
+        if building_icon_path:
+            building_icon_html = self.get_icon_sprite_html(building_icon_path, 32, display_name + ' icon', style='margin-right:10px;') or \
+                '<img src="{}"{} style="width:32px;height:32px;vertical-align:middle;margin-right:10px;" alt="{} icon">'.format(
+                    building_icon_path, self.get_image_size_attrs(building_icon_path, 32), display_name)
+        
+        html = '''
     <div class="building-section" id="building-{}">
         <h2 id="{}">{}{} ({}) <a href="#custom-companies-section" class="back-to-top" title="Back to Selected Companies">↑ Back to Top</a></h2>
         
@@ -3920,213 +4346,158 @@ class Victoria3CompanyParserV6Final:
                     <th class="dynamic-coverage-column" title="Dynamic Coverage from Selected Companies">➕</th>
                     <th class="buildings-column" title="Base Coverage . Available Industry Charters">📊</th>
                     <th class="company-name">Company Name</th>'''.format(building, anchor_name, building_icon_html, display_name, len(all_companies_with_building))
+        
+        # Add columns for all buildings these companies can use (frequency ordered within this company set)
+        for avail_building in available_buildings:
+            icon_path = self.get_building_icon_path(avail_building)
+            avail_display = avail_building.replace('building_', '').replace('_', ' ').title()
+            usage_in_set = company_specific_counts.get(avail_building, 0)
+            
+            sprite_class = self.get_icon_sprite_class(icon_path) if icon_path else None
+            if sprite_class:
+                header_style = ''
+                header_class = 'building-header {} col-{}'.format(sprite_class, avail_building)
+            elif icon_path:
+                header_style = 'style="background-image: url({})"'.format(icon_path)
+                header_class = 'building-header col-{}'.format(avail_building)
+            else:
+                header_style = ''
+                header_class = 'building-header missing-icon col-{}'.format(avail_building)
             
-            # Add columns for all buildings these companies can use (frequency ordered within this company set)
-            for avail_building in available_buildings:
-                icon_path = self.get_building_icon_path(avail_building)
-                avail_display = avail_building.replace('building_', '').replace('_', ' ').title()
-                usage_in_set = company_specific_counts.get(avail_building, 0)
-                
-                if icon_path:
-                    header_style = 'style="background-image: url({})"'.format(icon_path)
-                    header_class = 'building-header col-{}'.format(avail_building)
-                else:
-                    header_style = ''
-                    header_class = 'building-header missing-icon col-{}'.format(avail_building)
-                
-                html += '''
+            html += '''
                     <th class="{}" {} title="{} ({})" data-building="{}">
                     </th>'''.format(header_class, header_style, avail_display, usage_in_set, avail_building)
-            
-            
-            html += '''
+        
+        
+        html += '''
                 </tr>
             </thead>
             <tbody>'''
+        
+        # Sort companies by building priority for this specific building
+        building_bit = self.get_building_bit(building)
+        
+        def company_sort_key(company_name):
+            data = self.companies[company_name]
             
-            # Sort companies by building priority for this specific building
-            def company_sort_key(company_name):
-                data = self.companies[company_name]
-                
-                # Priority: companies with prestige > base > charter > blank
-                # Check if company has prestige goods specifically for THIS building
-                has_prestige = False
-                if building in data['building_types']:  # Only base buildings can have prestige
-                    prestige_result = self.company_has_prestige_for_building(company_name, building)
-                    if prestige_result and isinstance(prestige_result, tuple) and prestige_result[0]:
-                        has_prestige = True
-                
-                has_base = building in data['building_types']
-                has_charter = building in data['extension_building_types']
-                
-                priority = 0
-                if has_prestige:
-                    priority = 3  # Prestige goods for this building
-                elif has_base:
-                    priority = 2  # Base building for this company
-                elif has_charter:
-                    priority = 1  # Charter building for this company
-                # else priority = 0 (company doesn't have this building at all)
-                
-                # Get total building counts for tiebreaker (coverage number)
-                base_count, charter_count, _ = self.get_company_building_stats(company_name)
-                
-                # Sort by priority first, then by total coverage (base.charter as decimal)
-                # Within same priority level, sort by coverage: higher coverage first
-                sort_key = (-priority, -base_count, -charter_count, company_name.replace('company_', '').lower())
-                
-                return sort_key
+            # Priority: companies with prestige > base > charter > blank
+            # Check if company has prestige goods specifically for THIS building (only base buildings can have prestige)
+            has_prestige = self.get_prestige_mask(company_name) & building_bit
+            has_base = data.base_mask & building_bit
+            has_charter = data.charter_mask & building_bit
             
-            sorted_company_names = sorted(all_companies_with_building, key=company_sort_key)
+            priority = 0
+            if has_prestige:
+                priority = 3  # Prestige goods for this building
+            elif has_base:
+                priority = 2  # Base building for this company
+            elif has_charter:
+                priority = 1  # Charter building for this company
+            # else priority = 0 (company doesn't have this building at all)
             
-            # Generate rows for this building's table
-            for company_name in sorted_company_names:
-                data = self.companies[company_name]
-                display_name = data.get('display_name', self.get_company_display_name(company_name))
-                
-                # Get prosperity bonuses for inline display  
-                prosperity_bonuses_text = self.format_prosperity_bonuses(data.get('prosperity_bonuses', []))
-                
-                # Abbreviate long company names for display
-                abbreviated_name = self.abbreviate_company_name(display_name, 35)
-                
-                # Get company building statistics and prestige goods
-                base_count, charter_count, prestige_goods = self.get_company_building_stats(company_name)
-                building_count_display = self.format_building_count(base_count, charter_count)
-                prestige_icons = self.get_company_prestige_icons(company_name)
-                
-                # Add special requirement icons (after prestige icons)
-                special_requirement_icons = ''
-                special_reqs = data.get('special_requirements', [])
-                if 'journal_entry' in special_reqs:
-                    special_requirement_icons += '📚 '
-                if 'primary_culture' in special_reqs:
-                    special_requirement_icons += '🛑 '
-                if data.get('starts_enacted', False):
-                    special_requirement_icons += '⚠️ '
-                
-                # Get company logo
-                company_icon_path = self.get_company_icon_path(company_name)
-                company_icon_html = ''
-                if company_icon_path:
-                    company_icon_html = '<img src="{}" class="company-icon" alt="Company Icon">'.format(company_icon_path)
-                else:
-                    company_icon_html = '<div class="company-icon-placeholder"></div>'
-                
-                # Get country flag for separate column with country name tooltip
-                country_flag = ''
-                country_name = ''
-                if data['country']:
-                    country_flag = self.get_country_flag(data['country'])
-                    country_name = self.get_country_name(data['country'])
-                
-                flag_cell_html = ''
-                if country_flag:
-                    flag_cell_html = '<span title="{}">{}</span>'.format(country_name, country_flag)
-                else:
-                    flag_cell_html = ''
+            # Get total building counts for tiebreaker (coverage number)
+            company_row = self.get_company_row(company_name)
+            base_count, charter_count = company_row['base_count'], company_row['charter_count']
+            
+            # Sort by priority first, then by total coverage (base.charter as decimal)
+            # Within same priority level, sort by coverage: higher coverage first
+            sort_key = (-priority, -base_count, -charter_count, company_name.replace('company_', '').lower())
+            
+            return sort_key
+        
+        sorted_company_names = sorted(all_companies_with_building, key=company_sort_key)
+        
+        # Generate rows for this building's table: the fixed cells come from the per-company row cache,
+        # only the building columns depend on this section
+        for company_name in sorted_company_names:
+            data = self.companies[company_name]
+            html += self.get_company_row(company_name)['cells']
+            
+            # Add columns for all available buildings
+            prestige_mask = self.get_prestige_mask(company_name)
+            for avail_building in available_buildings:
+                cell_content = ""
+                cell_class = ""
                 
-                # Get company country for filtering
-                company_country = data.get('country', '')
-
-                # Get company ownership for filtering
-                company_ownership = data.get('ownership_category', 'Full Capitalist')
-
-                html += '''
-            <tr data-country="{}" data-company="{}" data-ownership="{}">
-                <td class="select-column">
-                    <input type="checkbox" class="company-checkbox" data-company="{}" onchange="toggleCompanySelection('{}')">
-                </td>
-                <td class="flag-column">{}</td>
-                <td class="dynamic-coverage-column" data-company="{}">-</td>
-                <td class="buildings-column">{}</td>
-                <td class="company-name"
-                    onmouseover="showCompanyTooltip(event, '{}')"
-                    onmouseout="hideCompanyTooltip()"
-                    data-company="{}">
-                    {}{}{}{}
-                </td>'''.format(company_country, company_name, company_ownership, company_name, company_name, flag_cell_html, company_name, building_count_display, company_name, company_name, company_icon_html, prestige_icons, special_requirement_icons, abbreviated_name)
+                # Check if company has this building and in what capacity
+                avail_bit = self.get_building_bit(avail_building)
+                has_base = data.base_mask & avail_bit
+                has_extension = data.charter_mask & avail_bit
+                has_prestige_result = self.company_has_prestige_for_building(company_name, avail_building) if prestige_mask & avail_bit else False
                 
-                # Add columns for all available buildings
-                for avail_building in available_buildings:
-                    cell_content = ""
-                    cell_class = ""
+                if isinstance(has_prestige_result, tuple):
+                    has_prestige, prestige_good = has_prestige_result
+                else:
+                    has_prestige = has_prestige_result
+                    prestige_good = None
+                
+                if has_prestige and prestige_good:
+                    # Use prestige good icon with proper alt text
+                    prestige_good_base = prestige_good.replace('prestige_good_generic_', '').replace('prestige_good_', '')
                     
-                    # Check if company has this building and in what capacity
-                    has_base = avail_building in data['building_types']
-                    has_extension = avail_building in data['extension_building_types']
-                    has_prestige_result = self.company_has_prestige_for_building(company_name, avail_building)
+                    # Special icon mappings for prestige goods that don't have exact icon matches
+                    icon_mappings = self.registry['prestige_icon_names']
                     
-                    if isinstance(has_prestige_result, tuple):
-                        has_prestige, prestige_good = has_prestige_result
-                    else:
-                        has_prestige = has_prestige_result
-                        prestige_good = None
+                    if prestige_good_base in icon_mappings:
+                        prestige_good_base = icon_mappings[prestige_good_base]
                     
-                    if has_prestige and prestige_good:
-                        # Use prestige good icon with proper alt text
-                        prestige_good_base = prestige_good.replace('prestige_good_generic_', '').replace('prestige_good_', '')
-                        
-                        # Special icon mappings for prestige goods that don't have exact icon matches
-                        icon_mappings = {
-                            'burmese_teak': 'teak',
-                            'swedish_bar_iron': 'oregrounds_iron'
-                        }
-                        
-                        if prestige_good_base in icon_mappings:
-                            prestige_good_base = icon_mappings[prestige_good_base]
-                        
-                        # Try prestige-specific icon first, fallback to goods icon
-                        prestige_icon_candidates = [
-                            "icons/24px-Prestige_{}.png".format(prestige_good_base),
-                            "icons/40px-Goods_{}.png".format(prestige_good_base)
-                        ]
-                        
-                        prestige_icon_path = None
-                        for candidate in prestige_icon_candidates:
-                            full_path = os.path.join(os.path.dirname(__file__), candidate)
-                            if os.path.exists(full_path):
-                                prestige_icon_path = candidate
-                                break
-                        
-                        if not prestige_icon_path:
-                            prestige_icon_path = "icons/40px-Goods_services.png"  # Ultimate fallback
-                        
-                        prestige_name = self.prestige_good_names.get(prestige_good, prestige_good_base.replace('_', ' ').title())
-                        cell_content = '<img src="{}" width="16" height="16" alt="{}" title="{}">'.format(prestige_icon_path, prestige_name, prestige_name)
-                        cell_class = "prestige-building col-{}".format(avail_building)
-                        html += '<td class="{}" data-building="{}">{}</td>'.format(cell_class, avail_building, cell_content)
-                    elif has_base and has_extension:
-                        # Company has both base and charter - show charter selection UI
-                        cell_content = "&#x25CB;"  # Will be updated by JavaScript based on selection
-                        cell_class = "base-building charter-selectable col-{}".format(avail_building)
-                        onclick_attr = 'onclick="selectCharter(\'{}\', \'{}\')" style="cursor: pointer;"'.format(company_name, avail_building)
-                        title_attr = 'title="Industry Charter: Click to select/deselect"'
-                        html += '<td class="{}" {} {} data-building="{}">{}</td>'.format(cell_class, onclick_attr, title_attr, avail_building, cell_content)
-                    elif has_base:
-                        cell_content = "&#x25CF;"
-                        cell_class = "base-building col-{}".format(avail_building)
-                        html += '<td class="{}" data-building="{}">{}</td>'.format(cell_class, avail_building, cell_content)
-                    elif has_extension:
-                        # Extension only - show charter selection UI
-                        cell_content = "&#x25CB;"  # Will be updated by JavaScript based on selection
-                        cell_class = "extension-building charter-selectable"
-                        onclick_attr = 'onclick="selectCharter(\'{}\', \'{}\')" style="cursor: pointer;"'.format(company_name, avail_building)
-                        title_attr = 'title="Industry Charter: Click to select/deselect"'
-                        html += '<td class="{} col-{}" {} {} data-building="{}">{}</td>'.format(cell_class, avail_building, onclick_attr, title_attr, avail_building, cell_content)
-                    else:
-                        # No building relationship
-                        html += '<td class="col-{}" data-building="{}"></td>'.format(avail_building, avail_building)
-                
-                html += '</tr>'
+                    # Try prestige-specific icon first, fallback to goods icon
+                    prestige_icon_candidates = [
+                        "icons/24px-Prestige_{}.png".format(prestige_good_base),
+                        "icons/40px-Goods_{}.png".format(prestige_good_base)
+                    ]
+                    
+                    prestige_icon_path = None
+                    for candidate in prestige_icon_candidates:
+                        full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), candidate)
+                        if os.path.exists(full_path):
+                            prestige_icon_path = candidate
+                            break
+                    
+                    if not prestige_icon_path:
+                        prestige_icon_path = "icons/40px-Goods_services.png"  # Ultimate fallback
+                    
+                    prestige_name = self.prestige_good_names.get(prestige_good, prestige_good_base.replace('_', ' ').title())
+                    cell_content = self.get_icon_sprite_html(prestige_icon_path, 16, prestige_name) or \
+                        '<img src="{}" width="16" height="16" alt="{}" title="{}">'.format(prestige_icon_path, prestige_name, prestige_name)
+                    cell_class = "prestige-building col-{}".format(avail_building)
+                    html += '<td class="{}" data-building="{}">{}</td>'.format(cell_class, avail_building, cell_content)
+                elif has_base and has_extension:
+                    # Company has both base and charter - show charter selection UI
+                    cell_content = "&#x25CB;"  # Will be updated by JavaScript based on selection
+                    cell_class = "base-building charter-selectable col-{}".format(avail_building)
+                    onclick_attr = 'onclick="selectCharter(\'{}\', \'{}\')" style="cursor: pointer;"'.format(company_name, avail_building)
+                    title_attr = 'title="Industry Charter: Click to select/deselect"'
+                    html += '<td class="{}" {} {} data-building="{}">{}</td>'.format(cell_class, onclick_attr, title_attr, avail_building, cell_content)
+                elif has_base:
+                    cell_content = "&#x25CF;"
+                    cell_class = "base-building col-{}".format(avail_building)
+                    html += '<td class="{}" data-building="{}">{}</td>'.format(cell_class, avail_building, cell_content)
+                elif has_extension:
+                    # Extension only - show charter selection UI
+                    cell_content = "&#x25CB;"  # Will be updated by JavaScript based on selection
+                    cell_class = "extension-building charter-selectable"
+                    onclick_attr = 'onclick="selectCharter(\'{}\', \'{}\')" style="cursor: pointer;"'.format(company_name, avail_building)
+                    title_attr = 'title="Industry Charter: Click to select/deselect"'
+                    html += '<td class="{} col-{}" {} {} data-building="{}">{}</td>'.format(cell_class, avail_building, onclick_attr, title_attr, avail_building, cell_content)
+                else:
+                    # No building relationship
+                    html += '<td class="col-{}" data-building="{}"></td>'.format(avail_building, avail_building)
             
-            html += '''
+            html += '</tr>'
+        
+        html += '''
             </tbody>
         </table>
         </div>
     </div>'''
         
-        html += '''
+        return html
+
+    def _render_shared_script(self, wiki_building_order):
+        """Render the page scripts and closing tags shared by every section"""
+        page_strings, company_records, tooltip_records = self._get_page_data_js()
+        html = '''
     
     <script>
 __YALPS_BUNDLE_PLACEHOLDER__
@@ -4139,62 +4510,107 @@ __YALPS_BUNDLE_PLACEHOLDER__
         // YALPS is loaded from the bundled library above - NO OTHER IMPLEMENTATIONS
         
         // All fake solvers have been removed - ONLY USE window.YALPS.solve()
-        // Company data for tooltips
-        const companyData = {'''
+        // Company data for tooltips. Strings shared by companyData and tooltipData are stored once in
+        // pageStrings; the declared string fields of each record hold their indices and are decoded on first access
+        const pageStrings = ''' + page_strings + ''';
+        const companyDataFields = ''' + json.dumps(list(self.COMPANY_DATA_FIELDS)) + ''';
+        const companyDataStringFields = new Set(''' + json.dumps(list(self.COMPANY_DATA_STRING_FIELDS)) + ''');
+        const tooltipStringFields = new Set(''' + json.dumps(list(self.TOOLTIP_STRING_FIELDS)) + ''');
+        const companyDataRecords = ''' + company_records + ''';
+        
+        function decodePageStrings(value) {
+            // Only called on string fields, where every number is a pageStrings index
+            if (typeof value === 'number') return pageStrings[value];
+            if (Array.isArray(value)) return value.map(decodePageStrings);
+            if (value && typeof value === 'object') {
+                const decoded = {};
+                for (const key in value) decoded[key] = decodePageStrings(value[key]);
+                return decoded;
+            }
+            return value;
+        }
+        
+        function defineLazyRecords(encodedRecords, decode) {
+            // Each record is decoded by its first read and then stored as a plain property
+            const records = {};
+            Object.keys(encodedRecords).forEach(function(key) {
+                Object.defineProperty(records, key, {
+                    enumerable: true,
+                    configurable: true,
+                    get: function() {
+                        const value = decode(encodedRecords[key]);
+                        Object.defineProperty(records, key, {value: value, enumerable: true, writable: true, configurable: true});
+                        return value;
+                    }
+                });
+            });
+            return records;
+        }
         
-        # Add company data for tooltips
-        company_entries = []
-        for company_name, data in self.companies.items():
-            display_name = data.get('display_name', self.get_company_display_name(company_name))
-            requirements_json = json.dumps(data['formation_requirements'])
-            bonuses_json = json.dumps(data['prosperity_bonuses'])
-            
-            # Get formatted prosperity bonuses for inline display
-            prosperity_bonuses_text = self.format_prosperity_bonuses(data.get('prosperity_bonuses', []))
-            prosperity_bonuses_text_json = json.dumps(prosperity_bonuses_text)
-            
-            country_info = ""  # Remove confidence display - country is definitive from game files
-            
-            # Add building information for detailed tooltip
-            prestige_goods_json = json.dumps(data.get('possible_prestige_goods', []))
-            building_types_json = json.dumps(data.get('building_types', []))
-            extension_building_types_json = json.dumps(data.get('extension_building_types', []))
-            
-            # Add special requirements and starts enacted for JavaScript access
-            special_requirements_json = json.dumps(data.get('special_requirements', []))
-            starts_enacted_json = json.dumps(data.get('starts_enacted', False))
-            starting_country_json = json.dumps(data.get('starting_country', None))
-            ownership_category = data.get('ownership_category', 'Full Capitalist')
-
-            entry = '''            {}: {{
-                "name": {},
-                "country": {},
-                "country_confidence": {},
-                "country_info": {},
-                "requirements": {},
-                "bonuses": {},
-                "prosperity_bonuses_text": {},
-                "prestige_goods": {},
-                "building_types": {},
-                "extension_building_types": {},
-                "base_buildings": {},
-                "industry_charters": {},
-                "special_requirements": {},
-                "starts_enacted": {},
-                "starting_country": {},
-                "ownership_category": {}
-            }}'''.format(json.dumps(company_name), json.dumps(display_name), json.dumps(data["country"] or ""), json.dumps(data["country_confidence"]), json.dumps(country_info), requirements_json, bonuses_json, prosperity_bonuses_text_json, prestige_goods_json, building_types_json, extension_building_types_json, building_types_json, extension_building_types_json, special_requirements_json, starts_enacted_json, starting_country_json, json.dumps(ownership_category))
-            company_entries.append(entry)
-        
-        html += ',\n'.join(company_entries)
-        html += '''
-        };
+        function decodeCompanyRecord(encoded) {
+            const company = {};
+            companyDataFields.forEach(function(field, index) {
+                company[field] = companyDataStringFields.has(field) ? decodePageStrings(encoded[index]) : encoded[index];
+            });
+            return company;
+        }
+        
+        function decodeTooltipRecord(encoded) {
+            const record = {};
+            for (const key in encoded) {
+                record[key] = tooltipStringFields.has(key) ? decodePageStrings(encoded[key]) : encoded[key];
+            }
+            return record;
+        }
+        
+        const companyData = defineLazyRecords(companyDataRecords, decodeCompanyRecord);
+        
+        // Building lists only, for the coverage and solver code
+        let companyBuildingData = null;
+        function getCompanyBuildingData() {
+            if (!companyBuildingData) {
+                const baseIndex = companyDataFields.indexOf('building_types');
+                const charterIndex = companyDataFields.indexOf('extension_building_types');
+                companyBuildingData = {};
+                Object.keys(companyDataRecords).forEach(function(companyName) {
+                    const encoded = companyDataRecords[companyName];
+                    companyBuildingData[companyName] = {
+                        building_types: decodePageStrings(encoded[baseIndex]),
+                        extension_building_types: decodePageStrings(encoded[charterIndex])
+                    };
+                });
+            }
+            return companyBuildingData;
+        }
         
         // Global country mappings for flags and names
         const countryFlags = ''' + self._get_country_flags_js() + ''';
         const countryNames = ''' + self._get_country_names_js() + ''';
         
-        function getCompanyIconPath(companyName) {
+        // Sizes with resized icon variants in companies/png_<size>/ (see build_icon_variants). Variants are
+        // only written when they downscale, so iconVariants holds, per icon, a bitmask over iconVariantSizes
+        const iconVariantSizes = ''' + json.dumps(self.get_icon_variant_sizes()) + ''';
+        const iconVariants = ''' + self._get_icon_variants_js() + ''';
+        
+        function getIconVariantPath(iconPath, size) {
+            if (!size) return iconPath;
+            const original = iconPath.replace(/^companies\\/png(_\\d+)?\\//, 'companies/png/');
+            const bit = iconVariantSizes.indexOf(size);
+            const variants = iconVariants[original.slice('companies/png/'.length)] || 0;
+            if (bit < 0 || !(variants & (1 << bit))) return original;
+            return original.replace(/^companies\\/png\\//, `companies/png_${size}/`);
+        }
+        
+        function getCompanyIconPath(companyName, size) {
+            // Prefer the icon resolved by the generator
+            const record = tooltipData[companyName];
+            if (record && record.i) {
+                return getIconVariantPath(record.i, size);
+            }
+            return getIconVariantPath(guessCompanyIconPath(companyName), size);
+        }
+        
+        function guessCompanyIconPath(companyName) {
             // Remove company_ prefix for icon lookup
             const cleanName = companyName.replace('company_', '');
             
@@ -4210,16 +4626,23 @@ __YALPS_BUNDLE_PLACEHOLDER__
             
             // Check if we have a specific mapping for historical companies
             if (historicalMappings[cleanName]) {
-                return `companies/png/historical_company_icons/${historicalMappings[cleanName]}.png`;
+                return resolveAssetPath(`companies/png/historical_company_icons/${historicalMappings[cleanName]}.png`);
             }
             
             // Basic companies are in the root png folder
             if (cleanName.startsWith('basic_')) {
-                return `companies/png/${cleanName}.png`;
+                return resolveAssetPath(`companies/png/${cleanName}.png`);
             } 
             
             // Default historical company path
-            return `companies/png/historical_company_icons/${cleanName}.png`;
+            return resolveAssetPath(`companies/png/historical_company_icons/${cleanName}.png`);
+        }
+        
+        // Duplicate images removed at build time, mapped to the copy that was kept
+        const assetAliases = ''' + json.dumps(self.get_asset_aliases(), sort_keys=True, ensure_ascii=False) + ''';
+        
+        function resolveAssetPath(path) {
+            return assetAliases[path] || path;
         }
         
         // Table sorting functionality
@@ -4274,81 +4697,154 @@ __YALPS_BUNDLE_PLACEHOLDER__
             });
         }
         
-        // Country display helper function
-        function getCountryDisplayInfo(countryCode) {
-            const countryMap = {
-                'AUS': { flag: '🇦🇹', name: 'Austria-Hungary' },
-                'BEL': { flag: '🇧🇪', name: 'Belgium' },
-                'LUX': { flag: '🇱🇺', name: 'Luxembourg' },
-                'CHI': { flag: '🇨🇳', name: 'China' },
-                'USA': { flag: '🇺🇸', name: 'United States' },
-                'GBR': { flag: '🇬🇧', name: 'Great Britain' },
-                'FRA': { flag: '🇫🇷', name: 'France' },
-                'DEU': { flag: '🇩🇪', name: 'Germany' },
-                'PRU': { flag: '🇩🇪', name: 'Prussia' },
-                'RUS': { flag: '🇷🇺', name: 'Russia' },
-                'JAP': { flag: '🇯🇵', name: 'Japan' },
-                'KOR': { flag: '🇰🇷', name: 'Korea' },
-                'SWE': { flag: '🇸🇪', name: 'Sweden' },
-                'NET': { flag: '🇳🇱', name: 'Netherlands' },
-                'SPA': { flag: '🇪🇸', name: 'Spain' },
-                'TUR': { flag: '🇹🇷', name: 'Ottoman Empire' },
-                'BRZ': { flag: '🇧🇷', name: 'Brazil' },
-                'MEX': { flag: '🇲🇽', name: 'Mexico' },
-                'ARG': { flag: '🇦🇷', name: 'Argentina' },
-                'CHL': { flag: '🇨🇱', name: 'Chile' },
-                'SAR': { flag: '🇮🇹', name: 'Sardinia-Piedmont' },
-                'EGY': { flag: '🇪🇬', name: 'Egypt' },
-                'PER': { flag: '🇮🇷', name: 'Persia' },
-                'ETH': { flag: '🇪🇹', name: 'Ethiopia' },
-                'SAF': { flag: '🇿🇦', name: 'South Africa' },
-                'HBC': { flag: '🇨🇦', name: 'Hudson\\'s Bay Company' },
-                'GRE': { flag: '🇬🇷', name: 'Greece' },
-                'NOR': { flag: '🇳🇴', name: 'Norway' },
-                'DEN': { flag: '🇩🇰', name: 'Denmark' },
-                'FIN': { flag: '🇫🇮', name: 'Finland' },
-                'POR': { flag: '🇵🇹', name: 'Portugal' },
-                'BOL': { flag: '🇧🇴', name: 'Bolivia' },
-                'VNZ': { flag: '🇻🇪', name: 'Venezuela' },
-                'COL': { flag: '🇨🇴', name: 'Colombia' },
-                'SER': { flag: '🇷🇸', name: 'Serbia' },
-                'ROM': { flag: '🇷🇴', name: 'Romania' },
-                'WAL': { flag: '🏴󠁧󠁢󠁷󠁬󠁳󠁿', name: 'Wallachia' },
-                'BAD': { flag: '🇩🇪', name: 'Baden' },
-                'SAX': { flag: '🇩🇪', name: 'Saxony' },
-                'LAN': { flag: '🇨🇳', name: 'Lanfang Republic' },
-                'SIC': { flag: '🇮🇹', name: 'Two Sicilies' },
-                'BIC': { flag: '🇮🇳', name: 'British India' },
-                'IND': { flag: '🇮🇳', name: 'India' },
-                'DAI': { flag: '🇻🇳', name: 'Dai Nam' },
-                'PHI': { flag: '🇵🇭', name: 'Philippines' },
-                'NSW': { flag: '🇦🇺', name: 'New South Wales' },
-                'SIA': { flag: '🇹🇭', name: 'Siam' },
-                'BUR': { flag: '🇲🇲', name: 'Burma' },
-                'PRG': { flag: '🇵🇾', name: 'Paraguay' },
-                'NPU': { flag: '🇵🇪', name: 'North Peru' },
-                'PNI': { flag: '🇮🇹', name: 'Papal States' },
-                'CLM': { flag: '🇨🇴', name: 'Gran Colombia' },
-                'KUN': { flag: '🇦🇫', name: 'Kunduz' },
-                'KOK': { flag: '🇺🇿', name: 'Kokand' },
-                'OZH': { flag: '🇰🇿', name: 'Kazakh Khanate' },
-                'ARB': { flag: '🇸🇦', name: 'Arabia' },
-                'CON': { flag: '🇫🇷', name: 'French Congo' },
-                'CAN': { flag: '🇨🇦', name: 'Canada' },
-                'SOK': { flag: '🇳🇬', name: 'Sokoto Caliphate' },
-                'AFG': { flag: '🇦🇫', name: 'Afghanistan' },
-                'AST': { flag: '🇦🇺', name: 'Australia' },
-                'ITA': { flag: '🇮🇹', name: 'Italy' },
-                'PEU': { flag: '🇵🇪', name: 'Peru' },
-                'POL': { flag: '🇵🇱', name: 'Poland' }
+        // Tooltip records are precompiled by the generator; the tooltip DOM is built once and refilled
+        const tooltipDataRecords = ''' + tooltip_records + ''';
+        const tooltipData = defineLazyRecords(tooltipDataRecords, decodeTooltipRecord);
+        let tooltipTimeout;
+        let tooltipParts = null;
+        let tooltipCompany = null;
+        const preloadedIcons = new Set();
+        
+        function preloadCompanyIcon(companyName) {
+            const record = tooltipData[companyName];
+            if (!record || !record.i || preloadedIcons.has(record.i)) return;
+            preloadedIcons.add(record.i);
+            
+            // Fetch and decode off the interaction path so showing the tooltip never waits on it
+            const image = new Image();
+            image.decoding = 'async';
+            image.src = record.i;
+            if (image.decode) {
+                image.decode().catch(() => {});
+            }
+        }
+        
+        // Hover intent: start loading a company's icon as soon as the pointer enters its row
+        document.addEventListener('mouseover', event => {
+            const companyElement = event.target.closest && event.target.closest('[data-company]');
+            if (companyElement) {
+                preloadCompanyIcon(companyElement.dataset.company);
+            }
+        }, { passive: true });
+        
+        function createTooltipSection(tooltip, className, title) {
+            const section = document.createElement('div');
+            section.className = className;
+            const heading = document.createElement('h4');
+            heading.textContent = title;
+            const list = document.createElement('ul');
+            section.append(heading, list);
+            tooltip.appendChild(section);
+            return { section: section, list: list };
+        }
+        
+        function createTooltipLine(details) {
+            // A "<br><small>...</small>" line that can be hidden as a whole
+            const line = document.createElement('span');
+            const text = document.createElement('small');
+            line.append(document.createElement('br'), text);
+            details.appendChild(line);
+            return { line: line, text: text };
+        }
+        
+        function getTooltipParts(tooltip) {
+            if (tooltipParts) return tooltipParts;
+            
+            tooltip.textContent = '';
+            const header = document.createElement('h3');
+            const icon = document.createElement('img');
+            icon.className = 'company-icon';
+            icon.decoding = 'async';
+            icon.onload = icon.onerror = () => { icon.style.visibility = ''; };
+            const details = document.createElement('div');
+            details.className = 'company-details';
+            const name = document.createElement('span');
+            details.appendChild(name);
+            header.append(icon, details);
+            tooltip.appendChild(header);
+            
+            tooltipParts = {
+                icon: icon,
+                name: name,
+                country: createTooltipLine(details),
+                ownership: createTooltipLine(details),
+                requirements: createTooltipSection(tooltip, 'requirements', 'Formation Requirements'),
+                bonuses: createTooltipSection(tooltip, 'bonuses', 'Prosperity Bonuses'),
+                special: createTooltipSection(tooltip, 'special-requirements', 'Special Requirements'),
+                enacted: createTooltipSection(tooltip, 'pre-enacted', 'Status'),
+                prestige: createTooltipSection(tooltip, 'prestige-goods', 'Prestige Goods'),
+                base: createTooltipSection(tooltip, 'base-buildings', 'Base Buildings'),
+                charters: createTooltipSection(tooltip, 'industry-charters', 'Possible Industry Charters')
             };
-            return countryMap[countryCode] || { flag: '🏳️', name: countryCode };
+            
+            const enactedItem = document.createElement('li');
+            enactedItem.textContent = '⚠️ Established at Game Start';
+            tooltipParts.enacted.list.appendChild(enactedItem);
+            return tooltipParts;
+        }
+        
+        function createTooltipTextItem(text) {
+            const item = document.createElement('li');
+            item.textContent = text;
+            return item;
+        }
+        
+        function createTooltipIconItem([iconPath, label]) {
+            const item = document.createElement('li');
+            if (iconSprites[iconPath]) {
+                const icon = document.createElement('span');
+                icon.className = `sprite-icon ${iconSprites[iconPath]}`;
+                icon.style.cssText = '--icon-size: 16px; margin-right: 6px;';
+                item.appendChild(icon);
+            } else if (iconPath) {
+                const icon = document.createElement('img');
+                icon.src = iconPath;
+                icon.width = 16;
+                icon.height = 16;
+                icon.decoding = 'async';
+                icon.style.cssText = 'margin-right: 6px; vertical-align: middle;';
+                item.appendChild(icon);
+            }
+            item.appendChild(document.createTextNode(label));
+            return item;
+        }
+        
+        function fillTooltipSection(part, items, createItem) {
+            part.section.style.display = items.length > 0 ? '' : 'none';
+            part.list.replaceChildren(...items.map(createItem));
+        }
+        
+        function renderCompanyTooltip(parts, data, record) {
+            if (record.i) {
+                if (parts.icon.getAttribute('src') !== record.i) {
+                    // Keep the previous company's icon from showing while the new one loads
+                    parts.icon.style.visibility = 'hidden';
+                    parts.icon.src = record.i;
+                    if (parts.icon.complete) {
+                        parts.icon.style.visibility = '';
+                    }
+                }
+                parts.icon.style.display = '';
+            } else {
+                parts.icon.style.display = 'none';
+            }
+            
+            parts.name.textContent = (record.h || '') + data.name;
+            parts.country.line.style.display = record.c ? '' : 'none';
+            parts.country.text.textContent = record.c ? `Country: ${record.c}` : '';
+            parts.ownership.line.style.display = data.ownership_category ? '' : 'none';
+            parts.ownership.text.textContent = data.ownership_category ? `Ownership: ${data.ownership_category}` : '';
+            
+            const requirementIcons = record.r || [];
+            fillTooltipSection(parts.requirements, data.requirements || [], (req, index) => createTooltipTextItem((requirementIcons[index] || '') + req));
+            fillTooltipSection(parts.bonuses, data.bonuses || [], createTooltipTextItem);
+            fillTooltipSection(parts.special, record.s || [], ([icon, name]) => createTooltipTextItem(`${icon} ${name}`));
+            parts.enacted.section.style.display = data.starts_enacted ? '' : 'none';
+            fillTooltipSection(parts.prestige, record.p || [], createTooltipIconItem);
+            fillTooltipSection(parts.base, record.b || [], createTooltipIconItem);
+            fillTooltipSection(parts.charters, record.x || [], createTooltipIconItem);
         }
         
-        // Tooltip performance optimization - cache and debouncing
-        let tooltipCache = {};
-        let tooltipTimeout;
-        
         // Tooltip functions - must be global for inline event handlers
         function showCompanyTooltip(event, companyName) {
             // Clear any pending hide timeout
@@ -4374,202 +4870,12 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 return;
             }
             
-            // Use cached content if available
-            let html = tooltipCache[companyName];
-            if (!html) {
-                // Generate tooltip content once and cache it
-                const iconPath = getCompanyIconPath(companyName);
-                const iconElement = iconPath ? 
-                    `<img src="${iconPath}" class="company-icon">` : 
-                    '<span class="company-icon-placeholder"></span>';
-                
-                // Get country flag and full name (only for non-basic companies with countries)
-                let countryDisplay = '';
-                if (data.country && data.country !== '') {
-                    const countryInfo = getCountryDisplayInfo(data.country);
-                    if (countryInfo && countryInfo.name !== data.country) { // Only show if we have a proper country name
-                        countryDisplay = `<br><small>Country: ${countryInfo.flag} ${countryInfo.name}</small>`;
-                    }
-                }
-
-                // Add ownership category display
-                let ownershipDisplay = '';
-                if (data.ownership_category) {
-                    ownershipDisplay = `<br><small>Ownership: ${data.ownership_category}</small>`;
-                }
-
-                // Generate special requirement icons for header
-                let specialIcons = '';
-                if (data.special_requirements && data.special_requirements.length > 0) {
-                    data.special_requirements.forEach(req => {
-                        if (req === 'journal_entry') specialIcons += '📚 ';
-                        else if (req === 'primary_culture') specialIcons += '🛑 ';
-                        else if (req === 'law' || req === 'ideology' || req === 'diplomatic') specialIcons += '🔒 ';
-                    });
-                }
-                
-                // Add pre-enacted icon
-                if (data.starts_enacted) {
-                    specialIcons += '⚠️ ';
-                }
-                
-                html = `
-                    <h3>
-                        ${iconElement}
-                        <div class="company-details">
-                            ${specialIcons}${data.name}
-                            ${countryDisplay}
-                            ${ownershipDisplay}
-                        </div>
-                    </h3>
-                `;
-                
-                if (data.requirements && data.requirements.length > 0) {
-                    html += '<div class="requirements"><h4>Formation Requirements</h4><ul>';
-                    data.requirements.forEach(req => {
-                        let icon = '';
-                        // Add icons for specific requirement types
-                        if (req.includes('Primary culture:')) {
-                            icon = '🛑 ';
-                        } else if (req.includes('Technology:')) {
-                            icon = '💡 ';
-                        } else if (req.includes('journal entry') || req.includes('Journal Entry')) {
-                            icon = '📚 ';
-                        } else if (req.includes('Starts Enacted') || req.includes('game start')) {
-                            icon = '⚠️ ';
-                        }
-                        html += `<li>${icon}${req}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                if (data.bonuses && data.bonuses.length > 0) {
-                    html += '<div class="bonuses"><h4>Prosperity Bonuses</h4><ul>';
-                    data.bonuses.forEach(bonus => {
-                        html += `<li>${bonus}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                // Add special requirements section
-                if (data.special_requirements && data.special_requirements.length > 0) {
-                    const reqIcons = {
-                        'journal_entry': '📚',
-                        'primary_culture': '🛑',
-                        'technology': '💡',
-                        'law': '🔒',
-                        'ideology': '🔒',
-                        'diplomatic': '🔒'
-                    };
-                    
-                    const reqNames = {
-                        'journal_entry': 'Journal Entry Required',
-                        'primary_culture': 'Primary Culture Required',
-                        'technology': 'Technology Required',
-                        'law': 'Law Required',
-                        'ideology': 'Ideology Required',
-                        'diplomatic': 'Diplomatic Status Required',
-                        'regional': 'Regional Interest Required'
-                    };
-                    
-                    html += '<div class="special-requirements"><h4>Special Requirements</h4><ul>';
-                    data.special_requirements.forEach(req => {
-                        const icon = reqIcons[req] || '';
-                        const name = reqNames[req] || req;
-                        html += `<li>${icon} ${name}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                // Add pre-enacted status
-                if (data.starts_enacted) {
-                    html += '<div class="pre-enacted"><h4>Status</h4><ul>';
-                    html += '<li>⚠️ Established at Game Start</li>';
-                    html += '</ul></div>';
-                }
-                
-                // Add prestige goods section with icons
-                if (data.prestige_goods && data.prestige_goods.length > 0) {
-                    html += '<div class="prestige-goods"><h4>Prestige Goods</h4><ul>';
-                    data.prestige_goods.forEach(good => {
-                        // Get prestige good icon
-                        const prestigeGoodBase = good.replace('prestige_good_generic_', '').replace('prestige_good_', '');
-                        
-                        // Icon mappings for prestige goods that don't have exact matches
-                        const iconMappings = {
-                            'burmese_teak': 'teak',
-                            'swedish_bar_iron': 'oregrounds_iron'
-                        };
-                        
-                        const mappedBase = iconMappings[prestigeGoodBase] || prestigeGoodBase;
-                        const prestigeIcon = `icons/24px-Prestige_${mappedBase}.png`;
-                        const fallbackIcon = `icons/40px-Goods_${mappedBase}.png`;
-                        
-                        const goodDisplayName = good.replace('prestige_good_generic_', '').replace('prestige_good_', '').replace(/_/g, ' ').replace(/\\b\\w/g, l => l.toUpperCase());
-                        
-                        html += `<li><img src="${prestigeIcon}" width="16" height="16" style="margin-right: 6px; vertical-align: middle;" 
-                                 onerror="this.src='${fallbackIcon}'; this.onerror=null;">${goodDisplayName}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                // Add base buildings section with icons
-                if (data.base_buildings && data.base_buildings.length > 0) {
-                    html += '<div class="base-buildings"><h4>Base Buildings</h4><ul>';
-                    data.base_buildings.forEach(building => {
-                        const buildingName = getBuildingDisplayName(building);
-                        
-                        // Building name mappings for icon files that have different names
-                        const buildingMappings = {
-                            'building_chemical_plants': 'chemicals_industry',
-                            'building_textile_mills': 'textile_industry', 
-                            'building_artillery_foundries': 'artillery_foundry',
-                            'building_automotive_industry': 'vehicles_industry',
-                            'building_livestock_ranch': 'cattle_ranch',
-                            'building_rubber_plantation': 'rubber_lodge',
-                            'building_vineyard_plantation': 'vineyards'
-                        };
-                        
-                        const mappedBuilding = buildingMappings[building] || building.replace('building_', '');
-                        const buildingIcon = `buildings/64px-Building_${mappedBuilding}.png`;
-                        
-                        html += `<li><img src="${buildingIcon}" width="16" height="16" style="margin-right: 6px; vertical-align: middle;" 
-                                 onerror="this.style.display='none';">${buildingName}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                // Add possible industry charters section with icons
-                if (data.industry_charters && data.industry_charters.length > 0) {
-                    html += '<div class="industry-charters"><h4>Possible Industry Charters</h4><ul>';
-                    data.industry_charters.forEach(charter => {
-                        const charterName = getBuildingDisplayName(charter);
-                        
-                        // Building name mappings for icon files that have different names
-                        const buildingMappings = {
-                            'building_chemical_plants': 'chemicals_industry',
-                            'building_textile_mills': 'textile_industry', 
-                            'building_artillery_foundries': 'artillery_foundry',
-                            'building_automotive_industry': 'vehicles_industry',
-                            'building_livestock_ranch': 'cattle_ranch',
-                            'building_rubber_plantation': 'rubber_lodge',
-                            'building_vineyard_plantation': 'vineyards'
-                        };
-                        
-                        const mappedCharter = buildingMappings[charter] || charter.replace('building_', '');
-                        const charterIcon = `buildings/64px-Building_${mappedCharter}.png`;
-                        
-                        html += `<li><img src="${charterIcon}" width="16" height="16" style="margin-right: 6px; vertical-align: middle;" 
-                                 onerror="this.style.display='none';">${charterName}</li>`;
-                    });
-                    html += '</ul></div>';
-                }
-                
-                // Cache the generated content
-                tooltipCache[companyName] = html;
+            // Only refill the tooltip when it switches to another company
+            if (tooltipCompany !== companyName) {
+                renderCompanyTooltip(getTooltipParts(tooltip), data, tooltipData[companyName] || {});
+                tooltipCompany = companyName;
             }
             
-            tooltip.innerHTML = html;
             tooltip.style.display = 'block';
             
             // Smart tooltip positioning to stay within viewport bounds
@@ -4625,47 +4931,359 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     top = viewportTop + 10;
                 }
             }
-            
-            tooltip.style.left = left + 'px';
-            tooltip.style.top = top + 'px';
+            
+            tooltip.style.left = left + 'px';
+            tooltip.style.top = top + 'px';
+        }
+        
+        function hideCompanyTooltip() {
+            // Add a small delay to prevent flickering when quickly moving between elements
+            tooltipTimeout = setTimeout(() => {
+                const tooltip = document.getElementById('companyTooltip');
+                if (tooltip) {
+                    tooltip.style.display = 'none';
+                }
+            }, 100);
+        }
+        
+        // Search index built by the generator: documents, sorted words, postings and trigrams
+        const searchIndex = ''' + self._get_search_index_js() + ''';
+        const SEARCH_RESULT_LIMIT = 12;
+        let searchResults = [];
+        let activeSearchResult = 0;
+        let searchJump = { key: null, position: 0 };
+        let searchHighlightTimeout;
+        
+        function normalizeSearchQuery(text) {
+            // Same folding as the generator: lowercase, accents stripped, split on non-alphanumerics
+            return text.toLowerCase().normalize('NFD').replace(/\\p{M}/gu, '').match(/[\\p{L}\\p{N}]+/gu) || [];
+        }
+        
+        function findSearchWords(term) {
+            // Map of word index -> match quality (3 exact, 2 prefix, 1 infix)
+            const words = searchIndex.w;
+            const matches = new Map();
+            
+            // Prefix matches form a contiguous range of the sorted word list
+            let low = 0;
+            let high = words.length;
+            while (low < high) {
+                const mid = (low + high) >> 1;
+                if (words[mid] < term) {
+                    low = mid + 1;
+                } else {
+                    high = mid;
+                }
+            }
+            for (let i = low; i < words.length && words[i].startsWith(term); i++) {
+                matches.set(i, words[i] === term ? 3 : 2);
+            }
+            
+            // Infix matches: check the words of the rarest trigram
+            if (term.length >= 3) {
+                let candidates = null;
+                for (let i = 0; i + 3 <= term.length; i++) {
+                    const wordIndexes = searchIndex.t[term.slice(i, i + 3)];
+                    if (!wordIndexes) {
+                        candidates = [];
+                        break;
+                    }
+                    if (candidates === null || wordIndexes.length < candidates.length) {
+                        candidates = wordIndexes;
+                    }
+                }
+                candidates.forEach(wordIndex => {
+                    if (!matches.has(wordIndex) && words[wordIndex].includes(term)) {
+                        matches.set(wordIndex, 1);
+                    }
+                });
+            }
+            return matches;
+        }
+        
+        function searchCompanies(query) {
+            const terms = normalizeSearchQuery(query);
+            if (terms.length === 0) return [];
+            
+            let scores = null;
+            for (const term of terms) {
+                const termScores = new Map();
+                findSearchWords(term).forEach((quality, wordIndex) => {
+                    searchIndex.p[wordIndex].forEach(posting => {
+                        // Matches in a name or key rank above matches in other fields
+                        const doc = posting >> 1;
+                        const score = quality + (posting & 1) * 3;
+                        if (!(termScores.get(doc) >= score)) {
+                            termScores.set(doc, score);
+                        }
+                    });
+                });
+                
+                if (scores === null) {
+                    scores = termScores;
+                } else {
+                    // Every term has to match
+                    const combined = new Map();
+                    scores.forEach((score, doc) => {
+                        if (termScores.has(doc)) {
+                            combined.set(doc, score + termScores.get(doc));
+                        }
+                    });
+                    scores = combined;
+                }
+                if (scores.size === 0) break;
+            }
+            
+            return [...scores.entries()]
+                .sort((a, b) => b[1] - a[1] || searchIndex.d[a[0]][2].localeCompare(searchIndex.d[b[0]][2]))
+                .slice(0, SEARCH_RESULT_LIMIT)
+                .map(([doc]) => searchIndex.d[doc]);
+        }
+        
+        function updateSearchResults() {
+            const input = document.getElementById('company-search');
+            const container = document.getElementById('search-results');
+            searchResults = searchCompanies(input.value);
+            activeSearchResult = 0;
+            
+            container.replaceChildren(...searchResults.map(([type, key, label], index) => {
+                const item = document.createElement('div');
+                item.className = 'search-result' + (index === 0 ? ' active' : '');
+                const name = document.createElement('span');
+                name.textContent = label;
+                const kind = document.createElement('span');
+                kind.className = 'search-result-type';
+                const country = type === 'c' && companyData[key] ? companyData[key].country : '';
+                kind.textContent = type === 'b' ? 'Building' : (country ? `${countryFlags[country] || ''} ${countryNames[country] || country}` : 'Company');
+                item.append(name, kind);
+                // mousedown keeps focus in the search box so the results stay open
+                item.onmousedown = event => {
+                    event.preventDefault();
+                    jumpToSearchResult(index);
+                };
+                return item;
+            }));
+            container.style.display = searchResults.length > 0 ? 'block' : 'none';
+        }
+        
+        function hideSearchResults() {
+            document.getElementById('search-results').style.display = 'none';
+        }
+        
+        function handleSearchKey(event) {
+            if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+                if (searchResults.length === 0) return;
+                event.preventDefault();
+                const step = event.key === 'ArrowDown' ? 1 : -1;
+                activeSearchResult = (activeSearchResult + step + searchResults.length) % searchResults.length;
+                document.querySelectorAll('#search-results .search-result').forEach((item, index) => {
+                    item.classList.toggle('active', index === activeSearchResult);
+                    if (index === activeSearchResult) {
+                        item.scrollIntoView({ block: 'nearest' });
+                    }
+                });
+            } else if (event.key === 'Enter') {
+                event.preventDefault();
+                jumpToSearchResult(activeSearchResult);
+            } else if (event.key === 'Escape') {
+                hideSearchResults();
+            }
+        }
+        
+        function jumpToSearchResult(index) {
+            const result = searchResults[index];
+            if (!result) return;
+            const [type, key, label] = result;
+            
+            if (type === 'b') {
+                const buildingSection = document.getElementById(`building-${key}`);
+                if (buildingSection) {
+                    buildingSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                }
+                return;
+            }
+            
+            const rows = Array.from(document.querySelectorAll(`.building-section tr[data-company="${key}"]`)).filter(row => row.offsetParent !== null);
+            if (rows.length === 0) {
+                alert(`${label} is hidden by the current building or company filters`);
+                return;
+            }
+            
+            // Jumping to the same company again cycles through its rows
+            searchJump.position = searchJump.key === key ? (searchJump.position + 1) % rows.length : 0;
+            searchJump.key = key;
+            
+            document.querySelectorAll('tr.search-highlight').forEach(row => row.classList.remove('search-highlight'));
+            rows.forEach(row => row.classList.add('search-highlight'));
+            clearTimeout(searchHighlightTimeout);
+            searchHighlightTimeout = setTimeout(() => {
+                rows.forEach(row => row.classList.remove('search-highlight'));
+            }, 3000);
+            
+            rows[searchJump.position].scrollIntoView({ behavior: 'smooth', block: 'center' });
+        }
+        
+        // Custom Company Collection functionality
+        // Selection state lives in memory; localStorage is only written back on idle.
+        // Stored form: {v, t, c: [company IDs], ch: [[company ID, building ID]], k: [company keys]}
+        // IDs are only trusted while the ID table fingerprint (t) matches; after a patch
+        // renumbers companies the keys (k) are used to migrate the selection.
+        const STORAGE_KEY = 'v3-selection';
+        const STORAGE_SCHEMA_VERSION = 1;
+        const LEGACY_STORAGE_KEY = 'v3-custom-companies';
+        const LEGACY_CHARTER_STORAGE_KEY = 'v3-selected-charters';
+        const STORAGE_WRITE_DELAY = 300;
+        let selectionState = null;
+        let pendingStorageWrite = null;
+        let pendingStorageWriteIsIdle = false;
+        
+        function readStoredSelection() {
+            const state = { companies: [], charters: {} };
+            try {
+                const stored = localStorage.getItem(STORAGE_KEY);
+                if (stored) {
+                    const record = JSON.parse(stored);
+                    if (record.v !== STORAGE_SCHEMA_VERSION) {
+                        console.warn(`Ignoring stored selection with schema version ${record.v}`);
+                        return state;
+                    }
+                    const idsValid = record.t === getShareTableFingerprint();
+                    const keys = record.k || [];
+                    (record.c || []).forEach((companyId, index) => {
+                        const companyKey = idsValid ? idToCompany[companyId] : keys[index];
+                        if (companyKey && companyData[companyKey]) {
+                            state.companies.push(companyKey);
+                        }
+                    });
+                    (record.ch || []).forEach(([companyId, buildingId]) => {
+                        const companyKey = idsValid ? idToCompany[companyId] : keys[record.c.indexOf(companyId)];
+                        const buildingKey = idsValid ? idToBuilding[buildingId] : record.b && record.b[buildingId];
+                        if (companyKey && buildingKey && state.companies.includes(companyKey)) {
+                            state.charters[companyKey] = buildingKey;
+                        }
+                    });
+                    if (!idsValid) {
+                        // Re-store under the current ID table
+                        scheduleStorageWrite();
+                    }
+                    return state;
+                }
+                
+                // Migrate the old key-based storage once
+                const legacyCompanies = JSON.parse(localStorage.getItem(LEGACY_STORAGE_KEY) || '[]');
+                const legacyCharters = JSON.parse(localStorage.getItem(LEGACY_CHARTER_STORAGE_KEY) || '{}');
+                if (legacyCompanies.length > 0) {
+                    state.companies = legacyCompanies.filter(companyKey => companyData[companyKey]);
+                    state.charters = legacyCharters;
+                    scheduleStorageWrite();
+                }
+            } catch {
+                // Unreadable storage behaves like an empty selection
+            }
+            return state;
+        }
+        
+        function writeStoredSelection() {
+            pendingStorageWrite = null;
+            if (!selectionState) return;
+            
+            const companyIds = [];
+            const companyKeys = [];
+            selectionState.companies.forEach(companyKey => {
+                if (companyIdMap[companyKey] !== undefined) {
+                    companyIds.push(companyIdMap[companyKey]);
+                    companyKeys.push(companyKey);
+                }
+            });
+            const charterIds = [];
+            const charterKeys = {};
+            Object.entries(selectionState.charters).forEach(([companyKey, buildingKey]) => {
+                const companyId = companyIdMap[companyKey];
+                const buildingId = buildingIdMap[buildingKey];
+                if (companyId !== undefined && buildingId !== undefined) {
+                    charterIds.push([companyId, buildingId]);
+                    charterKeys[buildingId] = buildingKey;
+                }
+            });
+            
+            try {
+                if (companyIds.length === 0) {
+                    localStorage.removeItem(STORAGE_KEY);
+                } else {
+                    localStorage.setItem(STORAGE_KEY, JSON.stringify({
+                        v: STORAGE_SCHEMA_VERSION,
+                        t: getShareTableFingerprint(),
+                        c: companyIds,
+                        ch: charterIds,
+                        k: companyKeys,
+                        b: charterKeys
+                    }));
+                }
+                localStorage.removeItem(LEGACY_STORAGE_KEY);
+                localStorage.removeItem(LEGACY_CHARTER_STORAGE_KEY);
+            } catch (error) {
+                console.warn('Could not save selection:', error.message);
+            }
+        }
+        
+        function scheduleStorageWrite() {
+            if (pendingStorageWrite !== null) return;
+            pendingStorageWriteIsIdle = !!window.requestIdleCallback;
+            if (pendingStorageWriteIsIdle) {
+                pendingStorageWrite = requestIdleCallback(writeStoredSelection, { timeout: STORAGE_WRITE_DELAY * 3 });
+            } else {
+                pendingStorageWrite = setTimeout(writeStoredSelection, STORAGE_WRITE_DELAY);
+            }
         }
         
-        function hideCompanyTooltip() {
-            // Add a small delay to prevent flickering when quickly moving between elements
-            tooltipTimeout = setTimeout(() => {
-                const tooltip = document.getElementById('companyTooltip');
-                if (tooltip) {
-                    tooltip.style.display = 'none';
-                }
-            }, 100);
+        function flushStorageWrite() {
+            if (pendingStorageWrite === null) return;
+            // Idle callback and timer IDs are separate, so only cancel with the scheduler that queued the write
+            if (pendingStorageWriteIsIdle) {
+                cancelIdleCallback(pendingStorageWrite);
+            } else {
+                clearTimeout(pendingStorageWrite);
+            }
+            writeStoredSelection();
         }
         
-        // Custom Company Collection functionality
-        const STORAGE_KEY = 'v3-custom-companies';
-        const CHARTER_STORAGE_KEY = 'v3-selected-charters';
+        // Don't lose a pending write when the tab is closed or hidden
+        window.addEventListener('pagehide', flushStorageWrite);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                flushStorageWrite();
+            }
+        });
         
-        function getCustomCompanies() {
-            try {
-                return JSON.parse(localStorage.getItem(STORAGE_KEY) || '[]');
-            } catch {
-                return [];
+        function getSelectionState() {
+            if (!selectionState) {
+                selectionState = readStoredSelection();
             }
+            return selectionState;
+        }
+        
+        // Callers may modify the returned values, so hand out copies of the cached state
+        function getCustomCompanies() {
+            return getSelectionState().companies.slice();
         }
         
         function saveCustomCompanies(companies) {
-            localStorage.setItem(STORAGE_KEY, JSON.stringify(companies));
+            getSelectionState().companies = companies.slice();
+            scheduleStorageWrite();
         }
         
         function getSelectedCharters() {
-            try {
-                return JSON.parse(localStorage.getItem(CHARTER_STORAGE_KEY) || '{}');
-            } catch {
-                return {};
-            }
+            return { ...getSelectionState().charters };
         }
         
         function saveSelectedCharters(charters) {
-            localStorage.setItem(CHARTER_STORAGE_KEY, JSON.stringify(charters));
+            getSelectionState().charters = { ...charters };
+            scheduleStorageWrite();
+        }
+        
+        function clearStoredSelection() {
+            selectionState = { companies: [], charters: {} };
+            scheduleStorageWrite();
         }
         
         function selectCharter(companyName, building) {
@@ -5456,11 +6074,11 @@ __YALPS_BUNDLE_PLACEHOLDER__
                         
                         // Apply the preset
                         // 1. Set companies
-                        localStorage.setItem(STORAGE_KEY, JSON.stringify(preset.companies));
+                        saveCustomCompanies(preset.companies);
                         
                         // 2. Set charters if available
                         if (preset.charters && typeof preset.charters === 'object') {
-                            localStorage.setItem(CHARTER_STORAGE_KEY, JSON.stringify(preset.charters));
+                            saveSelectedCharters(preset.charters);
                         }
                         
                         // 3. Set building filters if available
@@ -5520,6 +6138,18 @@ __YALPS_BUNDLE_PLACEHOLDER__
             input.click();
         }
         
+        // Sprite classes for icons packed into atlases (see build_icon_atlases)
+        const iconSprites = ''' + self._get_icon_sprites_js() + ''';
+        
+        function getIconHTML(iconPath, size, label, className = '', style = '', attributes = '') {
+            // Draw from a sprite atlas when the icon is in one, otherwise fall back to the image file
+            const sprite = iconSprites[iconPath];
+            if (sprite) {
+                return `<span class="sprite-icon ${sprite} ${className}" style="--icon-size: ${size}px; ${style}" role="img" aria-label="${label}" ${attributes}></span>`;
+            }
+            return `<img src="${iconPath}" class="${className}" style="width: ${size}px; height: ${size}px; ${style}" alt="${label}" ${attributes}>`;
+        }
+        
         function getBuildingIconPath(building) {
             // Building icon mappings for special cases (generated from Python)
             const buildingIconMappings = ''' + self._get_building_icon_mappings_js() + ''';
@@ -5595,8 +6225,8 @@ __YALPS_BUNDLE_PLACEHOLDER__
             companyNames.forEach(companyName => {
                 const company = companyData[companyName];
                 if (company) {
-                    company.base_buildings.forEach(building => allBuildings.add(building));
-                    company.industry_charters.forEach(building => allBuildings.add(building));
+                    company.building_types.forEach(building => allBuildings.add(building));
+                    company.extension_building_types.forEach(building => allBuildings.add(building));
                 }
             });
             return allBuildings; // Return Set, not array
@@ -5851,7 +6481,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 if (!company) return;
                 
                 // Add base buildings (only if enabled by filter)
-                company.base_buildings.forEach(building => {
+                company.building_types.forEach(building => {
                     if (enabledBuildings.includes(building)) {
                         baseBuildings.add(building);
                     }
@@ -5859,7 +6489,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 
                 // Add selected charter if any (only if enabled by filter)
                 const selectedCharter = selectedCharters[companyName];
-                if (selectedCharter && company.industry_charters.includes(selectedCharter) && enabledBuildings.includes(selectedCharter)) {
+                if (selectedCharter && company.extension_building_types.includes(selectedCharter) && enabledBuildings.includes(selectedCharter)) {
                     charterBuildings.add(selectedCharter);
                 }
                 
@@ -5896,14 +6526,14 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 const company = companyData[companyName];
                 if (!company) return;
                 
-                company.base_buildings.forEach(building => {
+                company.building_types.forEach(building => {
                     if (!buildingToCompanies[building]) buildingToCompanies[building] = [];
                     buildingToCompanies[building].push({company: companyName, type: 'base'});
                 });
                 
                 // Track selected charters
                 const selectedCharter = selectedCharters[companyName];
-                if (selectedCharter && company.industry_charters.includes(selectedCharter)) {
+                if (selectedCharter && company.extension_building_types.includes(selectedCharter)) {
                     if (!buildingToCompanies[selectedCharter]) buildingToCompanies[selectedCharter] = [];
                     buildingToCompanies[selectedCharter].push({company: companyName, type: 'charter'});
                 }
@@ -5932,7 +6562,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     const isCovered = coveredBuildings.has(building);
                     const isCharter = charterBuildings.has(building);
                     
-                    let iconStyle = 'width: 32px; height: 32px; margin: 2px;';
+                    let iconStyle = 'margin: 2px;';
                     let titleText = displayName;
                     
                     if (isCovered) {
@@ -5950,7 +6580,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                         titleText += ' (Not covered)';
                     }
                     
-                    iconsHTML += `<img src="${iconPath}" alt="${displayName}" title="${titleText}" style="${iconStyle}; cursor: pointer;" onclick="location.href='#building-${building}'" onerror="this.style.display='none'">`;
+                    iconsHTML += getIconHTML(iconPath, 32, displayName, '', `${iconStyle} cursor: pointer;`, `title="${titleText}" onclick="location.href='#building-${building}'"`);
                 });
                 return iconsHTML;
             }
@@ -5963,7 +6593,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             Array.from(allPrestigeGoods).sort().forEach(good => {
                 const iconPath = prestige_icon_paths[good] || 'icons/40px-Goods_services.png';
                 const displayName = good.replace('prestige_good_', '').replace(/_/g, ' ').replace(/\\b\\w/g, l => l.toUpperCase());
-                prestigeIconsHTML += `<img src="${iconPath}" alt="${displayName}" title="${displayName}" class="prestige-icon" style="width: 24px; height: 24px; margin: 2px;">`;
+                prestigeIconsHTML += getIconHTML(iconPath, 24, displayName, 'prestige-icon', 'margin: 2px;', `title="${displayName}"`);
             });
             
             // Calculate totals - unique buildings only (don't double-count overlaps)
@@ -6043,11 +6673,11 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     const buildingName = getBuildingDisplayName(building);
                     const count = overlaps[building].length;
                     const companies = overlaps[building].map(item => {
-                        const companyIconPath = getCompanyIconPath(item.company);
+                        const companyIconPath = getCompanyIconPath(item.company, 32);
                         const companyName = companyData[item.company]?.name || item.company;
                         return `<img src="${companyIconPath}" style="width: 16px; height: 16px; margin-right: 2px;" onerror="this.style.display='none'">${companyName}`;
                     }).join(', ');
-                    overlapDetails.push(`${count}x <img src="${iconPath}" style="width: 16px; height: 16px; vertical-align: middle;" onerror="this.style.display='none'"> ${buildingName} (${companies})`);
+                    overlapDetails.push(`${count}x ${getIconHTML(iconPath, 16, buildingName, '', 'vertical-align: middle;')} ${buildingName} (${companies})`);
                 });
                 summaryHTML += overlapDetails.join(', ');
                 summaryHTML += `</div>`;
@@ -6145,7 +6775,9 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 
                 // Get building icon path (this will be generated from Python)
                 const iconPath = getBuildingIconPath(building);
-                if (iconPath) {
+                if (iconSprites[iconPath]) {
+                    tableHTML += `<th class="building-header ${iconSprites[iconPath]} col-${building}" data-building="${building}" title="${displayName}"></th>`;
+                } else if (iconPath) {
                     tableHTML += `<th class="building-header col-${building}" data-building="${building}" style="background-image: url(${iconPath})" title="${displayName}"></th>`;
                 } else {
                     tableHTML += `<th class="building-header missing-icon col-${building}" data-building="${building}" title="${displayName}"></th>`;
@@ -6158,8 +6790,8 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 const company = companyData[companyName];
                 if (!company) return;
                 
-                const companyIconPath = getCompanyIconPath(companyName);
-                const companyIconHTML = `<img src="${companyIconPath}" class="company-icon" alt="Company Icon" onerror="this.style.display='none'">`;
+                const companyIconPath = getCompanyIconPath(companyName, 32);
+                const companyIconHTML = `<img src="${companyIconPath}" srcset="${companyIconPath} 1x, ${getCompanyIconPath(companyName, 64)} 2x" class="company-icon" alt="Company Icon" onerror="this.style.display='none'">`;
                 
                 // Calculate building count display like other tables (decimal format - fixed)
                 // FIX: Use correct field names from global companyData
@@ -6177,7 +6809,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     company.prestige_goods.forEach(good => {
                         const iconPath = prestigeIconPaths[good] || 'icons/40px-Goods_services.png';
                         const prestigeName = good.replace('prestige_good_', '').replace(/_/g, ' ');
-                        prestigeIcons += `<img src="${iconPath}" width="16" height="16" alt="${prestigeName}" title="${prestigeName}" class="prestige-icon">`;
+                        prestigeIcons += getIconHTML(iconPath, 20, prestigeName, 'prestige-icon', '', `title="${prestigeName}"`);
                     });
                 }
                 
@@ -6229,8 +6861,8 @@ __YALPS_BUNDLE_PLACEHOLDER__
                 const selectedCharter = selectedCharters[companyName];
                 
                 allBuildings.forEach(building => {
-                    const hasBase = company.base_buildings.includes(building);
-                    const hasExtension = company.industry_charters.includes(building);
+                    const hasBase = company.building_types.includes(building);
+                    const hasExtension = company.extension_building_types.includes(building);
                     let cellContent = "";
                     let cellClass = "";
                     let onClick = "";
@@ -6263,7 +6895,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                         const prestigeIconPaths = ''' + self._get_prestige_icon_mappings_js() + ''';
                         const iconPath = prestigeIconPaths[prestigeGood] || 'icons/40px-Goods_services.png';
                         const prestigeName = prestigeGood.replace('prestige_good_', '').replace(/_/g, ' ');
-                        cellContent = `<img src="${iconPath}" width="16" height="16" alt="${prestigeName}" title="${prestigeName}">`;
+                        cellContent = getIconHTML(iconPath, 16, prestigeName, '', '', `title="${prestigeName}"`);
                         cellClass = `prestige-building col-${building}`;
                         title = `Prestige Good: ${prestigeName}`;
                         style = '';
@@ -6527,8 +7159,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             if (customCompanies.length === 0) return; // Don't do anything if already empty
             
             if (confirm('Are you sure you want to clear all selected companies?')) {
-                localStorage.removeItem(STORAGE_KEY);
-                localStorage.removeItem(CHARTER_STORAGE_KEY);
+                clearStoredSelection();
                 updateCustomTable();
                 updateCheckboxes();
                 updateControlButtons();
@@ -6716,9 +7347,21 @@ __YALPS_BUNDLE_PLACEHOLDER__
         }
         
         // Initialize sortable tables when DOM is ready
-        // Load companies and charters from URL parameters
+        // Load companies, charters and filters from URL parameters
         function loadFromURL() {
             const urlParams = new URLSearchParams(window.location.search);
+            
+            // Compact share code (s=...) carries the full selection and filter state
+            const shareCode = urlParams.get('s');
+            if (shareCode) {
+                const state = decodeShareCode(shareCode);
+                if (state) {
+                    applyShareState(state);
+                    console.log(`Loaded ${state.companies.length} companies from share code`);
+                    return;
+                }
+            }
+            
             // Support both short (c, ch) and long (companies, charters) parameter names for backwards compatibility
             const companiesParam = urlParams.get('c') || urlParams.get('companies');
             const chartersParam = urlParams.get('ch') || urlParams.get('charters');
@@ -6732,7 +7375,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     let foundCompany = null;
                     
                     // First try to parse as ID (numeric)
-                    if (/^\d+$/.test(nameOrKeyOrId)) {
+                    if (/^\\d+$/.test(nameOrKeyOrId)) {
                         const id = parseInt(nameOrKeyOrId);
                         const companyKey = idToCompany[id];
                         if (companyKey && companyData[companyKey]) {
@@ -6740,14 +7383,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
                         }
                     } else {
                         // Fallback to legacy name/key lookup
-                        for (const [companyKey, company] of Object.entries(companyData)) {
-                            const cleanKey = companyKey.replace('company_', '').toLowerCase();
-                            if (cleanKey === nameOrKeyOrId.toLowerCase() || 
-                                company.name.toLowerCase() === nameOrKeyOrId.toLowerCase()) {
-                                foundCompany = companyKey;
-                                break;
-                            }
-                        }
+                        foundCompany = findCompanyByLegacyName(nameOrKeyOrId);
                     }
                     
                     if (foundCompany) {
@@ -6771,25 +7407,18 @@ __YALPS_BUNDLE_PLACEHOLDER__
                             if (companyItem && buildingItem) {
                                 // Find the company by ID (new) or name (legacy)
                                 let foundCompany = null;
-                                if (/^\d+$/.test(companyItem)) {
+                                if (/^\\d+$/.test(companyItem)) {
                                     // Parse as company ID
                                     const companyId = parseInt(companyItem);
                                     foundCompany = idToCompany[companyId];
                                 } else {
                                     // Legacy name/key lookup
-                                    for (const [companyKey, company] of Object.entries(companyData)) {
-                                        const cleanKey = companyKey.replace('company_', '').toLowerCase();
-                                        if (cleanKey === companyItem.toLowerCase() || 
-                                            company.name.toLowerCase() === companyItem.toLowerCase()) {
-                                            foundCompany = companyKey;
-                                            break;
-                                        }
-                                    }
+                                    foundCompany = findCompanyByLegacyName(companyItem);
                                 }
                                 
                                 // Find the building by ID (new) or name (legacy)
                                 let foundBuilding = null;
-                                if (/^\d+$/.test(buildingItem)) {
+                                if (/^\\d+$/.test(buildingItem)) {
                                     // Parse as building ID
                                     const buildingId = parseInt(buildingItem);
                                     foundBuilding = idToBuilding[buildingId];
@@ -6804,13 +7433,13 @@ __YALPS_BUNDLE_PLACEHOLDER__
                                     if (!foundBuilding) {
                                         // Legacy building name lookup
                                         const buildingKey = buildingItem.startsWith('building_') ? buildingItem : `building_${buildingItem}`;
-                                        if (company.industry_charters.includes(buildingKey)) {
+                                        if (company.extension_building_types.includes(buildingKey)) {
                                             foundBuilding = buildingKey;
                                         }
                                     }
                                     
                                     // Verify the building is valid for this company
-                                    if (foundBuilding && company.industry_charters.includes(foundBuilding)) {
+                                    if (foundBuilding && company.extension_building_types.includes(foundBuilding)) {
                                         validCharters[foundCompany] = foundBuilding;
                                     }
                                 }
@@ -6836,14 +7465,327 @@ __YALPS_BUNDLE_PLACEHOLDER__
             {building_mappings}
         };
         
-        // Reverse mappings for URL parsing
-        const idToCompany = Object.fromEntries(Object.entries(companyIdMap).map(([k, v]) => [v, k]));
-        const idToBuilding = Object.fromEntries(Object.entries(buildingIdMap).map(([k, v]) => [v, k]));
+        // Reverse mappings for URL parsing (IDs are dense, so plain arrays index in O(1))
+        const idToCompany = [];
+        Object.entries(companyIdMap).forEach(([key, id]) => { idToCompany[id] = key; });
+        const idToBuilding = [];
+        Object.entries(buildingIdMap).forEach(([key, id]) => { idToBuilding[id] = key; });
+        
+        // Legacy URLs carry company keys or display names - index them once instead of scanning per item
+        let legacyCompanyIndex = null;
+        
+        function findCompanyByLegacyName(nameOrKey) {
+            if (!legacyCompanyIndex) {
+                legacyCompanyIndex = new Map();
+                // First company matching either its key or its name wins, as with the old linear scan
+                for (const [companyKey, company] of Object.entries(companyData)) {
+                    const cleanKey = companyKey.replace('company_', '').toLowerCase();
+                    const lowerName = company.name.toLowerCase();
+                    if (!legacyCompanyIndex.has(cleanKey)) legacyCompanyIndex.set(cleanKey, companyKey);
+                    if (!legacyCompanyIndex.has(lowerName)) legacyCompanyIndex.set(lowerName, companyKey);
+                }
+            }
+            return legacyCompanyIndex.get(nameOrKey.toLowerCase()) || null;
+        }
+        
+        // Compact share code format (s=...), base64url over a bit stream:
+        //   version (8) | ID table fingerprint (16, selects the key tables the IDs index) |
+        //   selection count, then per company: company ID + charter flag (+ building ID) |
+        //   disabled buildings set | disabled companies set | disabled ownership set | slot limit (4)
+        // Sets are written as empty, bitmap or ID list, whichever is shortest.
+        const SHARE_CODE_VERSION = 1;
+        const SHARE_SET_EMPTY = 0;
+        const SHARE_SET_BITMAP = 1;
+        const SHARE_SET_LIST = 2;
+        const OWNERSHIP_TYPES = __OWNERSHIP_TYPES_PLACEHOLDER__;
+        // Key tables of earlier patches by fingerprint (share_tables.json): codes written before a patch
+        // renumbered the IDs are read against their own table and then matched to current keys
+        const shareTableArchive = __SHARE_TABLE_ARCHIVE_PLACEHOLDER__;
+        let shareTableFingerprint = null;
+        
+        function bitWidth(count) {
+            // Bits needed to store any value in [0, count)
+            let bits = 1;
+            while ((1 << bits) < count) bits++;
+            return bits;
+        }
+        
+        function getShareTableFingerprint() {
+            // Share codes only decode against the ID tables they were written with
+            if (shareTableFingerprint === null) {
+                const text = idToCompany.join(',') + '|' + idToBuilding.join(',');
+                let hash = 0x811c9dc5;
+                for (let i = 0; i < text.length; i++) {
+                    hash ^= text.charCodeAt(i);
+                    hash = Math.imul(hash, 0x01000193);
+                }
+                shareTableFingerprint = (hash ^ (hash >>> 16)) & 0xffff;
+            }
+            return shareTableFingerprint;
+        }
+        
+        function getShareTables(fingerprint) {
+            if (fingerprint === getShareTableFingerprint()) {
+                return { companies: idToCompany, buildings: idToBuilding };
+            }
+            return shareTableArchive[fingerprint] || null;
+        }
+        
+        function createBitWriter() {
+            const bytes = [];
+            let current = 0;
+            let used = 0;
+            return {
+                write(value, bits) {
+                    for (let i = bits - 1; i >= 0; i--) {
+                        current = (current << 1) | ((value >>> i) & 1);
+                        if (++used === 8) {
+                            bytes.push(current);
+                            current = 0;
+                            used = 0;
+                        }
+                    }
+                },
+                finish() {
+                    if (used > 0) {
+                        bytes.push(current << (8 - used));
+                    }
+                    return bytes;
+                }
+            };
+        }
+        
+        function createBitReader(bytes) {
+            const totalBits = bytes.length * 8;
+            let position = 0;
+            return {
+                read(bits) {
+                    if (position + bits > totalBits) {
+                        throw new Error('Share code is truncated');
+                    }
+                    let value = 0;
+                    for (let i = 0; i < bits; i++, position++) {
+                        value = (value << 1) | ((bytes[position >> 3] >> (7 - (position & 7))) & 1);
+                    }
+                    return value >>> 0;
+                }
+            };
+        }
+        
+        function bytesToBase64Url(bytes) {
+            let binary = '';
+            bytes.forEach(byte => { binary += String.fromCharCode(byte); });
+            return btoa(binary).replace(/\\+/g, '-').replace(/\\//g, '_').replace(/=+$/, '');
+        }
+        
+        function base64UrlToBytes(code) {
+            let base64 = code.replace(/-/g, '+').replace(/_/g, '/');
+            while (base64.length % 4) {
+                base64 += '=';
+            }
+            const binary = atob(base64);
+            const bytes = new Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            return bytes;
+        }
+        
+        function writeIdSet(writer, ids, universeSize) {
+            if (ids.length === 0) {
+                writer.write(SHARE_SET_EMPTY, 2);
+                return;
+            }
+            const idBits = bitWidth(universeSize);
+            const countBits = bitWidth(universeSize + 1);
+            if (countBits + ids.length * idBits <= universeSize) {
+                writer.write(SHARE_SET_LIST, 2);
+                writer.write(ids.length, countBits);
+                ids.forEach(id => writer.write(id, idBits));
+            } else {
+                writer.write(SHARE_SET_BITMAP, 2);
+                const members = new Set(ids);
+                for (let id = 0; id < universeSize; id++) {
+                    writer.write(members.has(id) ? 1 : 0, 1);
+                }
+            }
+        }
+        
+        function readIdSet(reader, universeSize) {
+            const mode = reader.read(2);
+            const ids = [];
+            if (mode === SHARE_SET_LIST) {
+                const idBits = bitWidth(universeSize);
+                const count = reader.read(bitWidth(universeSize + 1));
+                for (let i = 0; i < count; i++) {
+                    ids.push(reader.read(idBits));
+                }
+            } else if (mode === SHARE_SET_BITMAP) {
+                for (let id = 0; id < universeSize; id++) {
+                    if (reader.read(1)) ids.push(id);
+                }
+            }
+            return ids;
+        }
+        
+        function collectShareState() {
+            const disabledBuildings = [];
+            document.querySelectorAll('.building-filter-checkbox').forEach(checkbox => {
+                if (!checkbox.checked) disabledBuildings.push(checkbox.dataset.building);
+            });
+            
+            // Filter checkboxes carry an id, the per-table selection checkboxes do not
+            const disabledCompanies = [];
+            document.querySelectorAll('input.company-checkbox[id^="company-"]').forEach(checkbox => {
+                if (!checkbox.checked) disabledCompanies.push(checkbox.dataset.company);
+            });
+            
+            const disabledOwnership = [];
+            document.querySelectorAll('.ownership-filter-checkbox').forEach(checkbox => {
+                if (!checkbox.checked) disabledOwnership.push(checkbox.dataset.ownership);
+            });
+            
+            const limitDropdown = document.getElementById('company-limit-dropdown');
+            
+            return {
+                companies: getCustomCompanies(),
+                charters: getSelectedCharters(),
+                disabledBuildings: disabledBuildings,
+                disabledCompanies: disabledCompanies,
+                disabledOwnership: disabledOwnership,
+                companyLimit: limitDropdown ? parseInt(limitDropdown.value) : 0
+            };
+        }
+        
+        function encodeShareCode(state) {
+            const companyBits = bitWidth(idToCompany.length);
+            const buildingBits = bitWidth(idToBuilding.length);
+            const toIds = (keys, idMap) => keys.map(key => idMap[key]).filter(id => id !== undefined).sort((a, b) => a - b);
+            const writer = createBitWriter();
+            
+            writer.write(SHARE_CODE_VERSION, 8);
+            writer.write(getShareTableFingerprint(), 16);
+            
+            // Selection keeps its order; each company is followed by its optional charter
+            const selection = state.companies.map(key => companyIdMap[key]).filter(id => id !== undefined);
+            writer.write(selection.length, bitWidth(idToCompany.length + 1));
+            selection.forEach(companyId => {
+                writer.write(companyId, companyBits);
+                const charterId = buildingIdMap[state.charters[idToCompany[companyId]]];
+                if (charterId !== undefined) {
+                    writer.write(1, 1);
+                    writer.write(charterId, buildingBits);
+                } else {
+                    writer.write(0, 1);
+                }
+            });
+            
+            writeIdSet(writer, toIds(state.disabledBuildings, buildingIdMap), idToBuilding.length);
+            writeIdSet(writer, toIds(state.disabledCompanies, companyIdMap), idToCompany.length);
+            const ownershipIds = state.disabledOwnership.map(type => OWNERSHIP_TYPES.indexOf(type)).filter(id => id >= 0).sort((a, b) => a - b);
+            writeIdSet(writer, ownershipIds, OWNERSHIP_TYPES.length);
+            writer.write(Math.min(state.companyLimit || 0, 15), 4);
+            
+            return bytesToBase64Url(writer.finish());
+        }
+        
+        function decodeShareCode(code) {
+            try {
+                const reader = createBitReader(base64UrlToBytes(code));
+                const version = reader.read(8);
+                if (version !== SHARE_CODE_VERSION) {
+                    console.warn(`Unsupported share code version: ${version}`);
+                    return null;
+                }
+                const tables = getShareTables(reader.read(16));
+                if (!tables) {
+                    console.warn('Share code was created for an unknown company/building list');
+                    return null;
+                }
+                const codeCompanies = tables.companies;
+                const codeBuildings = tables.buildings;
+                
+                const companyBits = bitWidth(codeCompanies.length);
+                const buildingBits = bitWidth(codeBuildings.length);
+                const companies = [];
+                const charters = {};
+                const selectionCount = reader.read(bitWidth(codeCompanies.length + 1));
+                for (let i = 0; i < selectionCount; i++) {
+                    const companyKey = codeCompanies[reader.read(companyBits)];
+                    const charterKey = reader.read(1) ? codeBuildings[reader.read(buildingBits)] : null;
+                    if (!companyKey || !companyData[companyKey]) continue;
+                    companies.push(companyKey);
+                    if (charterKey && companyData[companyKey].extension_building_types.includes(charterKey)) {
+                        charters[companyKey] = charterKey;
+                    }
+                }
+                
+                return {
+                    companies: companies,
+                    charters: charters,
+                    // Keys that no longer exist in this patch are dropped
+                    disabledBuildings: readIdSet(reader, codeBuildings.length).map(id => codeBuildings[id]).filter(key => key in buildingIdMap),
+                    disabledCompanies: readIdSet(reader, codeCompanies.length).map(id => codeCompanies[id]).filter(key => key in companyIdMap),
+                    disabledOwnership: readIdSet(reader, OWNERSHIP_TYPES.length).map(id => OWNERSHIP_TYPES[id]).filter(Boolean),
+                    companyLimit: reader.read(4)
+                };
+            } catch (error) {
+                console.warn('Invalid share code:', error.message);
+                return null;
+            }
+        }
+        
+        function applyShareState(state) {
+            saveCustomCompanies(state.companies);
+            saveSelectedCharters(state.charters);
+            
+            // Building filters
+            const disabledBuildings = new Set(state.disabledBuildings);
+            document.querySelectorAll('.building-filter-checkbox').forEach(checkbox => {
+                const building = checkbox.dataset.building;
+                const enabled = !disabledBuildings.has(building);
+                checkbox.checked = enabled;
+                document.body.classList.toggle(`hide-building-${building}`, !enabled);
+                const buildingSection = document.getElementById(`building-${building}`);
+                if (buildingSection) {
+                    buildingSection.style.display = enabled ? '' : 'none';
+                }
+            });
+            
+            // Company filters
+            const disabledCompanies = new Set(state.disabledCompanies);
+            const countries = new Set();
+            document.querySelectorAll('input.company-checkbox[id^="company-"]').forEach(checkbox => {
+                checkbox.checked = !disabledCompanies.has(checkbox.dataset.company);
+                updateCompanyVisibility(checkbox);
+                countries.add(checkbox.dataset.country);
+            });
+            countries.forEach(countryCode => {
+                if (countryCode === 'basic' || countryCode === 'mandate') return;
+                updateCountryStatus(countryCode);
+                updateCountryCheckbox(countryCode);
+            });
+            updateBasicCompaniesStatus();
+            updateContinentStatus();
+            
+            // Ownership filters
+            const disabledOwnership = new Set(state.disabledOwnership);
+            document.querySelectorAll('.ownership-filter-checkbox').forEach(checkbox => {
+                const ownershipType = checkbox.dataset.ownership;
+                checkbox.checked = !disabledOwnership.has(ownershipType);
+                document.body.classList.toggle(`hide-ownership-${ownershipType.replace(/ /g, '-')}`, !checkbox.checked);
+            });
+            
+            // Slot limit (0 means the sharer's page had no limit selector)
+            const limitDropdown = document.getElementById('company-limit-dropdown');
+            if (limitDropdown && state.companyLimit && limitDropdown.querySelector(`option[value="${state.companyLimit}"]`)) {
+                limitDropdown.value = String(state.companyLimit);
+            }
+        }
         
         // Generate shareable URL with current selection
         function generateShareURL(silent = false, event = null) {
             const customCompanies = getCustomCompanies();
-            const selectedCharters = getSelectedCharters();
             
             if (customCompanies.length === 0) {
                 if (!silent) {
@@ -6853,27 +7795,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             }
             
             const baseURL = 'https://alcaras.github.io/v3co/';
-            const urlParams = [];
-            
-            // Add companies using IDs for shorter URLs
-            const companyIds = customCompanies.map(companyKey => companyIdMap[companyKey]).filter(id => id !== undefined);
-            urlParams.push(`c=${companyIds.join(',')}`);
-            
-            // Add charters using IDs for shorter URLs
-            const charterEntries = [];
-            Object.entries(selectedCharters).forEach(([companyKey, buildingKey]) => {
-                const companyId = companyIdMap[companyKey];
-                const buildingId = buildingIdMap[buildingKey];
-                if (companyId !== undefined && buildingId !== undefined) {
-                    charterEntries.push(`${companyId}:${buildingId}`);
-                }
-            });
-            
-            if (charterEntries.length > 0) {
-                urlParams.push(`ch=${charterEntries.join(',')}`);
-            }
-            
-            const shareURL = `${baseURL}?${urlParams.join('&')}`;
+            const shareURL = `${baseURL}?s=${encodeShareCode(collectShareState())}`;
             
             // If silent mode, just return the URL
             if (silent) {
@@ -6923,6 +7845,15 @@ __YALPS_BUNDLE_PLACEHOLDER__
             
         });
         
+        // Offline support: the service worker precaches the page and the icons it references
+        if ('serviceWorker' in navigator && location.protocol.startsWith('http')) {
+            window.addEventListener('load', () => {
+                navigator.serviceWorker.register('sw.js').catch(error => {
+                    console.warn('Service worker registration failed:', error.message);
+                });
+            });
+        }
+        
         // Console helper functions for debugging
         window.debugSelectAllCompanies = function() {
             const allCompanies = Object.keys(companyData);
@@ -7888,8 +8819,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             // Clear existing selection if needed
             if (confirm('This will replace your current selection. Continue?')) {
                 // Clear all
-                localStorage.removeItem(STORAGE_KEY);
-                localStorage.removeItem(CHARTER_STORAGE_KEY);
+                clearStoredSelection();
                 
                 // Add existing companies back
                 const newSelection = [...optimizationResults.existingCompanies];
@@ -7965,7 +8895,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             customCompanies.forEach(companyName => {
                 const company = companyData[companyName];
                 if (company) {
-                    const companyIconPath = getCompanyIconPath(companyName);
+                    const companyIconPath = getCompanyIconPath(companyName, 32);
                     const companyDisplayName = company?.name || companyName;
                     
                     summaryContent += `<div style="margin: 2px 0; font-size: 12px; line-height: 1.4;">`;
@@ -7978,8 +8908,8 @@ __YALPS_BUNDLE_PLACEHOLDER__
                     const buildingParts = [];
                     
                     // List base buildings by short form
-                    if (company.base_buildings && company.base_buildings.length > 0) {
-                        const baseNames = company.base_buildings.map(building => getBuildingShortForm(building));
+                    if (company.building_types && company.building_types.length > 0) {
+                        const baseNames = company.building_types.map(building => getBuildingShortForm(building));
                         buildingParts.push(baseNames.join(', '));
                     }
                     
@@ -8014,7 +8944,11 @@ __YALPS_BUNDLE_PLACEHOLDER__
                             const iconPath = `icons/24px-Prestige_${mappedBase}.png`;
                             const fallbackIcon = `icons/40px-Goods_${mappedBase}.png`;
                             
-                            summaryContent += `<img src="${iconPath}" alt="${prestigeGood}" title="${prestigeGood}" style="width: 16px; height: 16px; margin: 0 2px; vertical-align: middle;" onerror="this.src='${fallbackIcon}'; this.onerror=null;">`;
+                            if (iconSprites[iconPath] || iconSprites[fallbackIcon]) {
+                                summaryContent += getIconHTML(iconSprites[iconPath] ? iconPath : fallbackIcon, 16, prestigeGood, '', 'margin: 0 2px;', `title="${prestigeGood}"`);
+                            } else {
+                                summaryContent += `<img src="${iconPath}" alt="${prestigeGood}" title="${prestigeGood}" style="width: 16px; height: 16px; margin: 0 2px; vertical-align: middle;" onerror="this.src='${fallbackIcon}'; this.onerror=null;">`;
+                            }
                             
                             // Use the same format as in tooltips - just the base name with proper capitalization
                             const prestigeGoodDisplayName = prestigeGood.replace('prestige_good_generic_', '').replace('prestige_good_', '').replace(/_/g, ' ').replace(/\\b\\w/g, l => l.toUpperCase());
@@ -8238,17 +9172,175 @@ __YALPS_BUNDLE_PLACEHOLDER__
 </body>
 </html>'''
         
-        all_dynamic_css = column_hiding_css + '\n        /* Dynamic company hiding rules for country filters */\n' + country_hiding_css
-        html = html.replace('__COLUMN_HIDING_CSS_PLACEHOLDER__', all_dynamic_css)
-        html = html.replace('__YALPS_BUNDLE_PLACEHOLDER__', yalps_bundle)
-
-        # Add version and date information
-        last_updated = datetime.now().strftime('%B %d, %Y')
-        html = html.replace('__LAST_UPDATED_PLACEHOLDER__', last_updated)
-        html = html.replace('__GAME_VERSION_PLACEHOLDER__', self.GAME_VERSION)
-
         return html
 
+    def _get_search_words(self, text):
+        """Split text into lowercase search words, adding accent-free forms of accented words"""
+        import unicodedata
+        words = set()
+        for word in re.findall(r'[^\W_]+', (text or '').lower()):
+            words.add(word)
+            folded = ''.join(ch for ch in unicodedata.normalize('NFD', word) if not unicodedata.combining(ch))
+            words.add(folded)
+        return words
+    
+    def _get_search_index_js(self):
+        """Generate the client-side search index over companies and buildings"""
+        # Documents are [type, key, label]. Postings hold doc * 2 + 1 for name/key matches and
+        # doc * 2 for other fields. Words are sorted for prefix lookups; trigrams map to word
+        # indices for infix lookups.
+        documents = []
+        postings = defaultdict(set)
+        
+        def add_words(doc_index, texts, primary):
+            for text in texts:
+                for word in self._get_search_words(text):
+                    postings[word].add(doc_index * 2 + (1 if primary else 0))
+        
+        all_buildings = set()
+        for company_name in sorted(self.companies):
+            data = self.companies[company_name]
+            display_name = data.get('display_name', self.get_company_display_name(company_name))
+            doc_index = len(documents)
+            documents.append(['c', company_name, display_name])
+            
+            buildings = data.get('building_types', []) + data.get('extension_building_types', [])
+            all_buildings.update(buildings)
+            countries = [code for code in (data.get('country'), data.get('starting_country')) if code]
+            
+            add_words(doc_index, [display_name, company_name.replace('company_', '', 1)], True)
+            add_words(doc_index, [self.get_building_display_name(building) for building in buildings], False)
+            add_words(doc_index, [self.prestige_good_names.get(good, good.replace('prestige_good_generic_', '').replace('prestige_good_', ''))
+                                  for good in data.get('possible_prestige_goods', [])], False)
+            add_words(doc_index, data.get('formation_requirements', []), False)
+            add_words(doc_index, countries + [self.get_country_name(code) for code in countries], False)
+        
+        for building in sorted(all_buildings):
+            doc_index = len(documents)
+            display_name = self.get_building_display_name(building)
+            documents.append(['b', building, display_name])
+            add_words(doc_index, [display_name, building.replace('building_', '', 1)], True)
+        
+        words = sorted(postings)
+        trigrams = defaultdict(list)
+        for word_index, word in enumerate(words):
+            for trigram in sorted(set(word[i:i + 3] for i in range(len(word) - 2))):
+                trigrams[trigram].append(word_index)
+        
+        search_index = {
+            'd': documents,
+            'w': words,
+            'p': [sorted(postings[word]) for word in words],
+            't': trigrams
+        }
+        return json.dumps(search_index, ensure_ascii=False, separators=(',', ':'))
+    
+    def _get_tooltip_country_display(self, country_code):
+        """Get the tooltip flag and full name for a country (None if it has no proper name)"""
+        if country_code not in self.country_names:
+            return None
+        return self.get_country_flag(country_code), self.country_names[country_code]
+    
+    def _get_tooltip_record(self, company_name, data):
+        """Precompute the tooltip fields for a company that are not already in companyData"""
+        record = {'i': self.get_company_icon_path(company_name, 256)}
+        special_requirements = data.get('special_requirements', [])
+        
+        # Header icons for special requirements and pre-enacted companies
+        header_icons = ''
+        for req in special_requirements:
+            if req == 'journal_entry':
+                header_icons += '📚 '
+            elif req == 'primary_culture':
+                header_icons += '🛑 '
+            elif req in ('law', 'ideology', 'diplomatic'):
+                header_icons += '🔒 '
+        if data.get('starts_enacted'):
+            header_icons += '⚠️ '
+        if header_icons:
+            record['h'] = header_icons
+        
+        # Country flag and full name (only for companies with a known country)
+        country_info = self._get_tooltip_country_display(data.get('country') or '')
+        if country_info:
+            record['c'] = ' '.join(part for part in country_info if part)
+        
+        # Icons for formation requirements, aligned with companyData requirements
+        requirement_icons = []
+        for req in data.get('formation_requirements', []):
+            if 'Primary culture:' in req:
+                requirement_icons.append('🛑 ')
+            elif 'Technology:' in req:
+                requirement_icons.append('💡 ')
+            elif 'journal entry' in req or 'Journal Entry' in req:
+                requirement_icons.append('📚 ')
+            elif 'Starts Enacted' in req or 'game start' in req:
+                requirement_icons.append('⚠️ ')
+            else:
+                requirement_icons.append('')
+        if any(requirement_icons):
+            record['r'] = requirement_icons
+        
+        if special_requirements:
+            record['s'] = [[self.SPECIAL_REQUIREMENT_ICONS.get(req, ''), self.SPECIAL_REQUIREMENT_NAMES.get(req, req)]
+                           for req in special_requirements]
+        
+        # Prestige goods, base buildings and charters as [icon path, display name] pairs
+        prestige_goods = []
+        for good in data.get('possible_prestige_goods', []):
+            good_base = good.replace('prestige_good_generic_', '').replace('prestige_good_', '')
+            prestige_goods.append([self.get_prestige_good_icon_path(good)[1] or '', good_base.replace('_', ' ').title()])
+        if prestige_goods:
+            record['p'] = prestige_goods
+        
+        for key, buildings in (('b', data.get('building_types', [])), ('x', data.get('extension_building_types', []))):
+            if buildings:
+                record[key] = [[self.get_building_icon_path(building) or '', self.get_building_display_name(building)]
+                               for building in buildings]
+        
+        return record
+    
+    def _get_page_data_js(self):
+        """Encode companyData and tooltipData records against one string table: (strings, companies, tooltips) as JSON"""
+        strings = InternTable()
+        
+        def encode(value):
+            if isinstance(value, str):
+                return strings.intern(value)
+            if isinstance(value, (list, tuple)):
+                return [encode(item) for item in value]
+            if isinstance(value, dict):
+                return dict((key, encode(item)) for key, item in value.items())
+            return value
+        
+        company_records = {}
+        tooltip_records = {}
+        for company_name, data in self.companies.items():
+            fields = {
+                'name': data.get('display_name', self.get_company_display_name(company_name)),
+                'country': data['country'] or '',
+                'country_confidence': data['country_confidence'],
+                'country_info': '',  # Confidence is not shown - country is definitive from game files
+                'requirements': data['formation_requirements'],
+                'bonuses': data['prosperity_bonuses'],
+                'prosperity_bonuses_text': self.format_prosperity_bonuses(data.get('prosperity_bonuses', [])),
+                'prestige_goods': data.get('possible_prestige_goods', []),
+                'building_types': data.get('building_types', []),
+                'extension_building_types': data.get('extension_building_types', []),
+                'special_requirements': data.get('special_requirements', []),
+                'starts_enacted': data.get('starts_enacted', False),
+                'starting_country': data.get('starting_country', None),
+                'ownership_category': data.get('ownership_category', 'Full Capitalist'),
+            }
+            company_records[company_name] = [encode(fields[field]) if field in self.COMPANY_DATA_STRING_FIELDS else fields[field]
+                                             for field in self.COMPANY_DATA_FIELDS]
+            tooltip_records[company_name] = dict((key, encode(value) if key in self.TOOLTIP_STRING_FIELDS else value)
+                                                 for key, value in self._get_tooltip_record(company_name, data).items())
+        
+        def compact(value):
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        return compact(strings.names), compact(company_records), compact(tooltip_records)
+    
     def _get_country_flags_js(self):
         """Generate JavaScript object for country flags"""
         flags_js = []
@@ -8257,32 +9349,18 @@ __YALPS_BUNDLE_PLACEHOLDER__
         return '{' + ', '.join(flags_js) + '}'
     
     def _get_country_names_js(self):
-        """Generate JavaScript object for country names"""
+        """Generate JavaScript object for the names of countries that have companies"""
         names_js = []
-        country_names = {
-            'USA': 'United States', 'GBR': 'Great Britain', 'FRA': 'France', 'DEU': 'Germany',
-            'PRU': 'Prussia', 'AUS': 'Austria-Hungary', 'RUS': 'Russia', 'JAP': 'Japan',
-            'CHI': 'China', 'ITA': 'Italy', 'SAR': 'Sardinia-Piedmont', 'SPA': 'Spain',
-            'TUR': 'Turkey', 'EGY': 'Egypt', 'PER': 'Persia', 'SWE': 'Sweden', 'NOR': 'Norway',
-            'DEN': 'Denmark', 'NET': 'Netherlands', 'BEL': 'Belgium', 'SWI': 'Switzerland',
-            'BRZ': 'Brazil', 'ARG': 'Argentina', 'CHL': 'Chile', 'COL': 'Colombia', 'MEX': 'Mexico'
-        }
-        for code, name in country_names.items():
-            names_js.append(f'"{code}": "{name}"')
+        countries = set(data.get('country') for data in self.companies.values())
+        for code, name in self.country_names.items():
+            if code in countries:
+                names_js.append(f'"{code}": "{name}"')
         return '{' + ', '.join(names_js) + '}'
     
     def _get_building_icon_mappings_js(self):
         """Generate JavaScript object for building icon mappings"""
         # Building name mappings for icon files that have different names (from get_building_icon_path)
-        building_name_mappings = {
-            'building_chemical_plants': 'chemicals_industry',
-            'building_textile_mills': 'textile_industry', 
-            'building_artillery_foundries': 'artillery_foundry',
-            'building_automotive_industry': 'vehicles_industry',
-            'building_livestock_ranch': 'cattle_ranch',
-            'building_rubber_plantation': 'rubber_lodge',
-            'building_vineyard_plantation': 'vineyards'
-        }
+        building_name_mappings = self.registry['building_icon_names']
         
         mappings_js = []
         for building, icon_name in building_name_mappings.items():
@@ -8292,10 +9370,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
     def _get_prestige_icon_mappings_js(self):
         """Generate JavaScript object with prestige icon paths that actually exist"""
         # Special icon mappings for prestige goods that don't have exact icon matches (same as main table logic)
-        icon_mappings = {
-            'burmese_teak': 'teak',
-            'swedish_bar_iron': 'oregrounds_iron'
-        }
+        icon_mappings = self.registry['prestige_icon_names']
         
         prestige_icon_paths = {}
         
@@ -8314,7 +9389,7 @@ __YALPS_BUNDLE_PLACEHOLDER__
             ]
             
             for candidate in prestige_icon_candidates:
-                full_path = os.path.join(os.path.dirname(__file__), candidate)
+                full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), candidate)
                 if os.path.exists(full_path):
                     prestige_icon_paths[prestige_good] = candidate
                     break
@@ -8344,15 +9419,8 @@ __YALPS_BUNDLE_PLACEHOLDER__
         return '{' + ', '.join(mappings_js) + '}'
     
     def _get_company_data_js(self):
-        """Generate JavaScript object with company building data"""
-        import json
-        company_data_js = {}
-        for company_name, data in self.companies.items():
-            company_data_js[company_name] = {
-                'building_types': data.get('building_types', []),
-                'extension_building_types': data.get('extension_building_types', [])
-            }
-        return json.dumps(company_data_js)
+        """JavaScript expression for the company building lists (decoded once from companyDataRecords)"""
+        return 'getCompanyBuildingData()'
     
     def _generate_column_hiding_css(self, buildings):
         """Generate CSS rules to hide table columns for filtered buildings"""
@@ -8381,126 +9449,946 @@ __YALPS_BUNDLE_PLACEHOLDER__
             css_rules.append(css_rule)
 
         # CSS for ownership type hiding
-        ownership_types = ['Full Capitalist', 'Partial Aristocrat', 'Partial Bureaucrat', 'Partial Academic', 'Partial Shopkeeper']
-        for ownership_type in ownership_types:
+        for ownership_type in self.OWNERSHIP_TYPES:
             css_rule = f"        body.hide-ownership-{ownership_type.replace(' ', '-')} tr[data-ownership=\"{ownership_type}\"] {{\n            display: none !important;\n        }}\n"
             css_rules.append(css_rule)
 
         return ''.join(css_rules)
 
+    def build_page_report(self, html_content):
+        """Measure the generated page: bytes per part, element/row counts, dynamic CSS rules, inline handlers and image bytes"""
+        def size(text):
+            return len(text.encode('utf-8'))
+        
+        # Building sections run from one section start to the next, the last one up to the closing </div> before the scripts
+        sections = {}
+        starts = [(m.start(), m.group(1)) for m in re.finditer(r'<div class="building-section" id="building-([\w-]+)">', html_content)]
+        scripts_start = html_content.find('<script>', starts[-1][0]) if starts else -1
+        for i, (start, building) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else scripts_start
+            sections[building] = size(html_content[start:end])
+        
+        css_bytes = sum(size(css) for css in re.findall(r'<style[^>]*>(.*?)</style>', html_content, re.S))
+        
+        try:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yalps-browserify-direct.js'), 'r') as f:
+                yalps_bundle = f.read()
+        except IOError:
+            yalps_bundle = ''
+        yalps_bytes = size(yalps_bundle) if yalps_bundle and yalps_bundle in html_content else 0
+        
+        # Embedded data is any JSON literal assigned to a const; repeated names get a #n suffix
+        data_blobs = {}
+        decoder = json.JSONDecoder()
+        for m in re.finditer(r'const (\w+) = (?=[\[{])', html_content):
+            try:
+                end = decoder.raw_decode(html_content, m.end())[1]
+            except ValueError:
+                continue
+            blob_bytes = size(html_content[m.end():end])
+            if blob_bytes < 1024:
+                continue
+            name = m.group(1)
+            suffix = 2
+            while name in data_blobs:
+                name = '{}#{}'.format(m.group(1), suffix)
+                suffix += 1
+            data_blobs[name] = blob_bytes
+        
+        # Markup counts exclude script and style bodies
+        markup = re.sub(r'<(script|style)[^>]*>.*?</\1>', '', html_content, flags=re.S)
+        handlers = Counter(m.lower() for m in re.findall(r'\s(on[a-zA-Z]+)="', markup))
+        css_rules = {
+            'building_columns': len(re.findall(r'body\.hide-building-[\w-]+ table th\.', html_content)),
+            'countries': len(re.findall(r'body\.hide-country-[\w-]+ tr\[', html_content)),
+            'companies': len(re.findall(r'body\.hide-company-[\w-]+ tr\[', html_content)),
+            'ownership': len(re.findall(r'body\.hide-ownership-[\w-]+ tr\[', html_content)),
+        }
+        
+        image_index = self.get_image_index()
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        image_bytes = 0
+        for path in self.get_referenced_assets(html_content):
+            entry = image_index.get(path)
+            image_bytes += entry[2] if entry else os.path.getsize(os.path.join(base_dir, path))
+        
+        total_bytes = size(html_content)
+        return {
+            'total_bytes': total_bytes,
+            'css_bytes': css_bytes,
+            'yalps_bundle_bytes': yalps_bytes,
+            'building_sections': sections,
+            'data_blobs': data_blobs,
+            'other_bytes': total_bytes - css_bytes - yalps_bytes - sum(sections.values()) - sum(data_blobs.values()),
+            'elements': len(re.findall(r'<[a-zA-Z][\w-]*', markup)),
+            'table_rows': len(re.findall(r'<tr[\s>]', markup)),
+            'css_rules': css_rules,
+            'inline_handlers': dict(handlers),
+            'image_bytes': image_bytes,
+        }
+    
+    def get_page_budgets(self):
+        """Get the page budgets: PAGE_BUDGETS with any limits overridden in page_budgets.json"""
+        budgets = dict(self.PAGE_BUDGETS)
+        try:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.PAGE_BUDGET_FILE), 'r', encoding='utf-8') as f:
+                budgets.update(json.load(f))
+        except IOError:
+            pass
+        return budgets
+    
+    def save_page_report(self, html_content):
+        """Write page_report.json, print a summary and raise if the page is over any budget"""
+        report = self.build_page_report(html_content)
+        measured = {
+            'total_bytes': report['total_bytes'],
+            'css_bytes': report['css_bytes'],
+            'yalps_bundle_bytes': report['yalps_bundle_bytes'],
+            'max_building_section_bytes': max(report['building_sections'].values() or [0]),
+            'max_data_blob_bytes': max(report['data_blobs'].values() or [0]),
+            'elements': report['elements'],
+            'table_rows': report['table_rows'],
+            'css_rules': sum(report['css_rules'].values()),
+            'inline_handlers': sum(report['inline_handlers'].values()),
+            'image_bytes': report['image_bytes'],
+        }
+        budgets = self.get_page_budgets()
+        over_budget = [(key, measured[key], budgets[key]) for key in sorted(measured)
+                       if budgets.get(key) is not None and measured[key] > budgets[key]]
+        report['budgets'] = budgets
+        report['over_budget'] = [key for key, value, limit in over_budget]
+        
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.PAGE_REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        
+        largest_section = max(report['building_sections'].items(), key=lambda item: item[1]) if report['building_sections'] else ('-', 0)
+        largest_blob = max(report['data_blobs'].items(), key=lambda item: item[1]) if report['data_blobs'] else ('-', 0)
+        print("Page report: {:,.1f} KB total (CSS {:,.1f} KB, YALPS {:,.1f} KB, {} building sections {:,.1f} KB, {} data blobs {:,.1f} KB)".format(
+            report['total_bytes'] / 1024.0, report['css_bytes'] / 1024.0, report['yalps_bundle_bytes'] / 1024.0,
+            len(report['building_sections']), sum(report['building_sections'].values()) / 1024.0,
+            len(report['data_blobs']), sum(report['data_blobs'].values()) / 1024.0))
+        print("  Largest section {} ({:,.1f} KB), largest data blob {} ({:,.1f} KB)".format(
+            largest_section[0], largest_section[1] / 1024.0, largest_blob[0], largest_blob[1] / 1024.0))
+        print("  {} elements, {} table rows, {} hiding CSS rules, {} inline handlers, {:,.1f} KB of referenced images".format(
+            measured['elements'], measured['table_rows'], measured['css_rules'], measured['inline_handlers'],
+            measured['image_bytes'] / 1024.0))
+        
+        if over_budget:
+            for key, value, limit in over_budget:
+                print("ERROR: Page budget exceeded: {} = {:,} (budget {:,})".format(key, value, limit))
+            raise RuntimeError("Page over budget: {}".format(', '.join(key for key, value, limit in over_budget)))
+        return report
+    
     def save_html_report(self, filename="index.html"):
         """Save the HTML report to a file"""
+        self.save_share_table_archive()
         html_content = self.generate_html_report()
         
         # Apply ID mappings to the HTML template (manual replacement to avoid format issues)
         html_content = html_content.replace('{company_mappings}', self._generate_company_id_mappings())
         html_content = html_content.replace('{building_mappings}', self._generate_building_id_mappings())
         
-        output_path = os.path.join(os.path.dirname(__file__), filename)
+        # Check the page budgets before anything is written, so an over-budget page is never published
+        self.save_page_report(html_content)
+        
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
         import codecs
         with codecs.open(output_path, 'w', encoding='utf-8') as f:
             f.write(html_content)
             
         print("HTML report generated: {}".format(output_path))
+        self.report_image_problems(html_content)
+        self.save_service_worker(html_content, filename)
         return output_path
+    
+    def get_image_references(self, html_content):
+        """Get every local image path referenced by the generated HTML, whether or not the file exists"""
+        # Paths appear in src attributes, CSS url() values and the embedded JSON/JS data;
+        # template strings with ${...} placeholders are skipped
+        # (the lookbehind skips folder names inside longer paths, e.g. the iconVariants keys under companies/png/)
+        references = set(re.findall(r'(?<![\w./-])(?:companies|icons|buildings)/[\w./-]+?\.(?:png|jpg|jpeg|webp|gif|svg)', html_content))
+        # assetAliases keys are duplicates the page loads from their canonical copy, and atlas-packed icons
+        # are only named as iconSprites keys; the page draws them from the atlas image
+        references = set(self.resolve_asset_path(path) for path in references)
+        return references - set(self.get_icon_atlas()['icons'])
+    
+    def get_first_render_assets(self, html_content):
+        """Get the local images the page draws before any script runs: markup src attributes and CSS url() values"""
+        markup = re.sub(r'<script[^>]*>.*?</script>', '', html_content, flags=re.S)
+        paths = re.findall(r'\ssrc="([^"]+)"', markup) + re.findall(r'url\(([^)?]+)', markup)
+        return sorted(set(self.resolve_asset_path(path.strip('\'"')) for path in paths) & set(self.get_referenced_assets(html_content)))
+    
+    def get_referenced_assets(self, html_content):
+        """Get the local image files referenced by the generated HTML"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        image_index = self.get_image_index()
+        return sorted(path for path in self.get_image_references(html_content)
+                      if path in image_index or os.path.isfile(os.path.join(base_dir, path)))
+    
+    def get_image_index(self):
+        """Get {path: [width, height, bytes, mtime]} for the PNGs under IMAGE_INDEX_FOLDERS, reading only their IHDR headers"""
+        if getattr(self, '_image_index', None) is not None:
+            return self._image_index
+        
+        import struct
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        cache_path = os.path.join(base_dir, self.IMAGE_INDEX_CACHE)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (IOError, ValueError):
+            cached = {}
+        
+        index = {}
+        header_reads = 0
+        for folder in self.IMAGE_INDEX_FOLDERS:
+            for root, dirs, files in os.walk(os.path.join(base_dir, folder)):
+                dirs.sort()
+                for file in sorted(files):
+                    if not file.lower().endswith('.png'):
+                        continue
+                    full_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(full_path, base_dir).replace(os.sep, '/')
+                    stat = os.stat(full_path)
+                    entry = cached.get(rel_path)
+                    if entry and entry[2] == stat.st_size and entry[3] == int(stat.st_mtime):
+                        index[rel_path] = entry
+                        continue
+                    
+                    # Signature (8 bytes), IHDR length and type (8 bytes), then big-endian width and height
+                    with open(full_path, 'rb') as f:
+                        header = f.read(24)
+                    header_reads += 1
+                    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n' or header[12:16] != b'IHDR':
+                        print("WARNING: Not a valid PNG file: {}".format(rel_path))
+                        continue
+                    width, height = struct.unpack('>II', header[16:24])
+                    index[rel_path] = [width, height, stat.st_size, int(stat.st_mtime)]
+        
+        if header_reads or len(index) != len(cached):
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, separators=(',', ':'), sort_keys=True)
+        print("Image index: {} PNG files ({} headers read)".format(len(index), header_reads))
+        self._image_index = index
+        return index
+    
+    def get_image_size_attrs(self, image_path, display_width=None):
+        """Get width/height attributes for an indexed image, scaled to display_width keeping its aspect ratio"""
+        entry = self.get_image_index().get(image_path)
+        if not entry or not entry[0] or not entry[1]:
+            return ''
+        width, height = entry[0], entry[1]
+        if display_width:
+            width, height = display_width, max(1, int(round(height * display_width / float(width))))
+        return ' width="{}" height="{}"'.format(width, height)
+    
+    def report_image_problems(self, html_content):
+        """Report referenced images that are missing or larger than IMAGE_MAX_BYTES/IMAGE_MAX_DIMENSION, and icon lookups that fell back"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        image_index = self.get_image_index()
+        missing = []
+        oversized = []
+        for path in sorted(self.get_image_references(html_content)):
+            entry = image_index.get(path)
+            if entry is None:
+                if not os.path.isfile(os.path.join(base_dir, path)):
+                    missing.append(path)
+                continue
+            width, height, size = entry[0], entry[1], entry[2]
+            if size > self.IMAGE_MAX_BYTES or max(width, height) > self.IMAGE_MAX_DIMENSION:
+                oversized.append((path, width, height, size))
+        
+        if missing:
+            print("WARNING: {} referenced images are missing:".format(len(missing)))
+            for path in missing:
+                print("  {}".format(path))
+        if oversized:
+            print("WARNING: {} referenced images exceed {}px or {} KB:".format(
+                len(oversized), self.IMAGE_MAX_DIMENSION, self.IMAGE_MAX_BYTES // 1024))
+            for path, width, height, size in oversized:
+                print("  {} ({}x{}, {:.1f} KB)".format(path, width, height, size / 1024.0))
+        
+        # Lookups that find no file never reach the HTML (companies show the placeholder, buildings no icon),
+        # so they are checked against the data rather than the page, which may come from cached fragments
+        missing_company_icons = sorted(company_name for company_name in self.companies
+                                       if not self.find_company_icon_path(company_name))
+        buildings = set()
+        for data in self.companies.values():
+            buildings.update(data['building_types'])
+            buildings.update(data['extension_building_types'])
+        missing_building_icons = sorted(building for building in buildings if not self.find_building_icon_path(building))
+        if missing_company_icons:
+            print("WARNING: {} companies use the placeholder icon:".format(len(missing_company_icons)))
+            for company_name in missing_company_icons:
+                print("  {}".format(company_name))
+        if missing_building_icons:
+            print("WARNING: {} buildings have no icon:".format(len(missing_building_icons)))
+            for building_name in missing_building_icons:
+                print("  {}".format(building_name))
+        if not missing and not oversized and not missing_company_icons and not missing_building_icons:
+            print("Image check: all referenced images present and within limits")
+        return missing, oversized
+    
+    def compress_outputs(self, outputs=None, workers=None):
+        """Write maximum-level .gz and .br siblings of the build outputs, skipping unchanged files, and print their sizes"""
+        import hashlib
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            import brotli
+            use_brotli = True
+        except ImportError:
+            print("WARNING: brotli is not installed, writing .gz files only (pip install brotli)")
+            use_brotli = False
+        
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        manifest_path = os.path.join(base_dir, self.COMPRESSION_MANIFEST)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (IOError, ValueError):
+            previous = {}
+        # Files compressed without brotli must be redone once it is available
+        previous_files = previous.get('files', {}) if previous.get('brotli') == use_brotli else {}
+        manifest = {'brotli': use_brotli, 'files': {}}
+        
+        outputs = [path for path in (outputs or self.COMPRESSED_OUTPUTS) if os.path.isfile(os.path.join(base_dir, path))]
+        jobs = []
+        for path in outputs:
+            source_path = os.path.join(base_dir, path)
+            with open(source_path, 'rb') as f:
+                source_hash = hashlib.sha256(f.read()).hexdigest()
+            manifest['files'][path] = source_hash
+            if previous_files.get(path) == source_hash and os.path.exists(source_path + '.gz') and (
+                    not use_brotli or os.path.exists(source_path + '.br')):
+                continue
+            # A .br left from a build that had brotli would now be stale
+            if not use_brotli and os.path.exists(source_path + '.br'):
+                os.remove(source_path + '.br')
+            jobs.append((source_path, use_brotli))
+        
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(_compress_output, jobs))
+        
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        
+        print("Precompressed outputs: {} compressed, {} unchanged".format(len(jobs), len(outputs) - len(jobs)))
+        print("  {:<28} {:>12} {:>12} {:>12}".format('Artifact', 'Raw', 'gzip', 'brotli'))
+        totals = [0, 0, 0]
+        for path in outputs:
+            source_path = os.path.join(base_dir, path)
+            sizes = [os.path.getsize(source_path)]
+            for suffix in ('.gz', '.br'):
+                sizes.append(os.path.getsize(source_path + suffix) if os.path.exists(source_path + suffix) else None)
+            for i, size in enumerate(sizes):
+                totals[i] += size or 0
+            print("  {:<28} {:>12} {:>12} {:>12}".format(
+                path, *['{:,.1f} KB'.format(size / 1024.0) if size is not None else '-' for size in sizes]))
+        print("  {:<28} {:>12} {:>12} {:>12}".format(
+            'Total', *['{:,.1f} KB'.format(size / 1024.0) if size or i == 0 else '-' for i, size in enumerate(totals)]))
+    
+    def save_service_worker(self, html_content, html_filename="index.html",
+                            manifest_filename="precache-manifest.json", worker_filename="sw.js"):
+        """Write the manifest (content hashes of the page and its images) and the service worker"""
+        import hashlib
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        entries = {html_filename: hashlib.sha256(html_content.encode('utf-8')).hexdigest()[:16]}
+        for path in self.get_referenced_assets(html_content):
+            with open(os.path.join(base_dir, path), 'rb') as f:
+                entries[path] = hashlib.sha256(f.read()).hexdigest()[:16]
+        
+        # Only the page shell and what its first render draws are fetched on install;
+        # every other entry is cached the first time the page requests it
+        precache = [html_filename] + [path for path in self.get_first_render_assets(html_content) if path in entries]
+        
+        # The worker embeds a hash of the manifest, so browsers reinstall it exactly when an entry changes
+        manifest = {'game_version': self.GAME_VERSION, 'entries': entries, 'precache': precache}
+        manifest_json = json.dumps(manifest, indent=2, sort_keys=True)
+        manifest_hash = hashlib.sha256(manifest_json.encode('utf-8')).hexdigest()[:16]
+        
+        with open(os.path.join(base_dir, manifest_filename), 'w', encoding='utf-8') as f:
+            f.write(manifest_json + '\n')
+        
+        worker = '''// Generated by victoria3_company_parser.py - do not edit
+// Precaches the page shell and the images its first render draws; other images are cached
+// the first time they are requested. Cache keys carry each file's content hash, so a new
+// build only downloads the entries whose hash changed.
+const MANIFEST_HASH = '__MANIFEST_HASH__';
+const MANIFEST_URL = '__MANIFEST_FILE__';
+const HTML_FILE = '__HTML_FILE__';
+const CACHE_NAME = 'v3co-precache';
+const INSTALL_BATCH_SIZE = 8;
+
+function cacheKey(path, hash) {
+    return new URL(`${path}?rev=${hash}`, self.registration.scope).href;
+}
+
+async function loadManifest() {
+    const response = await fetch(new URL(`${MANIFEST_URL}?rev=${MANIFEST_HASH}`, self.registration.scope), { cache: 'no-store' });
+    return response.json();
+}
+
+async function cacheEntry(cache, path, hash) {
+    const response = await fetch(new URL(path, self.registration.scope), { cache: 'reload' });
+    if (response.ok) {
+        await cache.put(cacheKey(path, hash), response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const manifest = await loadManifest();
+        const cache = await caches.open(CACHE_NAME);
+        // A failed fetch only leaves that entry to be cached at runtime; it does not abort the install
+        let failed = 0;
+        for (let start = 0; start < manifest.precache.length; start += INSTALL_BATCH_SIZE) {
+            const results = await Promise.allSettled(manifest.precache.slice(start, start + INSTALL_BATCH_SIZE).map(async path => {
+                const hash = manifest.entries[path];
+                if (!(await cache.match(cacheKey(path, hash)))) {
+                    await cacheEntry(cache, path, hash);
+                }
+            }));
+            failed += results.filter(result => result.status === 'rejected').length;
+        }
+        if (failed) {
+            console.warn(`Service worker: ${failed} files could not be precached`);
+        }
+        await cache.put(new URL(MANIFEST_URL, self.registration.scope).href, new Response(JSON.stringify(manifest.entries)));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        // Drop entries from previous builds
+        const cache = await caches.open(CACHE_NAME);
+        const entries = await currentEntries();
+        const wanted = new Set(Object.entries(entries).map(([path, hash]) => cacheKey(path, hash)));
+        wanted.add(new URL(MANIFEST_URL, self.registration.scope).href);
+        const keys = await cache.keys();
+        await Promise.all(keys.filter(request => !wanted.has(request.url)).map(request => cache.delete(request)));
+        await self.clients.claim();
+    })());
+});
+
+let entriesPromise = null;
+
+function currentEntries() {
+    if (!entriesPromise) {
+        entriesPromise = caches.open(CACHE_NAME)
+            .then(cache => cache.match(new URL(MANIFEST_URL, self.registration.scope).href))
+            .then(response => response ? response.json() : {});
+    }
+    return entriesPromise;
+}
 
-    def save_raw_data(self, filename="company_data_v6.json"):
-        """Save raw company data as JSON for analysis"""
-        output_path = os.path.join(os.path.dirname(__file__), filename)
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || !url.href.startsWith(self.registration.scope)) {
+        return;
+    }
+    
+    // Only the app's own URL falls back to the cached page
+    let path = decodeURIComponent(url.pathname.slice(new URL(self.registration.scope).pathname.length));
+    if (path === '') {
+        path = HTML_FILE;
+    }
+    
+    event.respondWith((async () => {
+        const entries = await currentEntries();
+        const hash = entries[path];
+        if (!hash) {
+            return fetch(request);
+        }
+        const cache = await caches.open(CACHE_NAME);
+        const cached = await cache.match(cacheKey(path, hash));
+        if (cached) {
+            return cached;
+        }
+        return cacheEntry(cache, path, hash);
+    })());
+});
+'''
+        worker = worker.replace('__MANIFEST_HASH__', manifest_hash)
+        worker = worker.replace('__MANIFEST_FILE__', manifest_filename)
+        worker = worker.replace('__HTML_FILE__', html_filename)
+        with open(os.path.join(base_dir, worker_filename), 'w', encoding='utf-8') as f:
+            f.write(worker)
+        
+        precache_size = sum(os.path.getsize(os.path.join(base_dir, path)) for path in precache if path != html_filename)
+        total_size = sum(os.path.getsize(os.path.join(base_dir, path)) for path in entries if path != html_filename)
+        print("Service worker generated: {} ({} precached files, {:.1f} MB of images; {} more cached on use, {:.1f} MB)".format(
+            worker_filename, len(precache), precache_size / 1024.0 / 1024.0, len(entries) - len(precache),
+            (total_size - precache_size) / 1024.0 / 1024.0))
+
+    def export_sqlite(self, filename=None):
+        """Write the companies to a normalized, indexed SQLite database in one transaction"""
+        import sqlite3
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename or self.SQLITE_EXPORT)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        
+        company_names = sorted(self.companies)
+        building_names = sorted(set(building for name in company_names for building in
+                                    self.companies[name].building_types + self.companies[name].extension_building_types))
+        good_names = sorted(set(good for name in company_names for good in self.companies[name].possible_prestige_goods))
+        state_names = sorted(set(Company.states.name(state_id) for name in company_names
+                                 for state_id in self.companies[name].state_ids))
+        country_codes = sorted(set(code for name in company_names for code in
+                                   (self.companies[name].get('country'), self.companies[name].get('starting_country')) if code))
+        building_ids = dict((name, index) for index, name in enumerate(building_names, 1))
+        good_ids = dict((name, index) for index, name in enumerate(good_names, 1))
+        state_ids = dict((name, index) for index, name in enumerate(state_names, 1))
+        
+        company_rows, building_rows, good_rows, requirement_rows, state_rows, starting_rows = [], [], [], [], [], []
+        for company_id, name in enumerate(company_names, 1):
+            data = self.companies[name]
+            company_rows.append((company_id, name, data.get('display_name') or self.get_company_display_name(name),
+                                 data.get('country'), data.get('country_confidence'), data.get('ownership_category'),
+                                 int(bool(data.get('flavored_company')))))
+            building_rows.extend((company_id, building_ids[building], 'base') for building in data.building_types)
+            building_rows.extend((company_id, building_ids[building], 'charter') for building in data.extension_building_types)
+            good_rows.extend((company_id, good_ids[good]) for good in data.possible_prestige_goods)
+            for kind, field in (('formation', 'formation_requirements'), ('special', 'special_requirements'),
+                                ('prosperity', 'prosperity_bonuses')):
+                texts = data.get(field, ())
+                requirement_rows.extend((company_id, position, kind, text) for position, text in enumerate(texts))
+            state_rows.extend((company_id, state_ids[Company.states.name(state_id)]) for state_id in set(data.state_ids))
+            if data.get('starts_enacted'):
+                starting_rows.append((company_id, data.get('starting_country')))
+        
+        connection = sqlite3.connect(output_path)
+        try:
+            with connection:
+                # executescript() commits first, so the tables are created one statement at a time in this transaction
+                connection.execute('BEGIN')
+                for statement in CompanyDatabase.SCHEMA.split(';'):
+                    if statement.strip():
+                        connection.execute(statement)
+                connection.executemany('INSERT INTO countries VALUES (?, ?)',
+                                       [(code, self.get_country_name(code)) for code in country_codes])
+                connection.executemany('INSERT INTO states VALUES (?, ?)', [(i, name) for name, i in sorted(state_ids.items())])
+                connection.executemany('INSERT INTO buildings VALUES (?, ?, ?)',
+                                       [(building_ids[name], name, self.get_building_display_name(name)) for name in building_names])
+                connection.executemany('INSERT INTO prestige_goods VALUES (?, ?, ?, ?)', [
+                    (good_ids[name], name, self.prestige_good_names.get(name, name.replace('prestige_good_', '').replace('_', ' ').title()),
+                     self.prestige_goods.get(name)) for name in good_names])
+                connection.executemany('INSERT INTO companies VALUES (?, ?, ?, ?, ?, ?, ?)', company_rows)
+                connection.executemany('INSERT OR IGNORE INTO company_buildings VALUES (?, ?, ?)', building_rows)
+                connection.executemany('INSERT OR IGNORE INTO company_prestige_goods VALUES (?, ?)', good_rows)
+                connection.executemany('INSERT INTO requirements VALUES (?, ?, ?, ?)', requirement_rows)
+                connection.executemany('INSERT INTO company_states VALUES (?, ?)', state_rows)
+                connection.executemany('INSERT INTO starting_companies VALUES (?, ?)', starting_rows)
+                connection.executemany('INSERT INTO metadata VALUES (?, ?)', [
+                    ('game_version', self.GAME_VERSION), ('registry_version', str(DataRegistry.VERSION))])
+        finally:
+            connection.close()
+        
+        print("SQLite export saved: {} ({} companies, {} buildings, {} prestige goods)".format(
+            output_path, len(company_rows), len(building_names), len(good_names)))
+        return output_path
+    
+    def _get_dataset_path(self, *parts):
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), self.DATASET_STORE, *parts)
+    
+    def _store_dataset_object(self, value):
+        """Write a JSON value under its content hash unless already stored, returning (hash, newly_written)"""
+        import hashlib
+        encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(encoded).hexdigest()
+        path = self._get_dataset_path('objects', digest[:2], digest + '.json')
+        if os.path.exists(path):
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(encoded)
+        return digest, True
+    
+    def _get_dataset_version_path(self, tag):
+        """Get the manifest path for a tag, rejecting tags that would point outside versions/"""
+        if not tag or '..' in tag or '/' in tag or '\\' in tag:
+            raise ValueError("Invalid dataset tag {!r}: tags cannot be empty or contain path separators or '..'".format(tag))
+        return self._get_dataset_path('versions', tag + '.json')
+    
+    def _load_dataset_object(self, digest):
+        with open(self._get_dataset_path('objects', digest[:2], digest + '.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def store_dataset(self, tag=None):
+        """Snapshot the parsed companies under a patch tag, sharing unchanged records with other versions"""
+        tag = tag or self.GAME_VERSION
+        path = self._get_dataset_version_path(tag)
+        companies = {}
+        written = 0
+        for company_name, data in sorted(self.companies.items()):
+            digest, is_new = self._store_dataset_object(data.to_dict() if isinstance(data, Company) else data)
+            companies[company_name] = digest
+            written += is_new
+        prestige_goods, is_new = self._store_dataset_object(self.prestige_goods)
+        written += is_new
+        
+        manifest = {
+            'tag': tag,
+            'game_version': self.GAME_VERSION,
+            'registry_fingerprint': self.registry.fingerprint,
+            'companies': companies,
+            'prestige_goods': prestige_goods,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        print("Stored dataset {}: {} companies, {} new objects, {} shared with other versions".format(
+            tag, len(companies), written, len(companies) + 1 - written))
+        self.prune_datasets()
+        return path
+    
+    def list_datasets(self):
+        """Stored dataset tags, oldest first"""
+        versions_dir = self._get_dataset_path('versions')
+        if not os.path.isdir(versions_dir):
+            return []
+        tags = [name[:-len('.json')] for name in os.listdir(versions_dir) if name.endswith('.json')]
+        # Numeric parts compare as numbers and sort before text parts, so 1.9 < 1.10 < 1.x
+        return sorted(tags, key=lambda tag: [(0, int(part)) if part.isdigit() else (1, part) for part in re.split(r'[._-]', tag)])
+    
+    def load_dataset(self, tag):
+        """Load a stored snapshot by tag in place of parsing the game files"""
+        path = self._get_dataset_version_path(tag)
+        if not os.path.exists(path):
+            raise FileNotFoundError("No stored dataset for {} (have: {})".format(tag, ', '.join(self.list_datasets()) or 'none'))
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        self.load_companies(dict((company_name, self._load_dataset_object(digest))
+                                 for company_name, digest in manifest['companies'].items()))
+        self.prestige_goods = self._load_dataset_object(manifest['prestige_goods'])
+        self.all_buildings = set()
+        for company_data in self.companies.values():
+            self.all_buildings.update(company_data['building_types'])
+            self.all_buildings.update(company_data['extension_building_types'])
+        if manifest['registry_fingerprint'] != self.registry.fingerprint:
+            print("WARNING: Dataset {} was stored with a different data registry".format(tag))
+        print("Loaded dataset {} ({} companies, {} unique buildings)".format(tag, len(self.companies), len(self.all_buildings)))
+        return manifest
+    
+    def prune_datasets(self, keep=None):
+        """Drop all but the newest stored versions and delete objects no remaining version references"""
+        if keep is None:
+            keep = self.DATASET_KEEP
+        tags = self.list_datasets()
+        for tag in tags[:max(len(tags) - keep, 0)]:
+            os.remove(self._get_dataset_version_path(tag))
+            print("Removed dataset {}".format(tag))
+        
+        referenced = set()
+        for tag in self.list_datasets():
+            with open(self._get_dataset_version_path(tag), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            referenced.update(manifest['companies'].values())
+            referenced.add(manifest['prestige_goods'])
+        
+        removed = 0
+        objects_dir = self._get_dataset_path('objects')
+        for root, _, files in os.walk(objects_dir):
+            for name in files:
+                if name[:-len('.json')] not in referenced:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        if removed:
+            print("Removed {} unreferenced dataset objects".format(removed))
+    
+    def get_game_input_hashes(self, game_directory=None):
+        """Hash every game file the parsers read, keyed by path relative to the game directory"""
+        import hashlib
+        import glob
+        game_directory = game_directory or self.game_directory
+        patterns = [os.path.join('company_types', '*.txt'), os.path.join('history', 'states', '00_states.txt'),
+                    os.path.join('history', 'diplomacy', '00_subject_relationships.txt'),
+                    os.path.join('history', 'countries', '*.txt'), os.path.join('prestige_goods', '00_prestige_goods.txt')]
+        hashes = {}
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(game_directory, pattern))):
+                with open(path, 'rb') as f:
+                    hashes[os.path.relpath(path, game_directory).replace(os.sep, '/')] = hashlib.sha256(f.read()).hexdigest()
+        return hashes
+    
+    def _diff_company(self, old, new):
+        """Field-level changes between two versions of a company record (list fields compare as sets)"""
+        changes = {}
+        for field, label in self.DIFF_FIELDS:
+            old_value, new_value = old.get(field), new.get(field)
+            if field in Company.LIST_FIELDS:
+                # Reordering a list changes nothing in the game, so only items that come or go are reported
+                old_items, new_items = set(old_value or ()), set(new_value or ())
+                added = [item for item in new_value or () if item not in old_items]
+                removed = [item for item in old_value or () if item not in new_items]
+                if added or removed:
+                    changes[label] = {'added': added, 'removed': removed}
+            elif old_value != new_value:
+                changes[label] = {'old': old_value, 'new': new_value}
+        return changes
+    
+    def diff_game_directory(self, old_directory, filename=None):
+        """Compare this parser's game tree with an older one and write a machine-readable changelog"""
+        old_hashes = self.get_game_input_hashes(old_directory)
+        new_hashes = self.get_game_input_hashes()
+        changelog = {
+            'old': old_directory,
+            'new': self.game_directory,
+            'game_version': self.GAME_VERSION,
+            'files': {
+                'added': sorted(set(new_hashes) - set(old_hashes)),
+                'removed': sorted(set(old_hashes) - set(new_hashes)),
+                'changed': sorted(path for path in set(old_hashes) & set(new_hashes) if old_hashes[path] != new_hashes[path]),
+            },
+            'companies': {'added': [], 'removed': [], 'changed': {}},
+            'prestige_goods': {'added': [], 'removed': [], 'changed': {}},
+            'affected_buildings': [],
+        }
+        
+        # Identical inputs parse identically, so only parse the old tree when a file differs
+        differing = set(path for paths in changelog['files'].values() for path in paths)
+        if differing and all(path.startswith('company_types/') for path in differing):
+            # Only company files differ: the state, history and prestige good tables are shared, and the
+            # companies in unchanged files are the same in both trees, so just the differing files are parsed
+            old_parser = Victoria3CompanyParserV6Final(old_directory, self.use_subject_relationships, parse_game_files=False)
+            for name in ('state_to_country', 'subject_relationships', 'companies_at_game_start',
+                         'company_starting_countries', 'wiki_companies', 'prestige_goods'):
+                setattr(old_parser, name, getattr(self, name))
+            old_companies = {}
+            new_companies = {}
+            for path in sorted(differing):
+                company_file = path[len('company_types/'):]
+                if path in old_hashes:
+                    old_companies.update(old_parser.parse_company_file(company_file))
+                if path in new_hashes:
+                    new_companies.update(self.parse_company_file(company_file))
+        elif differing:
+            old_parser = Victoria3CompanyParserV6Final(old_directory, self.use_subject_relationships)
+            old_companies = dict((name, data.to_dict() if isinstance(data, Company) else data)
+                                 for name, data in old_parser.companies.items())
+            new_companies = dict((name, data.to_dict() if isinstance(data, Company) else data)
+                                 for name, data in self.companies.items())
+        
+        if differing:
+            old_prints = dict((name, self._fingerprint(data)) for name, data in old_companies.items())
+            new_prints = dict((name, self._fingerprint(data)) for name, data in new_companies.items())
+            
+            companies = changelog['companies']
+            companies['added'] = sorted(set(new_companies) - set(old_companies))
+            companies['removed'] = sorted(set(old_companies) - set(new_companies))
+            for name in sorted(set(old_companies) & set(new_companies)):
+                if old_prints[name] != new_prints[name]:
+                    changes = self._diff_company(old_companies[name], new_companies[name])
+                    if changes:
+                        companies['changed'][name] = changes
+            
+            goods = changelog['prestige_goods']
+            goods['added'] = sorted(set(self.prestige_goods) - set(old_parser.prestige_goods))
+            goods['removed'] = sorted(set(old_parser.prestige_goods) - set(self.prestige_goods))
+            for good in sorted(set(self.prestige_goods) & set(old_parser.prestige_goods)):
+                if self.prestige_goods[good] != old_parser.prestige_goods[good]:
+                    goods['changed'][good] = {'old': old_parser.prestige_goods[good], 'new': self.prestige_goods[good]}
+            
+            # Building sections the incremental build has to regenerate
+            affected = set()
+            touched = [old_companies.get(name, {}) for name in companies['removed'] + list(companies['changed'])]
+            touched += [new_companies.get(name, {}) for name in companies['added'] + list(companies['changed'])]
+            for data in touched:
+                affected.update(data.get('building_types', ()))
+                affected.update(data.get('extension_building_types', ()))
+            changelog['affected_buildings'] = sorted(affected)
+        
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename or self.PATCH_CHANGELOG)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(changelog, f, indent=2, ensure_ascii=False)
+        
+        files, companies = changelog['files'], changelog['companies']
+        print("\n=== Patch Diff: {} -> {} ===".format(old_directory, self.game_directory))
+        print("Files: {} added, {} removed, {} changed, {} unchanged".format(
+            len(files['added']), len(files['removed']), len(files['changed']),
+            len(set(old_hashes) & set(new_hashes)) - len(files['changed'])))
+        for name in companies['added']:
+            print("  + {}".format(name))
+        for name in companies['removed']:
+            print("  - {}".format(name))
+        for name, changes in companies['changed'].items():
+            print("  ~ {}".format(name))
+            for label, change in changes.items():
+                if 'old' in change:
+                    print("      {}: {} -> {}".format(label, change['old'], change['new']))
+                else:
+                    print("      {}: {}".format(label, ', '.join(['+' + item for item in change['added']] +
+                                                                 ['-' + item for item in change['removed']])))
+        print("Companies: {} added, {} removed, {} changed; {} prestige goods added, {} removed, {} changed".format(
+            len(companies['added']), len(companies['removed']), len(companies['changed']),
+            len(changelog['prestige_goods']['added']), len(changelog['prestige_goods']['removed']),
+            len(changelog['prestige_goods']['changed'])))
+        print("Changelog: {}".format(output_path))
+        return changelog
+    
+    def get_raw_data_schema(self):
+        """Schema header for NDJSON raw data: format version, game version and field types"""
+        fields = {}
+        for field in Company.FIELDS:
+            if field in Company.LIST_FIELDS:
+                fields[field] = 'array<string>'
+            elif field in ('flavored_company', 'starts_enacted'):
+                fields[field] = 'boolean'
+            else:
+                fields[field] = 'string|null'
+        return {'format': 'company_data', 'schema_version': self.RAW_DATA_SCHEMA_VERSION,
+                'game_version': self.GAME_VERSION, 'companies': len(self.companies), 'fields': fields}
+    
+    def save_raw_data(self, filename="company_data_v6.json", output_format="pretty"):
+        """Save raw company data as pretty or compact JSON, or as NDJSON with a schema header line"""
+        # Written from the finished company table (after parsing and the wiki cross-check), not during parsing;
+        # NDJSON only keeps readers from having to load the whole file (see iter_raw_data)
+        if output_format not in ('pretty', 'compact', 'ndjson'):
+            raise ValueError("Unknown raw data format: {}".format(output_format))
+        if output_format == 'ndjson' and filename.endswith('.json'):
+            filename = filename[:-len('.json')] + '.ndjson'
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+        records = ((name, data.to_dict() if isinstance(data, Company) else data) for name, data in self.companies.items())
+        
         import codecs
         with codecs.open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.companies, f, indent=2, ensure_ascii=False)
+            if output_format == 'pretty':
+                json.dump(dict(records), f, indent=2, ensure_ascii=False)
+            elif output_format == 'compact':
+                # Same mapping as the pretty file, written one record at a time
+                f.write('{')
+                for index, (name, data) in enumerate(records):
+                    f.write('{}{}:{}'.format(',' if index else '', json.dumps(name, ensure_ascii=False),
+                                             json.dumps(data, ensure_ascii=False, separators=(',', ':'))))
+                f.write('}')
+            else:
+                f.write(json.dumps({'schema': self.get_raw_data_schema()}, ensure_ascii=False, separators=(',', ':')) + '\n')
+                for name, data in records:
+                    f.write(json.dumps({'name': name, 'data': data}, ensure_ascii=False, separators=(',', ':')) + '\n')
             
-        print("Raw data saved: {}".format(output_path))
+        print("Raw data saved: {} ({}, {:.0f} KB)".format(output_path, output_format, os.path.getsize(output_path) / 1024))
         return output_path
 
 if __name__ == "__main__":
     try:
-        parser = Victoria3CompanyParserV6Final("game")
-        
-        # Try to load existing data first, fall back to parsing if needed
-        try:
-            import json
-            with open('company_data.json', 'r') as f:
-                parser.companies = json.load(f)
-            
-            # Rebuild all_buildings set from loaded data
-            parser.all_buildings = set()
-            for company_data in parser.companies.values():
-                parser.all_buildings.update(company_data['building_types'])
-                parser.all_buildings.update(company_data['extension_building_types'])
-            
-            print("Loaded {} companies with {} unique buildings from existing data".format(len(parser.companies), len(parser.all_buildings)))
-            
-            # Load prestige goods mapping (needed for HTML generation)
-            parser.prestige_goods = {
-                'prestige_good_ford_automobiles': 'automobiles',
-                'prestige_good_turin_automobiles': 'automobiles',
-                'prestige_good_schichau_engines': 'engines',
-                'prestige_good_krupp_guns': 'artillery',
-                'prestige_good_schneider_guns': 'artillery',
-                'prestige_good_armstrong_ships': 'clipper_transports',
-                'prestige_good_colt_revolvers': 'small_arms',
-                'prestige_good_saint_etienne_rifles': 'small_arms',
-                'prestige_good_bohemian_crystal': 'glass',
-                'prestige_good_meissen_porcelain': 'porcelain',
-                'prestige_good_bentwood_furniture': 'furniture',
-                'prestige_good_stylish_furniture': 'luxury_furniture',
-                'prestige_good_english_upholstery': 'luxury_furniture',
-                'prestige_good_designer_clothes': 'luxury_clothes',
-                'prestige_good_haute_couture': 'luxury_clothes',
-                'prestige_good_como_silk': 'silk',
-                'prestige_good_suzhou_silk': 'silk',
-                'prestige_good_tomioka_silk': 'silk',
-                'prestige_good_sea_island_cotton': 'fabric',
-                'prestige_good_craft_paper': 'paper',
-                'prestige_good_washi_paper': 'paper',
-                'prestige_good_precision_tools': 'tools',
-                'prestige_good_refined_steel': 'steel',
-                'prestige_good_sheffield_steel': 'steel',
-                'prestige_good_russia_iron': 'iron',
-                'prestige_good_oregrounds_iron': 'iron',
-                'prestige_good_swedish_bar_iron': 'iron',
-                'prestige_good_baku_oil': 'oil',
-                'prestige_good_sicilian_sulfur': 'sulfur',
-                'prestige_good_rosewood': 'hardwood',
-                'prestige_good_burmese_teak': 'hardwood',
-                'prestige_good_teak': 'hardwood',
-                'prestige_good_prime_meat': 'meat',
-                'prestige_good_river_plate_beef': 'meat',
-                'prestige_good_select_fish': 'fish',
-                'prestige_good_gourmet_groceries': 'groceries',
-                'prestige_good_generic_groceries': 'groceries',
-                'prestige_good_fine_grain': 'grain',
-                'prestige_good_reserve_coffee': 'coffee',
-                'prestige_good_china_tea': 'tea',
-                'prestige_good_assam_tea': 'tea',
-                'prestige_good_mit_afifi': 'tobacco',
-                'prestige_good_turkish_tobacco': 'tobacco',
-                'prestige_good_champagne': 'wine',
-                'prestige_good_gros_michel_banana': 'fruit',
-                'prestige_good_pure_opium': 'opium',
-                'prestige_good_bengal_opium': 'opium',
-                'prestige_good_smirnoff_vodka': 'liquor',
-                'prestige_good_swift_merchant_marine': 'clipper_transports',
-                'prestige_good_clyde_built_liners': 'steamers',
-                'prestige_good_high_grade_explosives': 'explosives',
-                'prestige_good_enriched_fertilizer': 'fertilizer',
-                'prestige_good_german_aniline': 'dye',
-                'prestige_good_high_powered_small_arms': 'small_arms',
-                'prestige_good_quick_fire_artillery': 'artillery',
-                'prestige_good_satsuma_ware': 'porcelain',
-                'prestige_good_radiola_radios': 'radios',
-                'prestige_good_chapel_radios': 'radios',
-                'prestige_good_ericsson_apparatus': 'telephones'
-            }
-            
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print("Could not load existing data ({}), parsing from game files...".format(e))
-            parser.cross_check_with_wiki()
-            parser.save_raw_data()
-        
+        # --dataset TAG switches to a stored patch snapshot instead of company_data.json or a fresh parse
+        dataset_tag = sys.argv[sys.argv.index('--dataset') + 1] if '--dataset' in sys.argv[1:] else None
+        if dataset_tag and '--diff' in sys.argv[1:]:
+            raise ValueError("--diff compares two parsed game directories and cannot be combined with --dataset")
+        parser = Victoria3CompanyParserV6Final("game", parse_game_files=not dataset_tag)
+        
+        # --diff OLD_DIR compares the game tree with an older copy (e.g. game_old) and stops
+        if '--diff' in sys.argv[1:]:
+            parser.diff_game_directory(os.path.abspath(sys.argv[sys.argv.index('--diff') + 1]))
+            sys.exit(0)
+        
+        if dataset_tag:
+            parser.load_dataset(dataset_tag)
+        else:
+            # Try to load existing data first, fall back to parsing if needed
+            try:
+                import json
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'company_data.json'), 'r') as f:
+                    parser.load_companies(json.load(f))
+                
+                # Rebuild all_buildings set from loaded data
+                parser.all_buildings = set()
+                for company_data in parser.companies.values():
+                    parser.all_buildings.update(company_data['building_types'])
+                    parser.all_buildings.update(company_data['extension_building_types'])
+                
+                print("Loaded {} companies with {} unique buildings from existing data".format(len(parser.companies), len(parser.all_buildings)))
+                
+                # Load prestige goods mapping (needed for HTML generation)
+                parser.prestige_goods = {
+                    'prestige_good_ford_automobiles': 'automobiles',
+                    'prestige_good_turin_automobiles': 'automobiles',
+                    'prestige_good_schichau_engines': 'engines',
+                    'prestige_good_krupp_guns': 'artillery',
+                    'prestige_good_schneider_guns': 'artillery',
+                    'prestige_good_armstrong_ships': 'clipper_transports',
+                    'prestige_good_colt_revolvers': 'small_arms',
+                    'prestige_good_saint_etienne_rifles': 'small_arms',
+                    'prestige_good_bohemian_crystal': 'glass',
+                    'prestige_good_meissen_porcelain': 'porcelain',
+                    'prestige_good_bentwood_furniture': 'furniture',
+                    'prestige_good_stylish_furniture': 'luxury_furniture',
+                    'prestige_good_english_upholstery': 'luxury_furniture',
+                    'prestige_good_designer_clothes': 'luxury_clothes',
+                    'prestige_good_haute_couture': 'luxury_clothes',
+                    'prestige_good_como_silk': 'silk',
+                    'prestige_good_suzhou_silk': 'silk',
+                    'prestige_good_tomioka_silk': 'silk',
+                    'prestige_good_sea_island_cotton': 'fabric',
+                    'prestige_good_craft_paper': 'paper',
+                    'prestige_good_washi_paper': 'paper',
+                    'prestige_good_precision_tools': 'tools',
+                    'prestige_good_refined_steel': 'steel',
+                    'prestige_good_sheffield_steel': 'steel',
+                    'prestige_good_russia_iron': 'iron',
+                    'prestige_good_oregrounds_iron': 'iron',
+                    'prestige_good_swedish_bar_iron': 'iron',
+                    'prestige_good_baku_oil': 'oil',
+                    'prestige_good_sicilian_sulfur': 'sulfur',
+                    'prestige_good_rosewood': 'hardwood',
+                    'prestige_good_burmese_teak': 'hardwood',
+                    'prestige_good_teak': 'hardwood',
+                    'prestige_good_prime_meat': 'meat',
+                    'prestige_good_river_plate_beef': 'meat',
+                    'prestige_good_select_fish': 'fish',
+                    'prestige_good_gourmet_groceries': 'groceries',
+                    'prestige_good_generic_groceries': 'groceries',
+                    'prestige_good_fine_grain': 'grain',
+                    'prestige_good_reserve_coffee': 'coffee',
+                    'prestige_good_china_tea': 'tea',
+                    'prestige_good_assam_tea': 'tea',
+                    'prestige_good_mit_afifi': 'tobacco',
+                    'prestige_good_turkish_tobacco': 'tobacco',
+                    'prestige_good_champagne': 'wine',
+                    'prestige_good_gros_michel_banana': 'fruit',
+                    'prestige_good_pure_opium': 'opium',
+                    'prestige_good_bengal_opium': 'opium',
+                    'prestige_good_smirnoff_vodka': 'liquor',
+                    'prestige_good_swift_merchant_marine': 'clipper_transports',
+                    'prestige_good_clyde_built_liners': 'steamers',
+                    'prestige_good_high_grade_explosives': 'explosives',
+                    'prestige_good_enriched_fertilizer': 'fertilizer',
+                    'prestige_good_german_aniline': 'dye',
+                    'prestige_good_high_powered_small_arms': 'small_arms',
+                    'prestige_good_quick_fire_artillery': 'artillery',
+                    'prestige_good_satsuma_ware': 'porcelain',
+                    'prestige_good_radiola_radios': 'radios',
+                    'prestige_good_chapel_radios': 'radios',
+                    'prestige_good_ericsson_apparatus': 'telephones'
+                }
+                
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print("Could not load existing data ({}), parsing from game files...".format(e))
+                parser.cross_check_with_wiki()
+                parser.save_wiki_match_report()
+                # --raw-format compact|ndjson writes company_data_v6.json compactly or as company_data_v6.ndjson
+                raw_format = sys.argv[sys.argv.index('--raw-format') + 1] if '--raw-format' in sys.argv[1:] else 'pretty'
+                parser.save_raw_data(output_format=raw_format)
+                parser.store_dataset()
+        
+        if '--sqlite' in sys.argv[1:]:
+            parser.export_sqlite()
+        
+        parser.convert_company_icons()
+        # Opt-in: references to byte-identical images are pointed at one copy (no files are deleted)
+        if '--dedupe-assets' in sys.argv[1:]:
+            parser.deduplicate_assets()
+        parser.build_icon_variants()
+        parser.build_icon_atlases()
         parser.save_html_report()
+        parser.compress_outputs()
         
     except Exception as e:
-        print("Error: {}".format(e))
\ No newline at end of file
+        # Any failure, including a page over budget in save_page_report, exits with status 1 so CI builds fail
+        print("Error: {}".format(e))
+        sys.exit(1)
\ No newline at end of file